@@ -0,0 +1,322 @@
+import datetime
+import json
+import os
+import time
+from contextlib import closing
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+from generator.oltp_schema import countries, customers, locations, sales
+from generator.schema import column_names, primary_key
+from utils.arrow import arrow_schema
+from utils.connections import get_connection, discard_connection
+from utils.logger import custom_logger, timed_stage
+from utils.s3 import DEFAULT_PART_SIZE, MultipartUpload
+
+
+DB_NAME = "etlhols_oltp"
+EXTRACT_TABLES = (sales, customers, locations, countries)
+DEFAULT_BATCH_SIZE = 50_000
+# Seconds a gap in a table's keys must have been seen for before it is
+# taken to be left by a rolled back insert, see settled_gap.
+DEFAULT_GAP_TIMEOUT = 60 * 60
+REQUIRED_ENV_VARIABLES = ["DB_USER", "DB_PASS", "DB_HOST", "DB_PORT"]
+
+
+def extract_changes(event, context):
+    """Extract the rows added to each OLTP table since its watermark into
+    zstd compressed Parquet files in the extract bucket.
+
+    The OLTP tables are append-only with SERIAL keys, so each table's
+    watermark is the largest primary key extracted so far, stored at
+    watermarks/<table>.json in the bucket.
+
+    Args:
+        event (dict): may override "tables", a list of table names,
+        "batch_size", the number of rows fetched per round trip, and
+        "gap_timeout", see extract_table
+        context: Lambda context, unused
+
+    Returns:
+        dict: "Result" and the number of rows extracted per table
+    """
+    logger = custom_logger()
+    event = event or {}
+    response = {"Result": "Failed"}
+    conn = None
+
+    try:
+        missing_list = [
+            item
+            for item in REQUIRED_ENV_VARIABLES + ["EXTRACT_BUCKET"]
+            if item not in os.environ
+        ]
+        if missing_list:
+            raise ValueError(
+                f"Required environment variables missing: {str(missing_list)}"
+            )
+
+        conn = get_connection(
+            os.environ["DB_USER"],
+            os.environ["DB_PASS"],
+            os.environ["DB_HOST"],
+            DB_NAME,
+            int(os.environ["DB_PORT"]),
+        )
+        s3_client = boto3.client("s3")
+        bucket = os.environ["EXTRACT_BUCKET"]
+        names = event.get("tables")
+
+        for table in EXTRACT_TABLES:
+            if names is None or table.name in names:
+                response[table.name] = extract_table(
+                    conn,
+                    s3_client,
+                    bucket,
+                    table,
+                    event.get("batch_size", DEFAULT_BATCH_SIZE),
+                    gap_timeout=event.get("gap_timeout", DEFAULT_GAP_TIMEOUT),
+                )
+        response["Result"] = "Success"
+    except Exception as e:
+        response["Result"] = "Error"
+        logger.error(e)
+        if conn is not None:
+            discard_connection(conn)
+
+    return response
+
+
+def extract_table(
+    conn,
+    s3_client,
+    bucket,
+    table,
+    batch_size=DEFAULT_BATCH_SIZE,
+    part_size=DEFAULT_PART_SIZE,
+    gap_timeout=DEFAULT_GAP_TIMEOUT,
+):
+    """Stream a table's rows past its watermark into one Parquet object.
+
+    Rows are read through a server-side cursor batch_size rows at a time
+    and written as Parquet row groups into a multipart upload, so memory
+    is bounded by one batch and one part. The watermark is advanced only
+    once the upload has completed.
+
+    Keys are taken from a sequence before rows commit, and parallel loads
+    commit out of key order, so a key missing after the watermark may
+    belong to a transaction still open. Extraction stops at the first
+    such gap and the watermark stays below it, so no row is skipped. A
+    gap is stepped over only once it is settled, see settled_gap.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        s3_client (S3.Client): boto3 S3 client
+        bucket (str): name of the extract bucket
+        table (Table): definition of the table to extract
+        batch_size (int): number of rows fetched per round trip
+        part_size (int): size of the multipart upload parts in bytes
+        gap_timeout (float): seconds a gap must have been seen for before
+        it may be stepped over
+
+    Returns:
+        int: number of rows extracted
+    """
+    logger = custom_logger()
+    key_column = primary_key(table)
+    state = read_extract_state(s3_client, bucket, table.name)
+    watermark = state["last_key"]
+    extracted_at = datetime.datetime.now(datetime.timezone.utc)
+    # The first key is zero padded so a table's objects sort by key in the
+    # order they were extracted, see transform.transform.
+    key = (
+        f"{table.name}/{extracted_at:%Y/%m/%d}/"
+        f"{table.name}_{watermark + 1:010d}_{extracted_at:%H%M%S%f}.parquet"
+    )
+    schema = arrow_schema(table)
+    key_index = schema.get_field_index(key_column)
+    snapshot = {}
+    gap = state.get("gap")
+    row_count = 0
+    last_key = watermark
+
+    with timed_stage("extract", table=table.name) as stage, (
+        MultipartUpload(s3_client, bucket, key, part_size)
+    ) as upload:
+        with pq.ParquetWriter(
+            upload, schema, compression="zstd"
+        ) as writer, closing(
+            fetch_batches(
+                conn, table, key_column, watermark, batch_size, snapshot
+            )
+        ) as batches:
+            for rows in batches:
+                keys = [row[key_index] for row in rows]
+                end, gap = contiguous_rows(
+                    keys, last_key, gap, snapshot, gap_timeout
+                )
+                if end:
+                    writer.write_batch(to_record_batch(rows[:end], schema))
+                    row_count += end
+                    last_key = keys[end - 1]
+                if end < len(rows):
+                    break
+
+        if row_count == 0:
+            upload.abort()
+        stage.rows = row_count
+        stage.bytes = upload.size
+
+    if row_count or gap != state.get("gap"):
+        write_watermark(s3_client, bucket, table.name, last_key, gap)
+    if gap is not None:
+        logger.info(f"waiting for {table.name} key {gap['key']} to commit")
+    logger.info(f"extracted {row_count} rows from {table.name}")
+
+    return row_count
+
+
+def contiguous_rows(keys, last_key, gap, snapshot, gap_timeout):
+    """Find how many of a batch's keys follow on from last_key without a
+    gap, stepping over the gap recorded earlier if it has settled.
+
+    Args:
+        keys (list): a batch's keys, in ascending order
+        last_key (int): key of the last row kept
+        gap (dict): gap recorded by an earlier extract, or None
+        snapshot (dict): "xmin" and "xmax" of the reading transaction
+        gap_timeout (float): see extract_table
+
+    Returns:
+        tuple: number of leading keys to keep, and the gap they stop at,
+        None if every key is kept
+    """
+    expected = last_key + 1
+
+    for position, key in enumerate(keys):
+        if key != expected and not settled_gap(
+            gap, expected, snapshot, gap_timeout
+        ):
+            if gap is None or gap["key"] != expected:
+                gap = {
+                    "key": expected,
+                    "seen_at": time.time(),
+                    "xmax": snapshot["xmax"],
+                }
+            return position, gap
+        expected = key + 1
+
+    return len(keys), None
+
+
+def settled_gap(gap, key, snapshot, gap_timeout):
+    """Check whether a missing key can no longer be committed.
+
+    A key missing once every transaction open when the gap was first seen
+    has ended, and at least gap_timeout seconds later, was taken by a
+    transaction that rolled back, or by a load that has since been given
+    up on.
+
+    Args:
+        gap (dict): "key", "seen_at" time and snapshot "xmax" of the gap
+        recorded by an earlier extract, or None
+        key (int): the missing key
+        snapshot (dict): "xmin" and "xmax" of the reading transaction
+        gap_timeout (float): see extract_table
+
+    Returns:
+        bool: True if the key can be skipped
+    """
+    return (
+        gap is not None
+        and gap["key"] == key
+        and time.time() - gap["seen_at"] >= gap_timeout
+        and snapshot["xmin"] >= gap["xmax"]
+    )
+
+
+def fetch_batches(
+    conn, table, key_column, watermark, batch_size, snapshot=None
+):
+    """Yield lists of rows with keys above watermark, in key order, read
+    through a server-side cursor so only batch_size rows are held at once.
+
+    The rows are read in a repeatable read transaction, so every batch
+    comes from the one snapshot whose bounds are stored in snapshot.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        table (Table): definition of the table to read
+        key_column (str): column the watermark applies to
+        watermark (int): largest key already extracted
+        batch_size (int): number of rows fetched per round trip
+        snapshot (dict): if given, "xmin", the oldest transaction still
+        open, and "xmax", the first transaction not yet started, of the
+        snapshot are set in it before the first batch
+
+    Yields:
+        list: up to batch_size row tuples
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+
+    try:
+        cursor.execute(
+            "SELECT txid_snapshot_xmin(s), txid_snapshot_xmax(s) "
+            "FROM txid_current_snapshot() AS s;"
+        )
+        xmin, xmax = cursor.fetchone()
+        if snapshot is not None:
+            snapshot.update(xmin=xmin, xmax=xmax)
+        cursor.execute(
+            f"DECLARE extract_cursor NO SCROLL CURSOR FOR "
+            f"SELECT {', '.join(column_names(table))} FROM {table.name} "
+            f"WHERE {key_column} > %s ORDER BY {key_column};",
+            (watermark,),
+        )
+        while rows := fetch_forward(cursor, batch_size):
+            yield rows
+        cursor.execute("CLOSE extract_cursor;")
+        cursor.execute("COMMIT;")
+    except BaseException:
+        cursor.execute("ROLLBACK;")
+        raise
+
+
+def fetch_forward(cursor, batch_size):
+    cursor.execute(f"FETCH FORWARD {int(batch_size)} FROM extract_cursor;")
+    return cursor.fetchall()
+
+
+def to_record_batch(rows, schema):
+    columns = list(zip(*rows))
+    return pa.record_batch(
+        [
+            pa.array(values, type=field.type)
+            for values, field in zip(columns, schema)
+        ],
+        schema=schema,
+    )
+
+
+def read_extract_state(s3_client, bucket, table_name):
+    """Return a table's watermark, as "last_key", and the gap in its keys
+    extraction last stopped at, as "gap", see contiguous_rows."""
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket, Key=f"watermarks/{table_name}.json"
+        )
+    except s3_client.exceptions.NoSuchKey:
+        return {"last_key": 0, "gap": None}
+
+    state = json.loads(response["Body"].read())
+    state.setdefault("gap", None)
+    return state
+
+
+def write_watermark(s3_client, bucket, table_name, last_key, gap=None):
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"watermarks/{table_name}.json",
+        Body=json.dumps({"last_key": last_key, "gap": gap}).encode(),
+    )
@@ -0,0 +1,354 @@
+"""Create the OLTP schema, and generate data into any Postgres database or
+into local files, without Lambda or Secrets Manager.
+
+    PYTHONPATH=src python -m generator schema --dsn postgresql://...
+    PYTHONPATH=src python -m generator schema --dsn postgresql://... \\
+        --change-log
+    PYTHONPATH=src python -m generator load --dsn postgresql://... \\
+        --sales 10000000 --customers 100000 --workers 8 --seed 1
+    PYTHONPATH=src python -m generator generate --output data/ \\
+        --sales 10000000 --workers 8 --seed 1 --format parquet
+    PYTHONPATH=src python -m generator load --dsn postgresql://... \\
+        --from data/
+    PYTHONPATH=src python -m generator load --dsn postgresql://... \\
+        --client-ids --defer-constraints --workers 8
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from functools import partial
+import numpy as np
+from pg8000.dbapi import connect
+from generator.data_generator import (
+    generate_customers,
+    split_seed,
+    CUSTOMERS_COLUMNS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_END_DATE,
+    DEFAULT_START_DATE,
+)
+from generator.change_log import install_change_log
+from generator.distributions import SalesSkew
+from generator.export import (
+    export_dataset,
+    load_export,
+    seeded_skew,
+    FORMATS,
+)
+from generator.loader import (
+    copy_batches,
+    customer_partitions,
+    deferred_constraints,
+    ensure_partitions,
+    parallel_load,
+    read_ids,
+    read_locations,
+    read_peak_months,
+    reserve_ids,
+    sales_partitions,
+)
+from generator.migrations import run_migrations
+from generator.oltp_schema import customers, sales
+from utils.connections import parse_dsn
+
+
+DEFAULT_SALES = 100_000
+DEFAULT_CUSTOMERS = 10_000
+PARTITIONS_PER_WORKER = 4
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.command(args)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m generator", description=__doc__.splitlines()[0]
+    )
+    commands = parser.add_subparsers(required=True)
+
+    schema = commands.add_parser(
+        "schema", help="create the tables and apply pending migrations"
+    )
+    add_dsn_argument(schema)
+    schema.add_argument(
+        "--change-log",
+        action="store_true",
+        help="install triggers logging changes to customers and sales, "
+        "see generator.change_log",
+    )
+    schema.set_defaults(command=run_schema)
+
+    load = commands.add_parser(
+        "load", help="generate customers and sales into a database"
+    )
+    add_dsn_argument(load)
+    add_generation_arguments(load)
+    load.add_argument(
+        "--defer-constraints",
+        action="store_true",
+        help="drop sales foreign keys and indexes while loading",
+    )
+    load.add_argument(
+        "--client-ids",
+        action="store_true",
+        help="assign customer and sales ids from disjoint per-shard ranges "
+        "instead of sequences; with --defer-constraints customers and "
+        "sales are loaded together",
+    )
+    load.add_argument(
+        "--from",
+        dest="source",
+        help="load the files exported to this directory instead of "
+        "generating",
+    )
+    load.set_defaults(command=run_load)
+
+    generate = commands.add_parser(
+        "generate", help="export every table as sharded files"
+    )
+    generate.add_argument(
+        "--output", required=True, help="directory to write files to"
+    )
+    generate.add_argument("--format", choices=FORMATS, default="csv")
+    add_generation_arguments(generate)
+    generate.set_defaults(command=run_generate)
+
+    return parser.parse_args(argv)
+
+
+def add_dsn_argument(parser):
+    parser.add_argument(
+        "--dsn",
+        default=os.environ.get("GENERATOR_DSN"),
+        required="GENERATOR_DSN" not in os.environ,
+        help="postgresql:// URL, defaults to GENERATOR_DSN",
+    )
+
+
+def add_generation_arguments(parser):
+    parser.add_argument("--sales", type=int, default=DEFAULT_SALES)
+    parser.add_argument("--customers", type=int, default=DEFAULT_CUSTOMERS)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="connections to load over, or processes to generate with "
+        "when exporting",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="rows generated and sent per batch, or written per shard",
+    )
+    parser.add_argument("--seed", type=int, help="seed for reproducible data")
+    parser.add_argument(
+        "--skewed",
+        action="store_true",
+        help="Zipf locations, seasonal dates and log-normal prices",
+    )
+
+
+def run_schema(args):
+    conn = open_connection(args.dsn)
+    try:
+        applied = run_migrations(conn)
+        if args.change_log:
+            install_change_log(conn)
+    finally:
+        conn.close()
+
+    print(f"applied migrations: {applied or 'none, already up to date'}")
+    if args.change_log:
+        print("change log installed")
+    return 0
+
+
+def run_load(args):
+    """Create the schema if needed, then load customers over one connection
+    and sales over args.workers connections, or load an export."""
+    customers_seed, sales_seed = split_seed(args.seed)
+    conn = open_connection(args.dsn)
+
+    try:
+        run_migrations(conn)
+
+        if args.source is not None:
+            start = time.perf_counter()
+            row_counts = load_export(conn, args.source)
+            seconds = time.perf_counter() - start
+            report("total", sum(row_counts.values()), seconds)
+            return 0
+
+        if args.client_ids:
+            return report_failures(
+                load_with_client_ids(conn, args, customers_seed, sales_seed)
+            )
+
+        start = time.perf_counter()
+        rows = copy_batches(
+            conn,
+            "customers",
+            generate_customers(
+                args.customers, args.chunk_size, customers_seed
+            ),
+            CUSTOMERS_COLUMNS,
+        )
+        report("customers", rows, time.perf_counter() - start)
+
+        customer_ids, location_ids, countries = read_ids(conn)
+        skew = sales_skew(conn, countries) if args.skewed else None
+        partitions = sales_partitions(
+            args.sales,
+            args.workers * PARTITIONS_PER_WORKER,
+            customer_ids,
+            location_ids,
+            batch_size=args.chunk_size,
+            seed=sales_seed,
+            skew=skew,
+        )
+
+        start = time.perf_counter()
+        ensure_partitions(conn, sales, DEFAULT_START_DATE, DEFAULT_END_DATE)
+        result = run_partitions(conn, args, partitions)
+        seconds = time.perf_counter() - start
+        report("sales", sum(result["loaded"].values()), seconds)
+    finally:
+        conn.close()
+
+    return report_failures(result)
+
+
+def load_with_client_ids(conn, args, customers_seed, sales_seed):
+    """Load customers and sales with ids assigned client side, from
+    blocks reserved from each table's sequence before loading.
+
+    Sales reference the new customers by their planned ids, so nothing is
+    read back between the two loads. With args.defer_constraints sales
+    foreign keys are dropped and customers and sales partitions share the
+    same workers; otherwise customers are loaded first."""
+    first_customer = reserve_ids(conn, customers, args.customers)
+    customer_ids = np.arange(first_customer, first_customer + args.customers)
+    location_ids, countries = read_locations(conn)
+    skew = sales_skew(conn, countries) if args.skewed else None
+    num_partitions = args.workers * PARTITIONS_PER_WORKER
+
+    customer_load = customer_partitions(
+        args.customers,
+        num_partitions,
+        first_customer,
+        batch_size=args.chunk_size,
+        seed=customers_seed,
+    )
+    sales_load = sales_partitions(
+        args.sales,
+        num_partitions,
+        customer_ids,
+        location_ids,
+        batch_size=args.chunk_size,
+        seed=sales_seed,
+        skew=skew,
+        first_id=reserve_ids(conn, sales, args.sales),
+    )
+    start = time.perf_counter()
+    ensure_partitions(conn, sales, DEFAULT_START_DATE, DEFAULT_END_DATE)
+    if args.defer_constraints:
+        result = run_partitions(
+            conn, args, itertools.chain(customer_load, sales_load)
+        )
+    else:
+        result = run_partitions(conn, args, customer_load)
+        if not result["failed"]:
+            sales_result = run_partitions(conn, args, sales_load)
+            result = {
+                outcome: {**result[outcome], **sales_result[outcome]}
+                for outcome in result
+            }
+    report(
+        "total", sum(result["loaded"].values()), time.perf_counter() - start
+    )
+
+    return result
+
+
+def sales_skew(conn, location_countries):
+    """Return the SalesSkew of a database's locations, with each country
+    peaking in its own season."""
+    return SalesSkew(
+        location_countries=location_countries,
+        peak_months=read_peak_months(conn),
+    )
+
+
+def run_partitions(conn, args, partitions):
+    """Load partitions over args.workers connections, without sales
+    foreign keys and indexes if args.defer_constraints."""
+    connect_fn = partial(open_connection, args.dsn)
+
+    if args.defer_constraints:
+        with deferred_constraints(conn, [sales]):
+            return parallel_load(connect_fn, partitions, args.workers)
+    return parallel_load(connect_fn, partitions, args.workers)
+
+
+def report_failures(result):
+    for name, error in result["failed"].items():
+        print(f"failed to load {name}: {error}", file=sys.stderr)
+    return 1 if result["failed"] else 0
+
+
+def run_generate(args):
+    """Export every table as sharded files with manifests, see
+    generator.export."""
+    start = time.perf_counter()
+    manifests = export_dataset(
+        args.output,
+        args.sales,
+        args.customers,
+        batch_size=args.chunk_size,
+        seed=args.seed,
+        workers=args.workers,
+        file_format=args.format,
+        skew=seeded_skew(SalesSkew()) if args.skewed else None,
+    )
+    seconds = time.perf_counter() - start
+
+    for name, manifest in manifests.items():
+        print(
+            f"{name:<10} {manifest['rows']:>14,} rows "
+            f"{len(manifest['shards']):>6} shards"
+        )
+    report(
+        "total",
+        sum(manifest["rows"] for manifest in manifests.values()),
+        seconds,
+        sum(
+            shard["bytes"]
+            for manifest in manifests.values()
+            for shard in manifest["shards"]
+        ),
+    )
+    return 0
+
+
+def open_connection(dsn):
+    conn = connect(**parse_dsn(dsn))
+    conn.autocommit = True
+    return conn
+
+
+def report(name, rows, seconds, size=None):
+    line = f"{name:<10} {rows:>14,} rows {seconds:>10.2f} s"
+    if seconds > 0:
+        line += f" {rows / seconds:>14,.0f} rows/s"
+        if size is not None:
+            line += f" {size / seconds / 2**20:>8.1f} MiB/s"
+    print(line)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+from collections import namedtuple
+from generator.oltp_schema import customers, sales
+from generator.schema import primary_key
+from utils.logger import custom_logger, timed_stage
+
+
+CHANGE_LOG_TABLES = (customers, sales)
+DEFAULT_BATCH_SIZE = 10_000
+
+# Every change gets the id of the transaction that made it. Readers only
+# return changes of transactions older than every transaction still open,
+# and read in (txid, change_id) order, so a change committed after a read
+# can never sort before a position already acknowledged.
+change_log_table_str = """
+CREATE TABLE IF NOT EXISTS change_log (
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    change_id BIGSERIAL,
+    table_name VARCHAR(64) NOT NULL,
+    row_key BIGINT NOT NULL,
+    operation CHAR(1) NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (txid, change_id)
+);
+CREATE TABLE IF NOT EXISTS change_log_consumers (
+    consumer VARCHAR(64) PRIMARY KEY,
+    last_txid BIGINT NOT NULL,
+    last_change_id BIGINT NOT NULL,
+    acknowledged_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# One row of change_log: the primary key of a row of table_name that was
+# inserted, updated or deleted, as operation "I", "U" or "D".
+Change = namedtuple(
+    "Change", ["txid", "change_id", "table_name", "row_key", "operation"]
+)
+
+# The events logged and the transition table each one's trigger reads.
+TRIGGER_EVENTS = (
+    ("insert", "NEW TABLE AS new_rows"),
+    ("update", "NEW TABLE AS new_rows"),
+    ("delete", "OLD TABLE AS old_rows"),
+)
+
+
+def function_name(table):
+    return f"{table.name}_log_changes"
+
+
+def trigger_name(table, event):
+    return f"{table.name}_log_{event}"
+
+
+def render_change_log(tables=CHANGE_LOG_TABLES):
+    """Render the statements creating the change log tables and the
+    triggers logging every insert, update and delete on tables.
+
+    The triggers run once per statement and read the statement's
+    transition table, so a COPY of a million rows costs one trigger call
+    and one INSERT ... SELECT rather than a million. Statement triggers on
+    a partitioned table fire for rows routed to any of its partitions.
+
+    Args:
+        tables (sequence): Table definitions, each with a primary key
+
+    Returns:
+        str: CREATE TABLE, CREATE FUNCTION and CREATE TRIGGER statements
+    """
+    statements = [change_log_table_str]
+
+    for table in tables:
+        key_column = primary_key(table)
+        statements.append(
+            f"CREATE OR REPLACE FUNCTION {function_name(table)}() "
+            f"RETURNS trigger LANGUAGE plpgsql AS $$\n"
+            f"BEGIN\n"
+            f"IF TG_OP = 'DELETE' THEN\n"
+            f"    INSERT INTO change_log (table_name, row_key, operation)\n"
+            f"    SELECT '{table.name}', {key_column}, 'D' FROM old_rows;\n"
+            f"ELSE\n"
+            f"    INSERT INTO change_log (table_name, row_key, operation)\n"
+            f"    SELECT '{table.name}', {key_column}, left(TG_OP, 1) "
+            f"FROM new_rows;\n"
+            f"END IF;\n"
+            f"RETURN NULL;\n"
+            f"END;\n"
+            f"$$;\n"
+        )
+        for event, transition in TRIGGER_EVENTS:
+            statements.append(
+                f"DROP TRIGGER IF EXISTS {trigger_name(table, event)} "
+                f"ON {table.name};\n"
+                f"CREATE TRIGGER {trigger_name(table, event)} "
+                f"AFTER {event.upper()} ON {table.name} "
+                f"REFERENCING {transition} FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION {function_name(table)}();\n"
+            )
+
+    return "".join(statements)
+
+
+def render_drop_change_log(tables=CHANGE_LOG_TABLES):
+    """Render statements removing the triggers and functions installed by
+    render_change_log. The change log tables and their rows are kept."""
+    return "".join(
+        "".join(
+            f"DROP TRIGGER IF EXISTS {trigger_name(table, event)} "
+            f"ON {table.name};\n"
+            for event, _ in TRIGGER_EVENTS
+        )
+        + f"DROP FUNCTION IF EXISTS {function_name(table)}();\n"
+        for table in tables
+    )
+
+
+def install_change_log(conn, tables=CHANGE_LOG_TABLES):
+    """Start logging changes to tables, in one transaction. Installing
+    again replaces the triggers, so it is safe to repeat.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        tables (sequence): Table definitions to log changes of
+    """
+    run_in_transaction(conn, render_change_log(tables))
+    custom_logger().info(
+        f"logging changes to {', '.join(t.name for t in tables)}"
+    )
+
+
+def uninstall_change_log(conn, tables=CHANGE_LOG_TABLES):
+    """Stop logging changes to tables, in one transaction."""
+    run_in_transaction(conn, render_drop_change_log(tables))
+
+
+def run_in_transaction(conn, statements):
+    cursor = conn.cursor()
+    cursor.execute("BEGIN;")
+    try:
+        cursor.execute(statements)
+        cursor.execute("COMMIT;")
+    except Exception:
+        cursor.execute("ROLLBACK;")
+        raise
+
+
+def read_changes(conn, consumer, batch_size=DEFAULT_BATCH_SIZE):
+    """Return up to batch_size changes after the consumer's acknowledged
+    position, oldest first.
+
+    The read walks the change_log primary key from the position, so its
+    cost depends on batch_size and not on the size of the logged tables.
+    Changes are returned again until they are acknowledged.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        consumer (str): name the reader acknowledges its position under
+        batch_size (int): largest number of changes to return
+
+    Returns:
+        list: Change tuples, in (txid, change_id) order
+    """
+    cursor = conn.cursor()
+
+    with timed_stage("read_changes", consumer=consumer) as stage:
+        cursor.execute(
+            "SELECT txid, change_id, table_name, row_key, operation "
+            "FROM change_log "
+            "WHERE (txid, change_id) > ("
+            "SELECT coalesce(max(last_txid), 0), "
+            "coalesce(max(last_change_id), 0) "
+            "FROM change_log_consumers WHERE consumer = %s"
+            ") AND txid < txid_snapshot_xmin(txid_current_snapshot()) "
+            "ORDER BY txid, change_id LIMIT %s;",
+            (consumer, batch_size),
+        )
+        changes = [Change(*row) for row in cursor.fetchall()]
+        stage.rows = len(changes)
+
+    return changes
+
+
+def acknowledge_changes(conn, consumer, change):
+    """Record that a consumer has handled every change up to and including
+    change, usually the last one read_changes returned. A position never
+    moves backwards, so acknowledging an older change does nothing.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        consumer (str): name the reader acknowledges its position under
+        change (Change): last change handled
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO change_log_consumers "
+        "(consumer, last_txid, last_change_id) VALUES (%s, %s, %s) "
+        "ON CONFLICT (consumer) DO UPDATE SET "
+        "last_txid = excluded.last_txid, "
+        "last_change_id = excluded.last_change_id, "
+        "acknowledged_at = now() "
+        "WHERE (change_log_consumers.last_txid, "
+        "change_log_consumers.last_change_id) "
+        "< (excluded.last_txid, excluded.last_change_id);",
+        (consumer, change.txid, change.change_id),
+    )
+
+
+def consume_changes(conn, consumer, handle, batch_size=DEFAULT_BATCH_SIZE):
+    """Pass every unacknowledged change to handle in batches, acknowledging
+    each batch once handle returns. If handle raises, the batch stays
+    unacknowledged and is read again by the next call.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        consumer (str): name the reader acknowledges its position under
+        handle (callable): called with each list of Change tuples
+        batch_size (int): largest number of changes per call of handle
+
+    Returns:
+        int: number of changes handled
+    """
+    handled = 0
+
+    while changes := read_changes(conn, consumer, batch_size):
+        handle(changes)
+        acknowledge_changes(conn, consumer, changes[-1])
+        handled += len(changes)
+        if len(changes) < batch_size:
+            break
+
+    return handled
+
+
+def prune_changes(conn, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete up to batch_size of the oldest changes that every consumer
+    has acknowledged. Nothing is deleted while there are no consumers.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        batch_size (int): largest number of changes to delete
+
+    Returns:
+        int: number of changes deleted
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM change_log WHERE (txid, change_id) IN ("
+        "SELECT txid, change_id FROM change_log "
+        "WHERE (txid, change_id) <= ("
+        "SELECT last_txid, last_change_id FROM change_log_consumers "
+        "ORDER BY last_txid, last_change_id LIMIT 1"
+        ") ORDER BY txid, change_id LIMIT %s"
+        ");",
+        (batch_size,),
+    )
+    return cursor.rowcount
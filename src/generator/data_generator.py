@@ -0,0 +1,400 @@
+import datetime
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from generator import oltp_schema
+from generator.distributions import build_sales_sampler, sample_alias
+from generator.schema import insert_columns, primary_key
+from utils.dim_cache import KeyView
+
+
+SALES_COLUMNS = insert_columns(oltp_schema.sales)
+CUSTOMERS_COLUMNS = insert_columns(oltp_schema.customers)
+SALES_KEY = primary_key(oltp_schema.sales)
+CUSTOMERS_KEY = primary_key(oltp_schema.customers)
+DEFAULT_BATCH_SIZE = 100_000
+DEFAULT_START_DATE = datetime.date(2020, 1, 1)
+DEFAULT_END_DATE = datetime.date(2023, 12, 31)
+DEFAULT_MIN_PRICE = 50.00
+DEFAULT_MAX_PRICE = 5000.00
+
+FIRST_NAMES = (
+    "Aisha", "Alex", "Amelia", "Ana", "Ben", "Carlos", "Chen", "Chloe",
+    "Daniel", "Elena", "Fatima", "George", "Hannah", "Hiroshi", "Isla",
+    "Jack", "James", "Kofi", "Laura", "Leo", "Lucia", "Mei", "Mohammed",
+    "Noah", "Olivia", "Omar", "Priya", "Rosa", "Sam", "Sofia", "Tom", "Zara",
+)
+LAST_NAMES = (
+    "Ahmed", "Brown", "Clarke", "Costa", "Davies", "Evans", "Fernandez",
+    "Garcia", "Green", "Hall", "Hughes", "Ito", "Jones", "Khan", "Kim",
+    "Lopez", "Martin", "Mensah", "Nguyen", "O'Brien", "Patel", "Roberts",
+    "Rossi", "Silva", "Singh", "Smith", "Taylor", "Walker", "Wang",
+    "Williams", "Wilson", "Wright",
+)
+
+
+def generate_data(
+    num_rows,
+    customer_ids,
+    location_ids,
+    batch_size=DEFAULT_BATCH_SIZE,
+    seed=None,
+    start_date=DEFAULT_START_DATE,
+    end_date=DEFAULT_END_DATE,
+    min_price=DEFAULT_MIN_PRICE,
+    max_price=DEFAULT_MAX_PRICE,
+    workers=1,
+    shards=None,
+    skew=None,
+    first_id=None,
+):
+    """Generate rows for the sales table, one batch at a time.
+
+    Each batch is columnar: a dict mapping every name in SALES_COLUMNS to
+    a NumPy array holding that column for the whole batch, so values are
+    drawn with array sampling rather than a Python loop per row. Batches
+    are generated as independently seeded shards, see generate_shards.
+
+    Values are uniform unless skew is given, in which case the alias
+    tables for Zipf location popularity and seasonal order dates are built
+    once here and shared by every shard.
+
+    Args:
+        num_rows (int): total number of sales rows to generate
+        customer_ids (array_like): existing customer_id values to pick
+        from, or a utils.dim_cache.KeyView of them, which only one worker
+        process can use
+        location_ids (array_like): existing location_id values to pick from
+        batch_size (int): maximum number of rows in each batch
+        seed (int): seed for the random generator, for reproducible output
+        start_date (date): earliest order_date, inclusive
+        end_date (date): latest order_date, inclusive
+        min_price (float): lowest price_paid, inclusive
+        max_price (float): highest price_paid, inclusive
+        workers (int): number of worker processes, see generate_shards
+        shards (iterable): indices of the shards to generate, defaults to
+        all of them
+        skew (SalesSkew): non-uniform distribution settings, see
+        generator.distributions
+        first_id (int): if given, number rows with sale_id values from
+        first_id in row order, see generate_shards
+
+    Yields:
+        dict: column name to NumPy array, holding at most batch_size rows
+    """
+    if not isinstance(customer_ids, KeyView):
+        customer_ids = np.asarray(customer_ids)
+    location_ids = np.asarray(location_ids)
+
+    if num_rows < 0:
+        raise ValueError("num_rows must not be negative")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    if len(customer_ids) == 0 or len(location_ids) == 0:
+        raise ValueError("customer_ids and location_ids must not be empty")
+    if end_date < start_date:
+        raise ValueError("end_date must not be before start_date")
+    if max_price < min_price:
+        raise ValueError("max_price must not be below min_price")
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    options = {
+        "customer_ids": customer_ids,
+        "location_ids": location_ids,
+        "start_date": start_date,
+        "end_date": end_date,
+        "min_price": min_price,
+        "max_price": max_price,
+    }
+    if skew is not None:
+        options["sampler"] = build_sales_sampler(
+            skew,
+            location_ids,
+            start_date,
+            end_date,
+            min_price,
+            max_price,
+            seed,
+        )
+
+    yield from generate_shards(
+        generate_sales_batch,
+        num_rows,
+        batch_size,
+        seed,
+        workers,
+        options,
+        shards,
+        ids=None if first_id is None else (SALES_KEY, first_id),
+    )
+
+
+def generate_customers(
+    num_rows,
+    batch_size=DEFAULT_BATCH_SIZE,
+    seed=None,
+    workers=1,
+    shards=None,
+    first_id=None,
+):
+    """Generate rows for the customers table, one batch at a time.
+
+    Args:
+        num_rows (int): total number of customer rows to generate
+        batch_size (int): maximum number of rows in each batch
+        seed (int): seed for the random generator, for reproducible output
+        workers (int): number of worker processes, see generate_shards
+        shards (iterable): indices of the shards to generate, defaults to
+        all of them
+        first_id (int): if given, number rows with customer_id values from
+        first_id in row order, see generate_shards
+
+    Yields:
+        dict: column name to NumPy array, holding at most batch_size rows
+    """
+    if num_rows < 0:
+        raise ValueError("num_rows must not be negative")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    yield from generate_shards(
+        generate_customers_batch,
+        num_rows,
+        batch_size,
+        seed,
+        workers,
+        {},
+        shards,
+        ids=None if first_id is None else (CUSTOMERS_KEY, first_id),
+    )
+
+
+def generate_shards(
+    batch_fn,
+    num_rows,
+    shard_size,
+    seed,
+    workers,
+    options,
+    shards=None,
+    ids=None,
+):
+    """Generate num_rows rows as a sequence of fixed-size shards.
+
+    Shard i draws from a generator seeded with SeedSequence(seed,
+    spawn_key=(i,)). Shard boundaries and seeds depend only on num_rows,
+    shard_size and seed, so the same seed gives identical output whatever
+    the number of workers. With more than one worker, shards are generated
+    in a ProcessPoolExecutor with at most two shards per worker in flight,
+    and are still yielded in shard order. Lambda has no /dev/shm, so only
+    workers=1 can be used there.
+
+    With ids, the rows of shard i are numbered from
+    first_id + i * shard_size, so every shard owns a disjoint id range and
+    any subset of shards can be loaded independently without reading ids
+    back from the database.
+
+    Args:
+        batch_fn (callable): called as batch_fn(rng, size, **options) to
+        generate one shard, must be importable by worker processes
+        num_rows (int): total number of rows to generate
+        shard_size (int): maximum number of rows in each shard
+        seed (int): master seed, a random one is drawn if None
+        workers (int): number of worker processes, None for one per CPU
+        options (dict): keyword arguments passed on to batch_fn
+        shards (iterable): indices of the shards to generate, defaults to
+        all of them
+        ids (tuple): name of a key column to add and the id of the first
+        row, None to leave ids to the database
+
+    Yields:
+        dict: column name to NumPy array, one per shard in shard order
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    if workers is None:
+        workers = os.cpu_count()
+
+    if shards is None:
+        shards = range(count_shards(num_rows, shard_size))
+
+    shards = (
+        (
+            index,
+            min(shard_size, num_rows - index * shard_size),
+            None if ids is None else (ids[0], ids[1] + index * shard_size),
+        )
+        for index in shards
+    )
+
+    if workers == 1:
+        for index, size, shard_ids in shards:
+            yield generate_shard(
+                batch_fn, seed, index, size, options, shard_ids
+            )
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    try:
+        for index, size, shard_ids in shards:
+            pending.append(
+                executor.submit(
+                    generate_shard,
+                    batch_fn,
+                    seed,
+                    index,
+                    size,
+                    options,
+                    shard_ids,
+                )
+            )
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def split_seed(seed, count=2):
+    """Derive count independent seeds from one seed, or Nones if seed is
+    None, for generating several tables from one seed."""
+    if seed is None:
+        return (None,) * count
+    return tuple(np.random.SeedSequence(seed).generate_state(count).tolist())
+
+
+def count_shards(num_rows, shard_size):
+    """Return the number of shards num_rows rows are split into."""
+    return -(-num_rows // shard_size)
+
+
+def generate_shard(batch_fn, seed, index, size, options, ids=None):
+    """Generate a single shard with its own deterministic generator.
+
+    Args:
+        batch_fn (callable): function generating one batch
+        seed (int): master seed
+        index (int): position of the shard
+        size (int): number of rows in the shard
+        options (dict): keyword arguments passed on to batch_fn
+        ids (tuple): name of a key column to add and the shard's first id
+
+    Returns:
+        dict: column name to NumPy array of length size
+    """
+    rng = np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(index,))
+    )
+    batch = batch_fn(rng, size, **options)
+
+    if ids is not None:
+        key, first_id = ids
+        batch = {key: np.arange(first_id, first_id + size), **batch}
+    return batch
+
+
+def generate_customers_batch(rng, size):
+    """Draw one columnar batch of customers rows.
+
+    Args:
+        rng (Generator): NumPy random generator to draw values from
+        size (int): number of rows in the batch
+
+    Returns:
+        dict: column name to NumPy array of length size
+    """
+    first = rng.choice(np.array(FIRST_NAMES), size)
+    last = rng.choice(np.array(LAST_NAMES), size)
+
+    return {"customer_name": np.char.add(np.char.add(first, " "), last)}
+
+
+def generate_sales_batch(
+    rng,
+    size,
+    customer_ids,
+    location_ids,
+    start_date,
+    end_date,
+    min_price,
+    max_price,
+    sampler=None,
+):
+    """Draw one columnar batch of sales rows.
+
+    Args:
+        rng (Generator): NumPy random generator to draw values from
+        size (int): number of rows in the batch
+        customer_ids (ndarray): customer_id values to pick from, or a
+        KeyView of them
+        location_ids (ndarray): location_id values to pick from
+        start_date (date): earliest order_date, inclusive
+        end_date (date): latest order_date, inclusive
+        min_price (float): lowest price_paid, inclusive
+        max_price (float): highest price_paid, inclusive
+        sampler (SalesSampler): precomputed skewed distributions, values
+        are uniform if None
+
+    Returns:
+        dict: column name to NumPy array of length size
+    """
+    if sampler is not None:
+        return generate_skewed_sales_batch(
+            rng, size, customer_ids, start_date, min_price, max_price, sampler
+        )
+
+    num_days = (end_date - start_date).days + 1
+    day_offsets = rng.integers(0, num_days, size)
+
+    # Prices are drawn as whole pence so every value fits NUMERIC(10, 2).
+    pence = rng.integers(
+        round(min_price * 100), round(max_price * 100) + 1, size
+    )
+
+    return {
+        "order_date": np.datetime64(start_date, "D") + day_offsets,
+        "price_paid": pence / 100,
+        "customer_id": pick(rng, customer_ids, size),
+        "location_id": rng.choice(location_ids, size),
+    }
+
+
+def pick(rng, values, size):
+    """Draw size values uniformly, with replacement, as rng.choice does,
+    from an array or a KeyView, which can only be indexed."""
+    return values[rng.integers(0, len(values), size)]
+
+
+def generate_skewed_sales_batch(
+    rng, size, customer_ids, start_date, min_price, max_price, sampler
+):
+    """Draw one columnar batch of sales rows from a SalesSampler.
+
+    Each location is drawn from the Zipf alias table, then each order_date
+    from the seasonal alias table of that location's country. Log-normal
+    prices are clipped to the price range.
+    """
+    locations = sample_alias(rng, sampler.locations, size)
+    day_offsets = sample_alias(
+        rng, sampler.days, size, rows=sampler.location_groups[locations]
+    )
+    prices = rng.lognormal(sampler.price_mu, sampler.price_sigma, size)
+    pence = np.clip(
+        np.round(prices * 100),
+        round(min_price * 100),
+        round(max_price * 100),
+    )
+
+    return {
+        "order_date": np.datetime64(start_date, "D") + day_offsets,
+        "price_paid": pence / 100,
+        "customer_id": pick(rng, customer_ids, size),
+        "location_id": sampler.location_ids[locations],
+    }
@@ -0,0 +1,301 @@
+import datetime
+import math
+from collections import namedtuple
+import numpy as np
+
+
+DEFAULT_LOCATION_EXPONENT = 1.1
+DEFAULT_PEAK_MONTH = 7
+DEFAULT_SEASONAL_AMPLITUDE = 0.5
+DEFAULT_PRICE_SIGMA = 0.6
+
+# Month each seeded country's holiday sales peak in, by country_name, for
+# the countries that do not peak in DEFAULT_PEAK_MONTH. Southern summers
+# peak around January, the Caribbean, Central America and the Maldives in
+# their northern winter dry season, South and South East Asia in the cool
+# season, Japan with the cherry blossom, and safari countries in the dry
+# season. See country_peak_months.
+PEAK_MONTHS = {
+    "Antigua": 2,
+    "Argentina": 1,
+    "Cambodia": 12,
+    "Chile": 1,
+    "Colombia": 12,
+    "Costa Rica": 2,
+    "Dominica": 2,
+    "Greece": 8,
+    "India": 12,
+    "Indonesia": 8,
+    "Japan": 4,
+    "Maldives": 2,
+    "Mexico": 2,
+    "Morocco": 4,
+    "Nicaragua": 2,
+    "Saint Vincent and the Grenadines": 2,
+    "Singapore": 12,
+    "South Africa": 12,
+    "Spain": 8,
+    "St. Lucia": 2,
+    "Tanzania": 8,
+    "Thailand": 12,
+    "Turks and Caicos Islands": 2,
+    "Vietnam": 3,
+}
+
+# Skewed sales generation settings, see build_sales_sampler.
+#   location_exponent: Zipf exponent of location popularity, by the order of
+#   location_ids, so the first location is the most popular
+#   location_countries: country of each location, parallel to location_ids;
+#   locations in the same country share a seasonal pattern
+#   peak_months: country to the month (1 to 12) its sales peak in, countries
+#   not listed peak in DEFAULT_PEAK_MONTH; country_peak_months builds the
+#   default map of the seeded countries
+#   seasonal_amplitude: 0 for no seasonality, up to but below 1
+#   price_median: median price_paid, defaults to the geometric mean of the
+#   price range
+#   price_sigma: standard deviation of log(price_paid)
+SalesSkew = namedtuple(
+    "SalesSkew",
+    [
+        "location_exponent",
+        "location_countries",
+        "peak_months",
+        "seasonal_amplitude",
+        "price_median",
+        "price_sigma",
+    ],
+    defaults=(
+        DEFAULT_LOCATION_EXPONENT,
+        None,
+        None,
+        DEFAULT_SEASONAL_AMPLITUDE,
+        None,
+        DEFAULT_PRICE_SIGMA,
+    ),
+)
+
+# Walker's alias method tables, for drawing category i with probability
+# proportional to weights[i] in constant time. Two dimensional tables hold
+# one distribution per row.
+AliasTable = namedtuple("AliasTable", ["probability", "alias"])
+
+# Everything generate_sales_batch needs to draw skewed rows, built once per
+# run so that each batch only indexes into precomputed arrays.
+SalesSampler = namedtuple(
+    "SalesSampler",
+    [
+        "location_ids",
+        "locations",
+        "location_groups",
+        "days",
+        "price_mu",
+        "price_sigma",
+    ],
+)
+
+
+def build_alias_table(weights):
+    """Build an alias table with Vose's method in O(n).
+
+    Args:
+        weights (array_like): non-negative relative weight of each category
+
+    Returns:
+        AliasTable: probability and alias arrays, one entry per category
+    """
+    weights = np.asarray(weights, dtype=float)
+
+    if weights.ndim != 1 or len(weights) == 0:
+        raise ValueError("weights must be a non-empty one dimensional array")
+    if (weights < 0).any() or not weights.sum() > 0:
+        raise ValueError("weights must be non-negative and not all zero")
+
+    n = len(weights)
+    scaled = (weights * n / weights.sum()).tolist()
+    probability = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+
+    return AliasTable(probability, alias)
+
+
+def stack_alias_tables(tables):
+    """Stack alias tables over the same number of categories into one two
+    dimensional table, for sample_alias with rows."""
+    return AliasTable(
+        np.vstack([table.probability for table in tables]),
+        np.vstack([table.alias for table in tables]),
+    )
+
+
+def sample_alias(rng, table, size, rows=None):
+    """Draw category indices from an alias table, vectorised.
+
+    Args:
+        rng (Generator): NumPy random generator to draw values from
+        table (AliasTable): table to draw from
+        size (int): number of draws
+        rows (ndarray): for a two dimensional table, the row to draw each
+        value from
+
+    Returns:
+        ndarray: size category indices
+    """
+    columns = rng.integers(0, table.probability.shape[-1], size)
+    accept = rng.random(size)
+
+    if rows is None:
+        probability = table.probability[columns]
+        alias = table.alias[columns]
+    else:
+        probability = table.probability[rows, columns]
+        alias = table.alias[rows, columns]
+
+    return np.where(accept < probability, columns, alias)
+
+
+def zipf_weights(n, exponent=DEFAULT_LOCATION_EXPONENT):
+    """Return Zipf weights 1 / rank ** exponent for ranks 1 to n."""
+    return 1.0 / np.arange(1, n + 1) ** exponent
+
+
+def country_peak_months(country_ids, country_names, peak_months=PEAK_MONTHS):
+    """Key peak months by country_id, for SalesSkew.peak_months, given the
+    id of each country name.
+
+    Args:
+        country_ids (sequence): country_id values
+        country_names (sequence): country_name of each country_id
+        peak_months (dict): country_name to the month its sales peak in
+
+    Returns:
+        dict: country_id to peak month, for the countries in peak_months
+    """
+    return {
+        country_id: peak_months[name]
+        for country_id, name in zip(country_ids, country_names)
+        if name in peak_months
+    }
+
+
+def seasonal_weights(
+    start_date,
+    end_date,
+    peak_month=DEFAULT_PEAK_MONTH,
+    amplitude=DEFAULT_SEASONAL_AMPLITUDE,
+):
+    """Return a weight for each day from start_date to end_date following
+    a yearly cosine that peaks mid peak_month.
+
+    Args:
+        start_date (date): first day, inclusive
+        end_date (date): last day, inclusive
+        peak_month (int): month of the year sales peak in, 1 to 12
+        amplitude (float): relative size of the seasonal swing, 0 to below 1
+
+    Returns:
+        ndarray: one weight per day
+    """
+    if not 1 <= peak_month <= 12:
+        raise ValueError("peak_month must be from 1 to 12")
+    if not 0 <= amplitude < 1:
+        raise ValueError("amplitude must be at least 0 and below 1")
+
+    days = np.arange(
+        np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + 1
+    )
+    day_of_year = (days - days.astype("datetime64[Y]")).astype(int)
+    peak_day = datetime.date(2001, peak_month, 15).timetuple().tm_yday - 1
+
+    phase = 2 * np.pi * (day_of_year - peak_day) / 365.25
+    return 1 + amplitude * np.cos(phase)
+
+
+def build_sales_sampler(
+    skew,
+    location_ids,
+    start_date,
+    end_date,
+    min_price,
+    max_price,
+    seed=None,
+):
+    """Precompute the alias tables and parameters for skewed sales.
+
+    Location popularity follows a Zipf law over a seeded permutation of
+    location_ids, so popularity does not follow id order, and locations
+    whose country is None, such as the seed's header row, are never
+    drawn. Order dates follow a yearly season per country, with one day
+    alias table per country, selected by each drawn location. Prices are
+    log-normal.
+
+    Args:
+        skew (SalesSkew): distribution settings
+        location_ids (ndarray): location_id values to pick from
+        start_date (date): earliest order_date, inclusive
+        end_date (date): latest order_date, inclusive
+        min_price (float): lowest price_paid, inclusive
+        max_price (float): highest price_paid, inclusive
+        seed (int): seed for the order of location popularity
+
+    Returns:
+        SalesSampler: precomputed sampler
+    """
+    location_ids = np.asarray(location_ids)
+    peak_months = skew.peak_months or {}
+    ranks = np.random.default_rng(seed).permutation(len(location_ids))
+    location_weights = zipf_weights(
+        len(location_ids), skew.location_exponent
+    )[ranks]
+
+    if skew.location_countries is None:
+        countries = [None]
+        location_groups = np.zeros(len(location_ids), dtype=int)
+    else:
+        if len(skew.location_countries) != len(location_ids):
+            raise ValueError(
+                "location_countries must have one entry per location"
+            )
+        countries = list(dict.fromkeys(skew.location_countries))
+        group_of = {country: i for i, country in enumerate(countries)}
+        location_groups = np.array(
+            [group_of[country] for country in skew.location_countries]
+        )
+        location_weights[
+            [country is None for country in skew.location_countries]
+        ] = 0
+
+    days = stack_alias_tables(
+        [
+            build_alias_table(
+                seasonal_weights(
+                    start_date,
+                    end_date,
+                    peak_months.get(country, DEFAULT_PEAK_MONTH),
+                    skew.seasonal_amplitude,
+                )
+            )
+            for country in countries
+        ]
+    )
+
+    if min_price <= 0:
+        raise ValueError("min_price must be positive for log-normal prices")
+    price_median = skew.price_median or math.sqrt(min_price * max_price)
+
+    return SalesSampler(
+        location_ids=location_ids,
+        locations=build_alias_table(location_weights),
+        location_groups=location_groups,
+        days=days,
+        price_mu=math.log(price_median),
+        price_sigma=skew.price_sigma,
+    )
@@ -0,0 +1,470 @@
+import datetime
+import hashlib
+import io
+import json
+import os
+from functools import partial
+import numpy as np
+from generator.data_generator import (
+    generate_customers,
+    generate_data,
+    SALES_COLUMNS,
+    SALES_KEY,
+    CUSTOMERS_COLUMNS,
+    CUSTOMERS_KEY,
+    DEFAULT_BATCH_SIZE,
+    split_seed,
+)
+from generator.loader import (
+    advance_sequence,
+    ensure_partitions,
+    resolve_references,
+)
+from generator.distributions import country_peak_months
+from generator.oltp_schema import tables, countries, locations
+from generator.pipeline import pipeline
+from generator.schema import dependency_order, primary_key
+from utils.logger import timed_stage
+
+
+FORMATS = ("csv", "parquet")
+MANIFEST_NAME = "manifest.json"
+READ_BLOCK_SIZE = 1024 * 1024
+CSV_CHUNK_ROWS = 8192
+CSV_BUFFER_SIZE = 4 * 1024 * 1024
+
+_CSV_SPECIAL = (",", '"', "\n", "\r")
+
+
+def export_dataset(
+    directory,
+    num_sales,
+    num_customers,
+    batch_size=DEFAULT_BATCH_SIZE,
+    seed=None,
+    workers=1,
+    file_format="csv",
+    skew=None,
+):
+    """Write every OLTP table as sharded files with a manifest per table.
+
+    Seeded tables are written with the ids a fresh database assigns them.
+    Customers and sales are written with ids assigned client side from 1,
+    and sales reference those customer ids. Each generated batch becomes
+    one shard, so shards, like batches, depend only on the seed.
+
+    Args:
+        directory (str): directory to write one subdirectory per table to
+        num_sales (int): number of sales rows to generate
+        num_customers (int): number of customers rows to generate
+        batch_size (int): rows per shard
+        seed (int): seed for reproducible output
+        workers (int): number of generator processes
+        file_format (str): "csv" or "parquet"
+        skew (SalesSkew): non-uniform sales distributions, see
+        seeded_skew for the fields filled in from the seed
+
+    Returns:
+        dict: table name to manifest
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"file_format must be one of {FORMATS}")
+
+    customers_seed, sales_seed = split_seed(seed)
+    manifests = {}
+    seeded = {}
+
+    for table in dependency_order(tables):
+        if table.seed is not None:
+            columns, rows = seed_rows_with_ids(table, tables)
+            seeded[table.name] = {
+                column: np.array(values, dtype=object)
+                for column, values in zip(columns, zip(*rows))
+            }
+            manifests[table.name] = write_table(
+                directory, table, [seeded[table.name]], columns, file_format
+            )
+
+    location_ids = seeded[locations.name]["location_id"].astype(int)
+    if skew is not None:
+        skew = seeded_skew(skew)
+
+    table_by_name = {table.name: table for table in tables}
+    manifests["customers"] = write_table(
+        directory,
+        table_by_name["customers"],
+        generate_customers(
+            num_customers, batch_size, customers_seed, workers, first_id=1
+        ),
+        (CUSTOMERS_KEY,) + CUSTOMERS_COLUMNS,
+        file_format,
+    )
+    manifests["sales"] = write_table(
+        directory,
+        table_by_name["sales"],
+        generate_data(
+            num_sales,
+            np.arange(1, num_customers + 1),
+            location_ids,
+            batch_size=batch_size,
+            seed=sales_seed,
+            workers=workers,
+            skew=skew,
+            first_id=1,
+        ),
+        (SALES_KEY,) + SALES_COLUMNS,
+        file_format,
+    )
+
+    return manifests
+
+
+def seeded_skew(skew):
+    """Fill in the country of each seeded location and the peak months of
+    the seeded countries, see country_peak_months, where skew leaves them
+    None, keyed by the ids a fresh database assigns, as a skewed load
+    reads them, see generator.loader.read_ids and read_peak_months.
+
+    Args:
+        skew (SalesSkew): non-uniform sales distributions
+
+    Returns:
+        SalesSkew: skew with location_countries and peak_months set
+    """
+    if skew.location_countries is None:
+        columns, rows = seed_rows_with_ids(locations, tables)
+        seeded = dict(zip(columns, zip(*rows)))
+        skew = skew._replace(location_countries=list(seeded["country_id"]))
+    if skew.peak_months is None:
+        columns, rows = seed_rows_with_ids(countries, tables)
+        seeded = dict(zip(columns, zip(*rows)))
+        skew = skew._replace(
+            peak_months=country_peak_months(
+                seeded["country_id"], seeded["country_name"]
+            )
+        )
+    return skew
+
+
+def seed_rows_with_ids(table, tables):
+    """Return a seeded table's rows with their primary key and with parent
+    natural keys replaced by ids, as numbered by a fresh load of the seeds.
+
+    Args:
+        table (Table): definition of a table with a seed
+        tables (sequence): all Table definitions, to resolve parents from
+
+    Returns:
+        tuple: column names and a list of row tuples
+    """
+    by_name = {t.name: t for t in tables}
+    key_maps = {}
+
+    for fk in table.foreign_keys:
+        if fk.natural_key is None or fk.column not in table.seed.columns:
+            continue
+        parent_seed = by_name[fk.table].seed
+        position = parent_seed.columns.index(fk.natural_key)
+        key_maps[fk.column] = {
+            row[position]: index
+            for index, row in enumerate(parent_seed.rows, start=1)
+        }
+
+    rows = resolve_references(table.seed.columns, table.seed.rows, key_maps)
+    return (primary_key(table),) + tuple(table.seed.columns), [
+        (index,) + row for index, row in enumerate(rows, start=1)
+    ]
+
+
+def write_table(directory, table, batches, columns, file_format="csv"):
+    """Write batches as one shard file each, then the table's manifest.
+
+    Batches are generated, and converted to Arrow tables for parquet, in
+    pipeline threads while earlier shards are written, see
+    generator.pipeline. CSV shards are formatted as they are written, see
+    write_csv.
+
+    Args:
+        directory (str): export directory
+        table (Table): definition of the table written
+        batches (iterable): dicts of column name to array
+        columns (sequence): columns to write, in order
+        file_format (str): "csv" or "parquet"
+
+    Returns:
+        dict: the manifest written
+    """
+    table_directory = os.path.join(directory, table.name)
+    os.makedirs(table_directory, exist_ok=True)
+    shards = []
+    buffer = bytearray(CSV_BUFFER_SIZE if file_format == "csv" else 0)
+    serialise = partial(
+        serialise_shard, table=table, columns=columns, file_format=file_format
+    )
+
+    with timed_stage("export", table=table.name) as stage:
+        for index, shard in enumerate(pipeline(batches, [serialise])):
+            name = f"{table.name}-{index:05d}.{file_format}"
+            path = os.path.join(table_directory, name)
+            data = shard.pop("data")
+            if file_format == "csv":
+                with open(path, "wb") as f:
+                    write_csv(f, data, columns, buffer)
+            else:
+                write_parquet(path, data)
+            shards.append(
+                {
+                    "file": name,
+                    **shard,
+                    "bytes": os.path.getsize(path),
+                    "sha256": file_digest(path),
+                }
+            )
+
+        manifest = {
+            "table": table.name,
+            "format": file_format,
+            "columns": list(columns),
+            "rows": sum(shard["rows"] for shard in shards),
+            "shards": shards,
+        }
+        with open(os.path.join(table_directory, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        stage.rows = manifest["rows"]
+        stage.bytes = sum(shard["bytes"] for shard in shards)
+
+    return manifest
+
+
+def serialise_shard(batch, table, columns, file_format):
+    """Convert one batch to an Arrow table for parquet, or leave it for
+    write_csv, and note its row count and, for a partitioned table, the
+    range of its partition column."""
+    shard = {"rows": len(batch[columns[0]])}
+
+    if table.partition_by is not None and shard["rows"]:
+        values = batch[table.partition_by]
+        shard["min"] = str(values.min())
+        shard["max"] = str(values.max())
+
+    if file_format == "csv":
+        shard["data"] = batch
+    else:
+        from utils.arrow import to_arrow_table
+
+        shard["data"] = to_arrow_table(batch, table, columns)
+    return shard
+
+
+def write_csv(f, batch, columns, buffer):
+    """Write a columnar batch to a binary file as CSV, see
+    format_csv_batch, CSV_CHUNK_ROWS rows at a time.
+
+    Encoded chunks are gathered in buffer, a preallocated bytearray reused
+    for every shard, which is written out whenever the next chunk would
+    not fit, so a shard is never held whole as text or bytes.
+
+    Args:
+        f (file): binary file to write to
+        batch (dict): column name to array
+        columns (sequence): names of the columns to write, in order
+        buffer (bytearray): space to gather chunks in
+    """
+    used = 0
+    with memoryview(buffer) as view:
+        for start in range(0, len(batch[columns[0]]), CSV_CHUNK_ROWS):
+            chunk = format_csv_batch(
+                {
+                    column: batch[column][start:start + CSV_CHUNK_ROWS]
+                    for column in columns
+                },
+                columns,
+            ).encode()
+            if used + len(chunk) > len(buffer):
+                f.write(view[:used])
+                used = 0
+            if len(chunk) > len(buffer):
+                f.write(chunk)
+                continue
+            view[used:used + len(chunk)] = chunk
+            used += len(chunk)
+        f.write(view[:used])
+
+
+def format_csv_batch(batch, columns):
+    """Serialise a columnar batch as headerless CSV, as read by
+    COPY ... WITH (FORMAT csv). None is written as an empty field and an
+    empty string as "".
+
+    Args:
+        batch (dict): column name to array
+        columns (sequence): names of the columns to serialise, in order
+
+    Returns:
+        str: newline terminated CSV lines, one per row
+    """
+    text_columns = []
+
+    for column in columns:
+        values = batch[column]
+        if values.dtype.kind not in "OSU":
+            text_columns.append(values.astype(str).tolist())
+        else:
+            text_columns.append([format_csv_value(v) for v in values])
+
+    if not text_columns or not text_columns[0]:
+        return ""
+
+    return "\n".join(",".join(row) for row in zip(*text_columns)) + "\n"
+
+
+def format_csv_value(value):
+    if value is None:
+        return ""
+    value = str(value)
+    if value == "" or any(c in value for c in _CSV_SPECIAL):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def write_parquet(path, arrow_table):
+    import pyarrow.parquet as pq
+
+    pq.write_table(arrow_table, path, compression="zstd")
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        while block := f.read(READ_BLOCK_SIZE):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def read_manifests(directory):
+    """Read the manifest of every table exported to directory.
+
+    Returns:
+        dict: table name to manifest
+    """
+    manifests = {}
+
+    for table in tables:
+        path = os.path.join(directory, table.name, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifests[table.name] = json.load(f)
+
+    return manifests
+
+
+def verify_export(directory, manifests):
+    """Check every shard's size and checksum against its manifest.
+
+    Raises:
+        ValueError: naming the first shard that does not match
+    """
+    for table_name, manifest in manifests.items():
+        for shard in manifest["shards"]:
+            path = os.path.join(directory, table_name, shard["file"])
+            if (
+                not os.path.exists(path)
+                or os.path.getsize(path) != shard["bytes"]
+                or file_digest(path) != shard["sha256"]
+            ):
+                raise ValueError(f"{path} does not match its manifest")
+
+
+def load_export(conn, directory, verify=True):
+    """Stream an export's shards into the database with COPY, parents
+    first.
+
+    Seeded tables that already hold rows, as after migration 1, are
+    skipped. Where the primary key was exported its sequence is moved
+    past the loaded ids. Partitions are created before each shard of a
+    partitioned table is copied.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        directory (str): export directory
+        verify (bool): check every checksum before loading anything
+
+    Returns:
+        dict: table name to number of rows loaded
+    """
+    manifests = read_manifests(directory)
+    if verify:
+        verify_export(directory, manifests)
+
+    row_counts = {}
+
+    for table in dependency_order(tables):
+        manifest = manifests.get(table.name)
+        if manifest is None:
+            continue
+        if table.seed is not None and has_rows(conn, table.name):
+            continue
+
+        columns = manifest["columns"]
+        row_counts[table.name] = 0
+        with timed_stage("load_export", table=table.name) as stage:
+            for shard in manifest["shards"]:
+                if "min" in shard:
+                    ensure_partitions(
+                        conn,
+                        table,
+                        datetime.date.fromisoformat(shard["min"]),
+                        datetime.date.fromisoformat(shard["max"]),
+                    )
+                path = os.path.join(directory, table.name, shard["file"])
+                row_counts[table.name] += copy_shard(
+                    conn, table.name, columns, path, manifest["format"]
+                )
+            stage.rows = row_counts[table.name]
+
+        if primary_key(table) in columns:
+            advance_sequence(conn, table)
+
+    return row_counts
+
+
+def copy_shard(conn, table_name, columns, path, file_format="csv"):
+    """COPY one shard file into a table, streaming it from disk.
+
+    Returns:
+        int: number of rows loaded
+    """
+    cursor = conn.cursor()
+    statement = (
+        f"COPY {table_name} ({', '.join(columns)}) "
+        "FROM STDIN WITH (FORMAT csv);"
+    )
+
+    if file_format == "csv":
+        with open(path, "rb") as f:
+            cursor.execute(statement, stream=f)
+    else:
+        cursor.execute(statement, stream=iter_parquet_csv(path))
+
+    return cursor.rowcount
+
+
+def iter_parquet_csv(path):
+    """Yield a Parquet file's rows as CSV, one record batch at a time."""
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    options = pa_csv.WriteOptions(include_header=False)
+    for record_batch in pq.ParquetFile(path).iter_batches():
+        buffer = io.BytesIO()
+        pa_csv.write_csv(record_batch, buffer, options)
+        yield buffer.getvalue()
+
+
+def has_rows(conn, table_name):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name});")
+    return cursor.fetchone()[0]
@@ -0,0 +1,472 @@
+import datetime
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from generator.data_generator import (
+    generate_data,
+    count_shards,
+    SALES_COLUMNS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_START_DATE,
+    DEFAULT_END_DATE,
+)
+from generator.distributions import SalesSkew
+from generator.initialisation import check_env_variables
+from generator.loader import (
+    copy_batches,
+    ensure_partitions,
+    read_ids,
+    read_peak_months,
+    shard_ranges,
+)
+from generator.oltp_schema import sales
+from utils.connections import get_connection, discard_connection
+from utils.logger import custom_logger, timed_stage
+
+
+DB_NAME = "etlhols_oltp"
+WORKER_FUNCTION_ENV = "WORKER_FUNCTION"
+DEFAULT_SHARDS = 16
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_INVOKE_THREADS = 8
+# A shard dispatched longer ago than this without finishing, e.g. because
+# its worker timed out, is dispatched again. Must exceed the worker timeout.
+DEFAULT_STALE_SECONDS = 20 * 60
+
+shard_state_table_str = """
+CREATE TABLE IF NOT EXISTS generation_shards (
+    run_id TEXT NOT NULL,
+    shard INT NOT NULL,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    rows_loaded BIGINT,
+    error TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, shard)
+);
+"""
+
+
+def coordinate_generation(event, context):
+    """Split a sales load into shards and invoke a generate_shard worker
+    Lambda for each, see coordinate.
+
+    Args:
+        event (dict): "run_id" and "num_sales", and optionally "shards",
+        "batch_size", "seed", "start_date", "end_date", "skewed" and
+        "max_attempts"
+        context: Lambda context, unused
+
+    Returns:
+        dict: "Result" and, on success, the summary returned by coordinate
+    """
+    logger = custom_logger()
+    response = {"Result": "Failed"}
+    conn = None
+
+    try:
+        missing_list = check_env_variables()
+        if WORKER_FUNCTION_ENV not in os.environ:
+            missing_list.append(WORKER_FUNCTION_ENV)
+        if missing_list:
+            raise ValueError(
+                f"Required environment variables missing: {str(missing_list)}"
+            )
+
+        conn = connect_from_env()
+        response.update(
+            coordinate(
+                conn, event, LambdaInvoker(os.environ[WORKER_FUNCTION_ENV])
+            )
+        )
+        response["Result"] = "Success"
+    except Exception as e:
+        response["Result"] = "Error"
+        logger.error(e)
+        if conn is not None:
+            discard_connection(conn)
+
+    return response
+
+
+def generate_shard(event, context):
+    """Generate and load the sales of one shard, see run_shard.
+
+    Args:
+        event (dict): shard payload, as planned by plan_shards
+        context: Lambda context, unused
+
+    Returns:
+        dict: "Result" and, on success, the shard's "status" and "rows"
+    """
+    logger = custom_logger()
+    response = {"Result": "Failed"}
+    conn = None
+
+    try:
+        if missing_list := check_env_variables():
+            raise ValueError(
+                f"Required environment variables missing: {str(missing_list)}"
+            )
+
+        conn = connect_from_env()
+        response.update(run_shard(conn, event))
+        response["Result"] = "Success"
+    except Exception as e:
+        response["Result"] = "Error"
+        logger.error(e)
+        if conn is not None:
+            discard_connection(conn)
+
+    return response
+
+
+def coordinate(
+    conn,
+    event,
+    invoke,
+    threads=DEFAULT_INVOKE_THREADS,
+    stale_seconds=DEFAULT_STALE_SECONDS,
+):
+    """Register a run's shards and dispatch every one not yet loaded.
+
+    The first call for a run_id plans the shards and stores each one's
+    payload in generation_shards; later calls reuse the stored payloads, so
+    a retried shard generates exactly the rows it would have the first
+    time. Shards that are pending, failed, or dispatched more than
+    stale_seconds ago are dispatched, up to max_attempts times each.
+    Workers record completion in the same transaction as their COPY, so
+    calling this again after failures loads each remaining shard once.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        event (dict): "run_id" and "num_sales", and optionally "shards",
+        "batch_size", "seed", "start_date", "end_date", "skewed" and
+        "max_attempts"
+        invoke (callable): called with each shard payload to start its
+        worker, e.g. a LambdaInvoker
+        threads (int): number of invocations made at once
+        stale_seconds (float): seconds after which an unfinished dispatched
+        shard is dispatched again
+
+    Returns:
+        dict: "run_id", number of shards "dispatched", number of shards by
+        "status" and the "rows" loaded by finished shards
+    """
+    logger = custom_logger()
+    for key in ("run_id", "num_sales"):
+        if key not in event:
+            raise ValueError(f"event must include {key}")
+
+    run_id = str(event["run_id"])
+    start_date = datetime.date.fromisoformat(
+        event.get("start_date", DEFAULT_START_DATE.isoformat())
+    )
+    end_date = datetime.date.fromisoformat(
+        event.get("end_date", DEFAULT_END_DATE.isoformat())
+    )
+    cursor = conn.cursor()
+    cursor.execute(shard_state_table_str)
+
+    customer_ids, _, _ = read_ids(conn)
+    payloads = plan_shards(
+        run_id,
+        event["num_sales"],
+        (int(customer_ids[0]), int(customer_ids[-1])),
+        num_shards=event.get("shards", DEFAULT_SHARDS),
+        batch_size=event.get("batch_size", DEFAULT_BATCH_SIZE),
+        seed=event.get("seed"),
+        start_date=start_date,
+        end_date=end_date,
+        skewed=event.get("skewed", False),
+    )
+    register_shards(conn, run_id, payloads)
+    # Workers load inside a transaction, where creating a partition would
+    # lock sales against every other worker until it commits.
+    ensure_partitions(conn, sales, start_date, end_date)
+
+    claimed = claim_shards(
+        conn,
+        run_id,
+        event.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+        stale_seconds,
+    )
+    with timed_stage("dispatch", run_id=run_id) as stage:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                (shard, executor.submit(invoke, payload))
+                for shard, payload in claimed
+            ]
+        for shard, future in futures:
+            if (error := future.exception()) is not None:
+                logger.error(f"failed to invoke shard {shard}: {error}")
+                record_failure(conn, run_id, shard, error)
+        stage.rows = len(claimed)
+
+    statuses, rows = read_progress(conn, run_id)
+    return {
+        "run_id": run_id,
+        "dispatched": len(claimed),
+        "status": statuses,
+        "rows": rows,
+    }
+
+
+def plan_shards(
+    run_id,
+    num_rows,
+    customer_ids,
+    num_shards=DEFAULT_SHARDS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    seed=None,
+    start_date=DEFAULT_START_DATE,
+    end_date=DEFAULT_END_DATE,
+    skewed=False,
+):
+    """Split a sales load into worker payloads over disjoint ranges of
+    generator shards, as generator.loader.sales_partitions does.
+
+    Together the payloads generate exactly the rows generate_data would
+    for the same seed. A random seed is drawn if none is given, and stored
+    in every payload so a retry generates the same rows.
+
+    Args:
+        run_id (str): identifies the run
+        num_rows (int): total number of sales rows
+        customer_ids (tuple): first and last customer_id, the range of
+        existing customers workers pick from
+        num_shards (int): number of worker shards to split into
+        batch_size (int): maximum number of rows in each batch
+        seed (int): master seed
+        start_date (date): earliest order_date, inclusive
+        end_date (date): latest order_date, inclusive
+        skewed (bool): generate with the default SalesSkew
+
+    Returns:
+        list: JSON serialisable payload dicts, one per worker shard
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    return [
+        {
+            "run_id": run_id,
+            "shard": index,
+            "shards": [shards.start, shards.stop],
+            "num_rows": num_rows,
+            "batch_size": batch_size,
+            "seed": seed,
+            "customer_ids": list(customer_ids),
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "skewed": skewed,
+        }
+        for index, shards in enumerate(
+            shard_ranges(count_shards(num_rows, batch_size), num_shards)
+        )
+    ]
+
+
+def register_shards(conn, run_id, payloads):
+    """Insert a pending row per shard in one statement. Shards already
+    registered for the run keep their stored payload and status."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO generation_shards (run_id, shard, payload) "
+        "SELECT %s, shard, payload::jsonb "
+        "FROM unnest(%s::int[], %s::text[]) AS p (shard, payload) "
+        "ON CONFLICT (run_id, shard) DO NOTHING;",
+        (
+            run_id,
+            [payload["shard"] for payload in payloads],
+            [json.dumps(payload) for payload in payloads],
+        ),
+    )
+
+
+def claim_shards(conn, run_id, max_attempts, stale_seconds):
+    """Mark the run's shards that need a worker as dispatched, counting an
+    attempt for each, in one statement so concurrent coordinators never
+    claim the same shard.
+
+    Returns:
+        list: (shard, payload) tuples of the claimed shards
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE generation_shards "
+        "SET status = 'dispatched', attempts = attempts + 1, "
+        "updated_at = now() "
+        "WHERE run_id = %s AND attempts < %s AND ("
+        "status IN ('pending', 'failed') OR (status = 'dispatched' "
+        "AND updated_at < now() - make_interval(secs => %s))) "
+        "RETURNING shard, payload;",
+        (run_id, max_attempts, stale_seconds),
+    )
+    return sorted(cursor.fetchall())
+
+
+def run_shard(conn, payload):
+    """Generate one shard's sales and load them, recording the shard as
+    done in the same transaction.
+
+    The shard's row is locked first, so a duplicate invocation waits and
+    then finds the shard done, and a failed load leaves neither rows nor
+    a done status behind. A failure is recorded on the shard for the
+    coordinator to retry, and raised.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        payload (dict): shard payload, as planned by plan_shards
+
+    Returns:
+        dict: the shard's "status" and the "rows" loaded
+    """
+    logger = custom_logger()
+    run_id, shard = payload["run_id"], payload["shard"]
+    cursor = conn.cursor()
+    cursor.execute("BEGIN;")
+
+    try:
+        cursor.execute(
+            "SELECT status FROM generation_shards "
+            "WHERE run_id = %s AND shard = %s FOR UPDATE;",
+            (run_id, shard),
+        )
+        if (state := cursor.fetchone()) is None:
+            raise ValueError(f"shard {shard} of run {run_id} is unknown")
+        if state[0] == "done":
+            cursor.execute("ROLLBACK;")
+            logger.info(f"shard {shard} of run {run_id} is already loaded")
+            return {"status": "done", "rows": 0}
+
+        first, last = payload["customer_ids"]
+        customer_ids, location_ids, countries = read_ids(
+            conn, (first, last + 1)
+        )
+        peak_months = read_peak_months(conn) if payload["skewed"] else None
+        with timed_stage("shard", run_id=run_id, shard=shard) as stage:
+            stage.rows = copy_batches(
+                conn,
+                "sales",
+                shard_batches(
+                    payload, customer_ids, location_ids, countries, peak_months
+                ),
+                SALES_COLUMNS,
+            )
+        cursor.execute(
+            "UPDATE generation_shards SET status = 'done', "
+            "rows_loaded = %s, error = NULL, updated_at = now() "
+            "WHERE run_id = %s AND shard = %s;",
+            (stage.rows, run_id, shard),
+        )
+        cursor.execute("COMMIT;")
+    except Exception as e:
+        try:
+            cursor.execute("ROLLBACK;")
+            record_failure(conn, run_id, shard, e)
+        except Exception as record_error:
+            logger.error(f"failed to record shard failure: {record_error}")
+        raise
+
+    return {"status": "done", "rows": stage.rows}
+
+
+def shard_batches(
+    payload, customer_ids, location_ids, countries, peak_months=None
+):
+    """Generate the batches of a shard payload, see plan_shards, picking
+    from customer_ids, the existing ids in the payload's range, so every
+    shard of a run picks from the same ids however many customers were
+    added since it was planned. A skewed payload peaks each country in the
+    month peak_months gives, see generator.loader.read_peak_months."""
+    return generate_data(
+        payload["num_rows"],
+        customer_ids,
+        location_ids,
+        batch_size=payload["batch_size"],
+        seed=payload["seed"],
+        start_date=datetime.date.fromisoformat(payload["start_date"]),
+        end_date=datetime.date.fromisoformat(payload["end_date"]),
+        shards=range(*payload["shards"]),
+        skew=(
+            SalesSkew(location_countries=countries, peak_months=peak_months)
+            if payload["skewed"]
+            else None
+        ),
+    )
+
+
+def record_failure(conn, run_id, shard, error):
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE generation_shards SET status = 'failed', error = %s, "
+        "updated_at = now() "
+        "WHERE run_id = %s AND shard = %s AND status <> 'done';",
+        (str(error), run_id, shard),
+    )
+
+
+def read_progress(conn, run_id):
+    """Count a run's shards by status and sum the rows of finished ones.
+
+    Returns:
+        tuple: dict of status to number of shards, and rows loaded
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT status, count(*), coalesce(sum(rows_loaded), 0) "
+        "FROM generation_shards WHERE run_id = %s GROUP BY status;",
+        (run_id,),
+    )
+    rows = cursor.fetchall()
+    return (
+        {status: count for status, count, _ in rows},
+        sum(loaded for _, _, loaded in rows),
+    )
+
+
+class LambdaInvoker:
+    """Start a worker Lambda asynchronously for each payload.
+
+    Args:
+        function_name (str): name or ARN of the generate_shard Lambda
+        client (Lambda.Client): boto3 client, one for eu-west-2 is created
+        if None. Clients are thread safe, so one is shared by every
+        invocation.
+    """
+
+    def __init__(self, function_name, client=None):
+        self.function_name = function_name
+        if client is None:
+            # boto3 is slow to import, so only the coordinator pays for it,
+            # not every worker cold start.
+            import boto3
+
+            client = boto3.client("lambda", "eu-west-2")
+        self.client = client
+
+    def __call__(self, payload):
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType="Event",
+            Payload=json.dumps(payload).encode(),
+        )
+        if response["StatusCode"] != 202:
+            raise RuntimeError(
+                f"invoking {self.function_name} returned "
+                f"{response['StatusCode']}"
+            )
+        return response
+
+
+def connect_from_env():
+    return get_connection(
+        os.environ["DB_USER"],
+        os.environ["DB_PASS"],
+        os.environ["DB_HOST"],
+        DB_NAME,
+        int(os.environ["DB_PORT"]),
+    )
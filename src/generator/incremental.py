@@ -0,0 +1,214 @@
+import datetime
+import os
+import numpy as np
+from generator.data_generator import (
+    generate_customers_batch,
+    generate_data,
+    SALES_COLUMNS,
+    CUSTOMERS_COLUMNS,
+)
+from generator.initialisation import check_env_variables
+from generator.loader import copy_batches, ensure_partitions
+from generator.oltp_schema import customers, locations, sales
+from utils.connections import get_connection, discard_connection
+from utils.dim_cache import get_dimension, get_keys, invalidate
+from utils.logger import custom_logger
+
+
+DB_NAME = "etlhols_oltp"
+DEFAULT_SALES_PER_RUN = 500
+DEFAULT_NEW_CUSTOMERS_PER_RUN = 2
+DEFAULT_DAYS_PER_RUN = 1
+
+state_table_str = """
+CREATE TABLE IF NOT EXISTS generator_state (
+    state_id INT PRIMARY KEY CHECK (state_id = 1),
+    last_order_date DATE NOT NULL
+);
+"""
+
+
+def add_sales(event, context):
+    """Append a batch of new sales, and occasionally new customers, dated
+    up to today. Intended to run on a schedule so the database behaves
+    like a live system.
+
+    Args:
+        event (dict): may override "num_sales", "new_customers", "days"
+        and "seed"
+        context: Lambda context, unused
+
+    Returns:
+        dict: "Result" and, on success, the number of "customers" and
+        "sales" added and the "last_order_date" now loaded
+    """
+    logger = custom_logger()
+    event = event or {}
+    response = {"Result": "Failed"}
+    conn = None
+
+    try:
+        if missing_list := check_env_variables():
+            raise ValueError(
+                f"Required environment variables missing: {str(missing_list)}"
+            )
+
+        conn = get_connection(
+            os.environ["DB_USER"],
+            os.environ["DB_PASS"],
+            os.environ["DB_HOST"],
+            DB_NAME,
+            int(os.environ["DB_PORT"]),
+        )
+        rng = np.random.default_rng(event.get("seed"))
+        num_sales = event.get(
+            "num_sales", int(rng.poisson(DEFAULT_SALES_PER_RUN))
+        )
+        new_customers = event.get(
+            "new_customers", int(rng.poisson(DEFAULT_NEW_CUSTOMERS_PER_RUN))
+        )
+        days = event.get("days", DEFAULT_DAYS_PER_RUN)
+
+        response.update(
+            append_batch(conn, rng, num_sales, new_customers, days)
+        )
+        response["Result"] = "Success"
+    except Exception as e:
+        response["Result"] = "Error"
+        logger.error(e)
+        if conn is not None:
+            discard_connection(conn)
+
+    return response
+
+
+def append_batch(conn, rng, num_sales, new_customers, days, today=None):
+    """Insert new customers and sales and advance the high-water mark, all
+    in one transaction.
+
+    Sales are dated from the day after the high-water mark to today, but
+    no earlier than days before today, so however often the schedule runs
+    order dates keep pace with the calendar. Sales go to customers that
+    exist, picked from the cached customer ids, so ids skipped by rolled
+    back loads are never referenced. With no customers, no sales are
+    added.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        rng (Generator): NumPy random generator to draw values from
+        num_sales (int): number of sales rows to add
+        new_customers (int): number of customers rows to add
+        days (int): most days, up to and including today, to spread the
+        new sales over
+        today (date): date of the latest sales, the current date if None
+
+    Returns:
+        dict: number of "customers" and "sales" added and the new
+        "last_order_date"
+    """
+    logger = custom_logger()
+    cursor = conn.cursor()
+    today = today or datetime.date.today()
+    cursor.execute("BEGIN;")
+
+    try:
+        last_order_date = read_high_water_mark(conn)
+
+        if new_customers > 0:
+            copy_batches(
+                conn,
+                "customers",
+                [generate_customers_batch(rng, new_customers)],
+                CUSTOMERS_COLUMNS,
+            )
+
+        customer_ids = get_keys(conn, customers)
+        location_ids = get_dimension(conn, locations, columns=()).ids
+
+        end_date = max(today, last_order_date)
+        start_date = min(
+            max(
+                last_order_date + datetime.timedelta(days=1),
+                today - datetime.timedelta(days=days - 1),
+            ),
+            end_date,
+        )
+
+        if num_sales > 0 and len(customer_ids) == 0:
+            logger.warning("customers is empty, adding no sales")
+            num_sales = 0
+
+        if num_sales > 0:
+            ensure_partitions(conn, sales, start_date, end_date)
+            copy_batches(
+                conn,
+                "sales",
+                generate_data(
+                    num_sales,
+                    customer_ids,
+                    location_ids,
+                    seed=int(rng.integers(2**63)),
+                    start_date=start_date,
+                    end_date=end_date,
+                ),
+                SALES_COLUMNS,
+            )
+
+        cursor.execute(
+            "UPDATE generator_state "
+            "SET last_order_date = %s WHERE state_id = 1;",
+            (end_date,),
+        )
+        cursor.execute("COMMIT;")
+    except Exception:
+        # Cached ids may include customers the rollback removes.
+        invalidate(customers)
+        cursor.execute("ROLLBACK;")
+        raise
+
+    logger.info(
+        f"added {new_customers} customers and {num_sales} sales "
+        f"up to {end_date}"
+    )
+    return {
+        "customers": new_customers,
+        "sales": num_sales,
+        "last_order_date": end_date.isoformat(),
+    }
+
+
+def read_high_water_mark(conn):
+    """Read the latest order_date generated so far.
+
+    The date is kept in generator_state so that later runs never scan
+    sales, and the row is locked so overlapping runs take turns. On the
+    first run the table is created and the mark is taken
+    from the data already loaded, or from yesterday if sales is empty.
+
+    Args:
+        conn (Connection): open pg8000 connection
+
+    Returns:
+        date: last order_date
+    """
+    cursor = conn.cursor()
+    cursor.execute(state_table_str)
+    cursor.execute(
+        "SELECT last_order_date FROM generator_state "
+        "WHERE state_id = 1 FOR UPDATE;"
+    )
+
+    if (state := cursor.fetchone()) is not None:
+        return state[0]
+
+    cursor.execute("SELECT max(order_date) FROM sales;")
+    last_order_date = cursor.fetchone()[0]
+    if last_order_date is None:
+        last_order_date = datetime.date.today() - datetime.timedelta(days=1)
+
+    cursor.execute(
+        "INSERT INTO generator_state (state_id, last_order_date) "
+        "VALUES (1, %s);",
+        (last_order_date,),
+    )
+    return last_order_date
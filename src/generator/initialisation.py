@@ -1,7 +1,13 @@
+# Imported first, so that with PROFILE_STARTUP=true the imports below are
+# timed, see utils.startup.
+from utils import startup
 import os
-import boto3
-from pg8000.dbapi import connect, Connection
-from generator.oltp_schema import db_schema_str, seed_values_str
+from generator.migrations import run_migrations
+from utils.connections import (
+    get_connection,
+    get_secret_connection,
+    discard_connection,
+)
 from utils.logger import custom_logger
 
 
@@ -35,7 +41,8 @@ def init_db(event, context):
 
 def create_db(db_usr, db_pass, db_name):
     """Create user and empty db. If user already exists, does nothing.
-    All statements are executed as oltp_admin_user.
+    All statements are executed as oltp_admin_user. The admin credentials
+    and connection are cached for later warm invocations.
 
     Args:
         db_usr (str): username for new user
@@ -51,21 +58,13 @@ def create_db(db_usr, db_pass, db_name):
     response = "Not executed"
 
     try:
-        sm_client = boto3.client("secretsmanager", "eu-west-2")
-
-        admin_user = sm_client.get_secret_value(SecretId="oltp_admin_user")
-        admin_pass = sm_client.get_secret_value(SecretId="oltp_admin_pass")
-
-        conn = connect(
-            user=admin_user["SecretString"],
-            password=admin_pass["SecretString"],
-            host=os.environ["DB_HOST"],
-            database=os.environ["DB_NAME"],
-            port=int(os.environ["DB_PORT"]),
-            ssl_context=True,
+        admin_user, conn = get_secret_connection(
+            "oltp_admin_user",
+            "oltp_admin_pass",
+            os.environ["DB_HOST"],
+            os.environ["DB_NAME"],
+            int(os.environ["DB_PORT"]),
         )
-
-        conn.autocommit = True
         cursor = conn.cursor()
 
         cursor.execute(
@@ -76,7 +75,7 @@ def create_db(db_usr, db_pass, db_name):
         if usr_records[0] == 0:
             logger.info("creating db & user...")
             cursor.execute(f"CREATE USER {db_usr} WITH PASSWORD '{db_pass}';")
-            cursor.execute(f"GRANT {db_usr} TO {admin_user['SecretString']};")
+            cursor.execute(f"GRANT {db_usr} TO {admin_user};")
             cursor.execute(f"CREATE DATABASE {db_name} OWNER = {db_usr};")
             logger.info("database & user created")
             response = "Created"
@@ -86,16 +85,18 @@ def create_db(db_usr, db_pass, db_name):
     except Exception as e:
         logger.error(e)
         response = "Error"
-    finally:
-        if isinstance(conn, Connection):
-            conn.close()
+        if conn is not None:
+            discard_connection(conn)
 
     return response
 
 
 def create_schema(db_usr, db_pass, db_name):
     """Create database tables as defined in oltp_schema.py and seed with
-    initial values.
+    initial values, then apply any later migrations that are pending, see
+    generator.migrations. Large migrations of an existing database are left
+    for the CLI, as they can outlast the Lambda's timeout. The connection
+    is cached for later warm invocations.
 
     Args:
         db_usr (str): username to connect as
@@ -104,45 +105,34 @@ def create_schema(db_usr, db_pass, db_name):
 
     Returns:
         str: One of the following values, indicating the outcome:
-        "Not executed", "Created", "Already Exists", "Error"
+        "Not executed", "Created", "Migrated", "Already Exists", "Error"
     """
     logger = custom_logger()
     conn = None
     response = "Not executed"
 
     try:
-        conn = connect(
-            user=db_usr,
-            password=db_pass,
-            host=os.environ["DB_HOST"],
-            database=db_name,
-            port=int(os.environ["DB_PORT"]),
-            ssl_context=True,
+        conn = get_connection(
+            db_usr,
+            db_pass,
+            os.environ["DB_HOST"],
+            db_name,
+            int(os.environ["DB_PORT"]),
         )
-        conn.autocommit = True
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM pg_catalog.pg_tables "
-            "WHERE schemaname != 'pg_catalog' "
-            "AND schemaname != 'information_schema';"
-        )
-        tables_list = cursor.fetchall()
+        applied = run_migrations(conn, large=False)
 
-        if len(tables_list) == 0:
-            logger.info("creating tables...")
-            cursor.execute(db_schema_str)
-            logger.info("inserting values...")
-            cursor.execute(seed_values_str)
+        if 1 in applied:
             response = "Created"
+        elif applied:
+            response = "Migrated"
         else:
             logger.info("tables already exist.")
             response = "Already exists"
     except Exception as e:
         logger.error(e)
         response = "Error"
-    finally:
-        if isinstance(conn, Connection):
-            conn.close()
+        if conn is not None:
+            discard_connection(conn)
 
     return response
 
@@ -155,3 +145,6 @@ def check_env_variables():
             missing_list.append(item)
 
     return missing_list
+
+
+startup.report_imports(__name__)
@@ -0,0 +1,657 @@
+import itertools
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+import numpy as np
+from generator.data_generator import (
+    generate_customers,
+    generate_data,
+    count_shards,
+    CUSTOMERS_COLUMNS,
+    CUSTOMERS_KEY,
+    SALES_COLUMNS,
+    SALES_KEY,
+    DEFAULT_BATCH_SIZE,
+)
+from generator.distributions import country_peak_months
+from generator.oltp_schema import countries, customers
+from generator.pipeline import pipeline, DEFAULT_QUEUE_SIZE
+from generator.schema import (
+    dependency_order,
+    primary_key,
+    render_deferred,
+    render_drop_deferred,
+    render_partitions,
+)
+from utils.dim_cache import get_dimension, get_keys
+from utils.logger import custom_logger, timed_stage
+
+
+DEFAULT_CHUNK_SIZE = 10_000
+DEFAULT_LOAD_WORKERS = 4
+
+_COPY_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+)
+
+
+def copy_rows(conn, table, columns, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream rows into a table with COPY ... FROM STDIN.
+
+    Rows are pulled lazily from the iterable and sent to Postgres in
+    chunks of at most chunk_size rows, so memory use does not depend on
+    the total number of rows loaded.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (str): name of the table to load into
+        columns (sequence): names of the columns, in row order
+        rows (iterable): tuples of values, one per row
+        chunk_size (int): maximum number of rows sent per COPY message
+
+    Returns:
+        int: number of rows loaded
+    """
+    return _copy(conn, table, columns, iter_copy_chunks(rows, chunk_size))
+
+
+def copy_batches(
+    conn, table, batches, columns=None, queue_size=DEFAULT_QUEUE_SIZE
+):
+    """Stream columnar batches into a table with COPY ... FROM STDIN.
+
+    Each batch is a dict of column name to array, as yielded by
+    generator.data_generator.generate_data, and is sent as one chunk.
+    Batches are generated and serialised in pipeline threads while earlier
+    chunks are written to the connection, with at most queue_size batches
+    waiting at each step, so memory is bounded by the batch size rather
+    than the number of rows.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (str): name of the table to load into
+        batches (iterable): dicts of column name to array
+        columns (sequence): columns to load, defaults to the keys of the
+        first batch
+        queue_size (int): batches allowed to wait between pipeline stages
+
+    Returns:
+        int: number of rows loaded
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+
+    if first is None:
+        return 0
+    if columns is None:
+        columns = tuple(first.keys())
+
+    chunks = pipeline(
+        itertools.chain([first], batches),
+        [partial(format_batch, columns=columns), str.encode],
+        queue_size,
+    )
+    try:
+        return _copy(conn, table, columns, chunks)
+    finally:
+        chunks.close()
+
+
+def iter_copy_chunks(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Serialise rows into COPY text format, chunk_size rows at a time.
+
+    Args:
+        rows (iterable): tuples of values, one per row
+        chunk_size (int): maximum number of rows in each chunk
+
+    Yields:
+        str: newline terminated COPY text lines for up to chunk_size rows
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    lines = []
+    for row in rows:
+        lines.append("\t".join(format_copy_value(value) for value in row))
+        if len(lines) == chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def format_batch(batch, columns):
+    """Serialise a columnar batch into COPY text format.
+
+    Numeric and date columns are converted to text in one array operation.
+    Only text columns are escaped value by value.
+
+    Args:
+        batch (dict): column name to array
+        columns (sequence): names of the columns to serialise, in order
+
+    Returns:
+        str: newline terminated COPY text lines, one per row
+    """
+    text_columns = []
+
+    for column in columns:
+        values = batch[column]
+        if getattr(values, "dtype", None) is not None and (
+            values.dtype.kind not in "OSU"
+        ):
+            text_columns.append(values.astype(str).tolist())
+        else:
+            text_columns.append([format_copy_value(v) for v in values])
+
+    if not text_columns or not text_columns[0]:
+        return ""
+
+    return "\n".join("\t".join(row) for row in zip(*text_columns)) + "\n"
+
+
+def format_copy_value(value):
+    """Convert a single value to its COPY text representation.
+
+    Args:
+        value: value to convert, None is written as NULL
+
+    Returns:
+        str: escaped text for the value
+    """
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_statement(table, columns):
+    return f"COPY {table} ({', '.join(columns)}) FROM STDIN;"
+
+
+def _copy(conn, table, columns, chunks):
+    cursor = conn.cursor()
+    sent = [0]
+
+    def counted():
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            sent[0] += len(chunk)
+            yield chunk
+
+    with timed_stage("copy", table=table) as stage:
+        cursor.execute(copy_statement(table, columns), stream=counted())
+        stage.rows = cursor.rowcount
+        stage.bytes = sent[0]
+
+    return cursor.rowcount
+
+
+def load_seed(conn, tables, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Bulk load the seed records of each table, resolving foreign keys in
+    memory.
+
+    Tables are loaded parents first. Seed values in a foreign key column
+    that declares a natural_key are parent natural keys: the parent's
+    natural key to id mapping is read back once, after the parent has been
+    loaded, and the ids are filled in before the rows are sent.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        tables (sequence): Table definitions, tables without seed records
+        are skipped
+        chunk_size (int): maximum number of rows sent per COPY message
+
+    Returns:
+        dict: table name to number of rows loaded
+    """
+    key_maps = {}
+    row_counts = {}
+
+    with timed_stage("seed") as stage:
+        for table in dependency_order(tables):
+            if table.seed is None:
+                continue
+
+            columns = table.seed.columns
+            rows = table.seed.rows
+            references = {}
+
+            for fk in table.foreign_keys:
+                if fk.natural_key is None or fk.column not in columns:
+                    continue
+                key = (fk.table, fk.natural_key, fk.parent_column)
+                if key not in key_maps:
+                    key_maps[key] = read_key_map(conn, *key)
+                references[fk.column] = key_maps[key]
+
+            if references:
+                rows = resolve_references(columns, rows, references)
+
+            row_counts[table.name] = copy_rows(
+                conn, table.name, columns, rows, chunk_size
+            )
+        stage.rows = sum(row_counts.values())
+
+    return row_counts
+
+
+@contextmanager
+def deferred_constraints(conn, tables):
+    """Load without foreign key checks or secondary index maintenance.
+
+    On entry the foreign keys and secondary indexes of tables are dropped,
+    if present. On exit the indexes are built and the foreign keys added
+    back, each validated with a single scan instead of per inserted row,
+    and the tables are analysed. If the load fails the rebuild is still
+    attempted, and the load's error is raised.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        tables (sequence): Table definitions of the tables being loaded
+    """
+    logger = custom_logger()
+    cursor = conn.cursor()
+
+    cursor.execute(render_drop_deferred(tables))
+    try:
+        yield
+    except Exception:
+        try:
+            rebuild_deferred(conn, tables)
+        except Exception as e:
+            logger.error(f"failed to rebuild constraints: {e}")
+        raise
+    rebuild_deferred(conn, tables)
+
+
+def rebuild_deferred(conn, tables):
+    cursor = conn.cursor()
+
+    with timed_stage("rebuild_constraints"):
+        cursor.execute(render_deferred(tables))
+        cursor.execute(
+            f"ANALYZE {', '.join(table.name for table in tables)};"
+        )
+
+
+def ensure_partitions(conn, table, start_date, end_date):
+    """Create any missing monthly partitions a load of rows dated
+    start_date to end_date needs. Does nothing for an unpartitioned table.
+
+    Partitions must exist before the COPY starts, as no other statement
+    can run on the connection while it streams.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): definition of the table being loaded
+        start_date (date): earliest date being loaded, inclusive
+        end_date (date): latest date being loaded, inclusive
+    """
+    if table.partition_by is None:
+        return
+
+    cursor = conn.cursor()
+    cursor.execute(render_partitions(table, start_date, end_date))
+
+
+def resolve_references(columns, rows, key_maps):
+    """Replace natural keys with ids in the given columns of each row.
+
+    Natural keys with no match become None, which is loaded as NULL.
+
+    Args:
+        columns (sequence): names of the columns, in row order
+        rows (iterable): tuples of values, one per row
+        key_maps (dict): column name to dict of natural key to id
+
+    Yields:
+        tuple: the row with its referencing columns resolved
+    """
+    logger = custom_logger()
+    positions = [
+        (columns.index(column), key_map)
+        for column, key_map in key_maps.items()
+    ]
+    unresolved = set()
+
+    for row in rows:
+        row = list(row)
+        for position, key_map in positions:
+            natural_key = row[position]
+            row[position] = key_map.get(natural_key)
+            if row[position] is None and natural_key not in unresolved:
+                unresolved.add(natural_key)
+                logger.warning(f"no id found for '{natural_key}'")
+        yield tuple(row)
+
+
+def read_key_map(conn, table, key_column, id_column):
+    """Read a table's natural key to id mapping in a single query.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (str): name of the table to read
+        key_column (str): column holding the natural key
+        id_column (str): column holding the id
+
+    Returns:
+        dict: natural key to id
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {key_column}, {id_column} FROM {table};")
+    return dict(cursor.fetchall())
+
+
+def read_ids(conn, customer_range=None):
+    """Read the ids of the customers that exist, through the key cache,
+    which holds a bounded number of them, and each location's id and
+    country.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        customer_range (tuple): first customer_id and the one after the
+        last to pick from, all if None
+
+    Returns:
+        tuple: KeyView of the customer_id values, location_id array and
+        country_id list
+    """
+    customer_ids = get_keys(conn, customers, customer_range)
+    if len(customer_ids) == 0:
+        raise ValueError("customers is empty, load some customers first")
+
+    return (customer_ids,) + read_locations(conn)
+
+
+def read_locations(conn):
+    """Read each location's id and country.
+
+    Returns:
+        tuple: location_id array and country_id list
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT location_id, country_id FROM locations ORDER BY location_id;"
+    )
+    locations = cursor.fetchall()
+
+    return (
+        np.array([row[0] for row in locations]),
+        [row[1] for row in locations],
+    )
+
+
+def read_peak_months(conn):
+    """Read each country's default peak month, see
+    generator.distributions.PEAK_MONTHS.
+
+    Returns:
+        dict: country_id to peak month, for SalesSkew.peak_months
+    """
+    dimension = get_dimension(conn, countries)
+    return country_peak_months(
+        dimension.ids.tolist(), dimension.columns["country_name"].tolist()
+    )
+
+
+def reserve_ids(conn, table, count):
+    """Reserve a block of count consecutive ids for rows loaded with ids
+    assigned client side, and return the first.
+
+    The block starts above both the sequence and every row, and the
+    sequence is moved past it before any row is loaded, so rows inserted
+    meanwhile without an id take ids after the block rather than inside
+    it. The table is locked against inserts while the block is taken.
+    At least one id is reserved.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        table (Table): definition of the table to be loaded
+        count (int): number of rows to be loaded
+
+    Returns:
+        int: first id of the block
+    """
+    key = primary_key(table)
+    sequence = f"pg_get_serial_sequence('{table.name}', '{key}')"
+    count = max(int(count), 1)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN;")
+
+    try:
+        cursor.execute(
+            f"LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE;"
+        )
+        cursor.execute(
+            f"SELECT setval({sequence}, first_id + %s - 1) - %s + 1 "
+            f"FROM (SELECT greatest(nextval({sequence}), "
+            f"(SELECT coalesce(max({key}), 0) + 1 FROM {table.name})) "
+            f"AS first_id) AS reserved;",
+            (count, count),
+        )
+        first_id = cursor.fetchone()[0]
+        cursor.execute("COMMIT;")
+    except Exception:
+        cursor.execute("ROLLBACK;")
+        raise
+
+    return first_id
+
+
+def advance_sequence(conn, table):
+    """Move a table's primary key sequence past the largest id loaded, so
+    rows inserted later without an id do not collide with ids assigned
+    client side.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): definition of the loaded table
+    """
+    key = primary_key(table)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', '{key}'), "
+        f"coalesce(max({key}), 1), max({key}) IS NOT NULL) "
+        f"FROM {table.name};"
+    )
+
+
+def parallel_load(connect_fn, partitions, workers=DEFAULT_LOAD_WORKERS):
+    """Load independent partitions over several connections at once.
+
+    Each worker thread opens its own connection with connect_fn and takes
+    partitions from a bounded queue, holding at most two per worker, so
+    partitions are only built as fast as they are loaded. Every partition
+    is loaded with one COPY statement in autocommit mode, so a failed
+    partition loads nothing and can simply be retried. A worker whose
+    connection fails reconnects for its next partition.
+
+    Args:
+        connect_fn (callable): returns a new open pg8000 connection
+        partitions (iterable): dicts with "name", "table", "columns" and
+        "batches", a callable returning the columnar batches to load
+        workers (int): number of connections to load over
+
+    Returns:
+        dict: "loaded", partition name to rows loaded, and "failed",
+        partition name to the error that stopped it loading
+    """
+    logger = custom_logger()
+    work = queue.Queue(maxsize=workers * 2)
+    result = {"loaded": {}, "failed": {}}
+    lock = threading.Lock()
+
+    def worker():
+        conn = None
+        while (partition := work.get()) is not None:
+            name = partition["name"]
+            try:
+                if conn is None:
+                    conn = connect_fn()
+                    conn.autocommit = True
+                row_count = copy_batches(
+                    conn,
+                    partition["table"],
+                    partition["batches"](),
+                    partition["columns"],
+                )
+                with lock:
+                    result["loaded"][name] = row_count
+            except Exception as e:
+                logger.error(f"failed to load partition {name}: {e}")
+                with lock:
+                    result["failed"][name] = str(e)
+                conn = _close_quietly(conn)
+        _close_quietly(conn)
+
+    with timed_stage("bulk_load", workers=workers) as stage:
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for partition in partitions:
+                work.put(partition)
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+        stage.rows = sum(result["loaded"].values())
+
+    logger.info(
+        f"loaded {len(result['loaded'])} partitions, "
+        f"{len(result['failed'])} failed"
+    )
+    return result
+
+
+def sales_partitions(
+    num_rows,
+    num_partitions,
+    customer_ids,
+    location_ids,
+    batch_size=DEFAULT_BATCH_SIZE,
+    seed=None,
+    **options,
+):
+    """Split sales generation into disjoint ranges of generator shards.
+
+    Together the partitions produce exactly the rows generate_data would
+    for the same arguments, so the result does not depend on how many
+    partitions or connections are used. With first_id in options, rows
+    carry sale_id values assigned from each shard's own range, see
+    generator.data_generator.generate_shards.
+
+    The sales partitions for the dates generated must be created, with
+    ensure_partitions, before the partitions are loaded. Creating them
+    from each worker would race, and fail on those another worker made.
+
+    Args:
+        num_rows (int): total number of sales rows
+        num_partitions (int): number of partitions to split into
+        customer_ids (array_like): existing customer_id values to pick
+        from, or a KeyView of them, see read_ids
+        location_ids (array_like): existing location_id values to pick from
+        batch_size (int): maximum number of rows in each batch
+        seed (int): master seed, a random one is drawn if None
+        **options: further keyword arguments for generate_data
+
+    Yields:
+        dict: partition for parallel_load
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    num_shards = count_shards(num_rows, batch_size)
+    columns = SALES_COLUMNS
+    if options.get("first_id") is not None:
+        columns = (SALES_KEY,) + columns
+
+    for shards in shard_ranges(num_shards, num_partitions):
+        yield {
+            "name": f"sales[{shards.start}:{shards.stop}]",
+            "table": "sales",
+            "columns": columns,
+            "batches": partial(
+                generate_data,
+                num_rows,
+                customer_ids,
+                location_ids,
+                batch_size=batch_size,
+                seed=seed,
+                shards=shards,
+                **options,
+            ),
+        }
+
+
+def customer_partitions(
+    num_rows,
+    num_partitions,
+    first_id,
+    batch_size=DEFAULT_BATCH_SIZE,
+    seed=None,
+):
+    """Split customers generation into disjoint ranges of generator shards
+    numbered client side from first_id, so customers can be loaded in
+    parallel, and alongside sales that reference them, without reading
+    their ids back.
+
+    Args:
+        num_rows (int): total number of customers rows
+        num_partitions (int): number of partitions to split into
+        first_id (int): customer_id of the first row, see reserve_ids
+        batch_size (int): maximum number of rows in each batch
+        seed (int): master seed, a random one is drawn if None
+
+    Yields:
+        dict: partition for parallel_load
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    num_shards = count_shards(num_rows, batch_size)
+
+    for shards in shard_ranges(num_shards, num_partitions):
+        yield {
+            "name": f"customers[{shards.start}:{shards.stop}]",
+            "table": "customers",
+            "columns": (CUSTOMERS_KEY,) + CUSTOMERS_COLUMNS,
+            "batches": partial(
+                generate_customers,
+                num_rows,
+                batch_size=batch_size,
+                seed=seed,
+                shards=shards,
+                first_id=first_id,
+            ),
+        }
+
+
+def shard_ranges(num_shards, num_partitions):
+    """Split generator shards 0 to num_shards into at most num_partitions
+    contiguous, non-empty ranges of near equal length.
+
+    Yields:
+        range: shard indices of each partition, in order
+    """
+    for index in range(num_partitions):
+        shards = range(
+            index * num_shards // num_partitions,
+            (index + 1) * num_shards // num_partitions,
+        )
+        if len(shards):
+            yield shards
+
+
+def _close_quietly(conn):
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    return None
@@ -0,0 +1,196 @@
+from collections import namedtuple
+from generator.oltp_schema import db_schema_str, tables, sales
+from generator.rollups import create_rollups
+from generator.schema import (
+    render_foreign_keys,
+    render_indexes,
+    render_drop_deferred,
+    render_partitions,
+)
+from utils.logger import custom_logger, timed_stage
+
+
+# Arbitrary key for the session advisory lock held while migrating, so that
+# concurrent invocations apply migrations one at a time.
+MIGRATIONS_LOCK_ID = 7_240_001
+
+migrations_table_str = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    description VARCHAR(256) NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# A versioned schema change. steps is either SQL to execute or a callable
+# taking the connection, and runs in its own transaction. A large migration
+# rewrites or scans tables that may hold many rows, and can take longer
+# than init_db's timeout, see run_migrations.
+Migration = namedtuple(
+    "Migration",
+    ["version", "description", "steps", "large"],
+    defaults=(False,),
+)
+
+
+def create_initial_schema(conn):
+    # The loader needs NumPy, which only the first migration uses.
+    from generator.loader import load_seed
+
+    cursor = conn.cursor()
+    with timed_stage("ddl"):
+        cursor.execute(db_schema_str)
+    load_seed(conn, tables)
+
+
+def partition_sales(conn):
+    """Rebuild an unpartitioned sales table as one partitioned by month on
+    order_date, keeping its rows, ids and sequence. The old table's
+    constraints are dropped first so the new table can take their names.
+    """
+    cursor = conn.cursor()
+
+    if is_partitioned(conn, sales.name):
+        return
+
+    cursor.execute(render_drop_deferred([sales]))
+    cursor.execute("ALTER TABLE sales DROP CONSTRAINT IF EXISTS sales_pkey;")
+    cursor.execute("ALTER TABLE sales RENAME TO sales_unpartitioned;")
+    cursor.execute(
+        "CREATE TABLE sales ("
+        "LIKE sales_unpartitioned INCLUDING DEFAULTS, "
+        "PRIMARY KEY (sale_id, order_date)"
+        ") PARTITION BY RANGE (order_date);"
+    )
+    cursor.execute("ALTER SEQUENCE sales_sale_id_seq OWNED BY sales.sale_id;")
+
+    cursor.execute(
+        "SELECT min(order_date), max(order_date) FROM sales_unpartitioned;"
+    )
+    first_date, last_date = cursor.fetchone()
+    if first_date is not None:
+        cursor.execute(render_partitions(sales, first_date, last_date))
+        cursor.execute("INSERT INTO sales SELECT * FROM sales_unpartitioned;")
+
+    cursor.execute("DROP TABLE sales_unpartitioned;")
+    cursor.execute(render_indexes(sales) + render_foreign_keys(sales))
+    cursor.execute("ANALYZE sales;")
+
+
+# Migration 1 creates the tables as currently modelled in oltp_schema, so
+# every later migration must leave a database created by it unchanged.
+MIGRATIONS = (
+    Migration(1, "create OLTP tables and seed data", create_initial_schema),
+    Migration(
+        2,
+        "index sales for date range extracts",
+        render_indexes(sales),
+        large=True,
+    ),
+    Migration(
+        3,
+        "partition sales by month of order_date",
+        partition_sales,
+        large=True,
+    ),
+    Migration(4, "maintain daily sales rollups", create_rollups, large=True),
+)
+
+
+def run_migrations(conn, migrations=MIGRATIONS, large=True):
+    """Apply every migration that has not been applied yet, in version
+    order, each in its own transaction, recording it in schema_migrations.
+
+    An advisory lock is held throughout so concurrent callers wait for each
+    other, then find nothing left to do. A database created before
+    migrations were tracked is recognised by its existing sales table, and
+    migration 1 is recorded as applied without running it.
+
+    Without large, the first pending large migration stops the run, and it
+    and every later migration are left for the CLI schema command. They
+    still run if this call applied migration 1, as the tables it created
+    are empty.
+
+    Args:
+        conn (Connection): open autocommit pg8000 connection
+        migrations (sequence): Migration definitions
+        large (bool): apply large migrations
+
+    Returns:
+        list: versions applied by this call
+    """
+    logger = custom_logger()
+    cursor = conn.cursor()
+    applied_now = []
+
+    cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATIONS_LOCK_ID,))
+    try:
+        cursor.execute(migrations_table_str)
+        applied = applied_versions(conn)
+
+        if not applied and tables_exist(conn):
+            logger.info("recording existing tables as migration 1")
+            record_migration(conn, migrations[0])
+            applied.add(migrations[0].version)
+
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in applied:
+                continue
+            if migration.large and not large and 1 not in applied_now:
+                logger.warning(
+                    f"migration {migration.version} is large, run the "
+                    f"generator schema command to apply it and later ones"
+                )
+                break
+
+            logger.info(
+                f"applying migration {migration.version}: "
+                f"{migration.description}..."
+            )
+            cursor.execute("BEGIN;")
+            try:
+                with timed_stage("migration", version=migration.version):
+                    if callable(migration.steps):
+                        migration.steps(conn)
+                    else:
+                        cursor.execute(migration.steps)
+                record_migration(conn, migration)
+                cursor.execute("COMMIT;")
+            except Exception:
+                cursor.execute("ROLLBACK;")
+                raise
+            applied_now.append(migration.version)
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_ID,))
+
+    return applied_now
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def record_migration(conn, migration):
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, description) "
+        "VALUES (%s, %s);",
+        (migration.version, migration.description),
+    )
+
+
+def tables_exist(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('public.sales') IS NOT NULL;")
+    return cursor.fetchone()[0]
+
+
+def is_partitioned(conn, table_name):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s);",
+        (table_name,),
+    )
+    return cursor.fetchone()[0]
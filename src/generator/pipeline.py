@@ -0,0 +1,97 @@
+import queue
+import threading
+
+
+# Items each stage may run ahead of the next. Together with the batch size
+# this bounds peak memory: at most this many items wait between any two
+# stages, whatever the total number of rows.
+DEFAULT_QUEUE_SIZE = 2
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+def pipeline(source, stages=(), queue_size=DEFAULT_QUEUE_SIZE):
+    """Stream items from source through stages, each in its own thread,
+    joined by bounded queues.
+
+    The source is iterated in one thread and each stage function applied
+    in another, so while the caller consumes one item the next ones are
+    already being produced and transformed. A full queue blocks the stage
+    feeding it, so a slow consumer applies backpressure all the way to the
+    source. An exception in any thread is raised in the caller. When the
+    caller stops early, the threads are stopped and the source closed.
+
+    Args:
+        source (iterable): items to stream
+        stages (sequence): functions applied to every item, in order
+        queue_size (int): maximum number of items waiting between stages
+
+    Yields:
+        the items of source, transformed by every stage, in order
+    """
+    if queue_size <= 0:
+        raise ValueError("queue_size must be positive")
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def put(outbox, item):
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(inbox):
+        while not stop.is_set():
+            try:
+                return inbox.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def produce(outbox):
+        try:
+            for item in source:
+                if not put(outbox, item):
+                    return
+            put(outbox, _DONE)
+        except BaseException as e:
+            put(outbox, e)
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+
+    def transform(stage, inbox, outbox):
+        try:
+            while (item := get(inbox)) is not _DONE:
+                if isinstance(item, BaseException):
+                    put(outbox, item)
+                    return
+                if not put(outbox, stage(item)):
+                    return
+            put(outbox, _DONE)
+        except BaseException as e:
+            put(outbox, e)
+
+    threads = [threading.Thread(target=produce, args=(queues[0],))]
+    threads.extend(
+        threading.Thread(target=transform, args=(stage, inbox, outbox))
+        for stage, inbox, outbox in zip(stages, queues, queues[1:])
+    )
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        while (item := queues[-1].get()) is not _DONE:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
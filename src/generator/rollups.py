@@ -0,0 +1,142 @@
+# Daily revenue and order count of sales by location and by country,
+# kept up to date by the triggers of render_rollup_trigger.
+rollup_tables_str = """
+CREATE TABLE IF NOT EXISTS daily_location_sales (
+    order_date DATE NOT NULL,
+    location_id INT NOT NULL,
+    revenue NUMERIC(16, 2) NOT NULL,
+    order_count BIGINT NOT NULL,
+    PRIMARY KEY (order_date, location_id)
+);
+CREATE TABLE IF NOT EXISTS daily_country_sales (
+    order_date DATE NOT NULL,
+    country_id INT NOT NULL,
+    revenue NUMERIC(16, 2) NOT NULL,
+    order_count BIGINT NOT NULL,
+    PRIMARY KEY (order_date, country_id)
+);
+"""
+
+# Each rollup table, the column it groups by besides order_date, and the
+# join from sales rows to that column.
+ROLLUPS = (
+    ("daily_location_sales", "location_id", ""),
+    (
+        "daily_country_sales",
+        "country_id",
+        " JOIN locations USING (location_id)",
+    ),
+)
+
+ADDED = "SELECT order_date, location_id, price_paid, 1 AS orders"
+REMOVED = (
+    "SELECT order_date, location_id, -price_paid AS price_paid, -1 AS orders"
+)
+
+# The rows each trigger event changes, with price_paid and a count signed
+# so that a deleted sale subtracts what its insert added.
+EVENT_CHANGES = (
+    ("INSERT", f"{ADDED} FROM new_rows"),
+    ("DELETE", f"{REMOVED} FROM old_rows"),
+    ("UPDATE", f"{ADDED} FROM new_rows UNION ALL {REMOVED} FROM old_rows"),
+)
+
+TRIGGER_TRANSITIONS = (
+    ("insert", "REFERENCING NEW TABLE AS new_rows"),
+    ("delete", "REFERENCING OLD TABLE AS old_rows"),
+    ("update", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+)
+
+
+def render_merge(table_name, group_column, join, changes):
+    """Render an upsert merging the partial aggregate of changed sales rows
+    into a rollup, adding to the rows of days and groups already there.
+
+    Groups are merged in key order, so concurrent loads lock rollup rows in
+    the same order and wait for each other rather than deadlock.
+
+    Args:
+        table_name (str): name of the rollup table
+        group_column (str): column grouped by besides order_date
+        join (str): join from the changed rows to group_column
+        changes (str): query of order_date, location_id, price_paid and
+        a signed order count per changed sale
+
+    Returns:
+        str: INSERT ... ON CONFLICT DO UPDATE statement
+    """
+    return (
+        f"INSERT INTO {table_name} AS rollup "
+        f"(order_date, {group_column}, revenue, order_count)\n"
+        f"SELECT order_date, {group_column}, "
+        f"coalesce(sum(price_paid), 0), sum(orders)\n"
+        f"FROM ({changes}) AS changes{join}\n"
+        f"WHERE {group_column} IS NOT NULL\n"
+        f"GROUP BY order_date, {group_column}\n"
+        f"ORDER BY order_date, {group_column}\n"
+        f"ON CONFLICT (order_date, {group_column}) DO UPDATE SET "
+        f"revenue = rollup.revenue + excluded.revenue, "
+        f"order_count = rollup.order_count + excluded.order_count;\n"
+    )
+
+
+def render_rollup_trigger():
+    """Render the function and statement triggers keeping the rollups up
+    to date as sales change.
+
+    The triggers fire once per statement and aggregate its transition
+    table, so a COPY of a batch of sales merges one partial aggregate per
+    rollup, of one row per day and group, and never rescans sales.
+    """
+    branches = "".join(
+        f"{'IF' if i == 0 else 'ELSIF'} TG_OP = '{event}' THEN\n"
+        + "".join(
+            render_merge(table_name, group_column, join, changes)
+            for table_name, group_column, join in ROLLUPS
+        )
+        for i, (event, changes) in enumerate(EVENT_CHANGES)
+    )
+    statements = [
+        "CREATE OR REPLACE FUNCTION sales_rollups_merge() "
+        "RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        "BEGIN\n"
+        f"{branches}"
+        "END IF;\n"
+        "RETURN NULL;\n"
+        "END;\n"
+        "$$;\n"
+    ]
+    for event, transition in TRIGGER_TRANSITIONS:
+        statements.append(
+            f"DROP TRIGGER IF EXISTS sales_rollups_{event} ON sales;\n"
+            f"CREATE TRIGGER sales_rollups_{event} "
+            f"AFTER {event.upper()} ON sales {transition} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION sales_rollups_merge();\n"
+        )
+
+    return "".join(statements)
+
+
+def render_rebuild_rollups():
+    """Render statements recomputing the rollups from every sale, once,
+    for sales loaded before the triggers were installed."""
+    return "".join(
+        f"TRUNCATE {table_name};\n"
+        + render_merge(table_name, group_column, join, f"{ADDED} FROM sales")
+        for table_name, group_column, join in ROLLUPS
+    )
+
+
+def create_rollups(conn):
+    """Create the rollup tables and triggers and fill the rollups from the
+    sales already loaded. Creating the triggers locks sales against
+    writes until the transaction ends, so no sale is missed or counted
+    twice.
+
+    Args:
+        conn (Connection): open pg8000 connection, in a transaction
+    """
+    cursor = conn.cursor()
+    cursor.execute(rollup_tables_str)
+    cursor.execute(render_rollup_trigger())
+    cursor.execute(render_rebuild_rollups())
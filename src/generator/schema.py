@@ -0,0 +1,258 @@
+import datetime
+from collections import namedtuple
+
+
+# A column of a table. SERIAL columns are filled in by Postgres, so they are
+# left out of generated and seeded rows.
+Column = namedtuple(
+    "Column",
+    ["name", "type", "primary_key", "nullable"],
+    defaults=(False, True),
+)
+
+# A column referencing another table's column. Seed rows may give the
+# parent's natural_key instead of its id, to be resolved when loading.
+ForeignKey = namedtuple(
+    "ForeignKey",
+    ["column", "table", "parent_column", "natural_key"],
+    defaults=(None,),
+)
+
+# Structured seed records: column names and a tuple of value tuples.
+Seed = namedtuple("Seed", ["columns", "rows"])
+
+# A secondary index on one or more columns.
+Index = namedtuple("Index", ["name", "columns"])
+
+# partition_by names a DATE column the table is range partitioned on, one
+# partition per calendar month. Postgres requires the partition column in
+# the primary key, so it is appended to it.
+Table = namedtuple(
+    "Table",
+    ["name", "columns", "foreign_keys", "seed", "indexes", "partition_by"],
+    defaults=((), None, (), None),
+)
+
+
+def column_names(table):
+    """Return the names of all of a table's columns, in order."""
+    return tuple(column.name for column in table.columns)
+
+
+def insert_columns(table):
+    """Return the names of the columns rows are loaded with, which is all
+    of them except SERIAL columns."""
+    return tuple(
+        column.name
+        for column in table.columns
+        if column.type.upper() not in ("SERIAL", "BIGSERIAL")
+    )
+
+
+def primary_key(table):
+    """Return the name of a table's primary key column, or None."""
+    for column in table.columns:
+        if column.primary_key:
+            return column.name
+    return None
+
+
+def foreign_key(table, column_name):
+    """Return the foreign key on a column of a table, or None."""
+    for fk in table.foreign_keys:
+        if fk.column == column_name:
+            return fk
+    return None
+
+
+def dependency_order(tables):
+    """Sort tables so every table comes after the tables it references.
+
+    Tables keep their given order wherever their dependencies allow it.
+
+    Args:
+        tables (sequence): Table definitions
+
+    Returns:
+        tuple: the same tables, parents before children
+    """
+    by_name = {table.name: table for table in tables}
+    ordered = []
+    placed = set()
+    visiting = set()
+
+    def visit(table):
+        if table.name in placed:
+            return
+        if table.name in visiting:
+            raise ValueError(f"Foreign keys form a cycle at {table.name}")
+        visiting.add(table.name)
+        for fk in table.foreign_keys:
+            if fk.table not in by_name:
+                raise ValueError(
+                    f"{table.name} references unknown table {fk.table}"
+                )
+            if fk.table != table.name:
+                visit(by_name[fk.table])
+        visiting.discard(table.name)
+        placed.add(table.name)
+        ordered.append(table)
+
+    for table in tables:
+        visit(table)
+
+    return tuple(ordered)
+
+
+def render_table(table):
+    """Render the CREATE TABLE statement for a table.
+
+    Args:
+        table (Table): table definition
+
+    Returns:
+        str: CREATE TABLE statement
+    """
+    lines = []
+
+    for column in table.columns:
+        line = f"    {column.name} {column.type}"
+        if column.primary_key and table.partition_by is None:
+            line += " PRIMARY KEY"
+        elif not column.nullable:
+            line += " NOT NULL"
+        if fk := foreign_key(table, column.name):
+            line += f" REFERENCES {fk.table}({fk.parent_column})"
+        lines.append(line)
+
+    if table.partition_by is None:
+        return (
+            f"CREATE TABLE {table.name} (\n" + ",\n".join(lines) + "\n);\n"
+        )
+
+    lines.append(
+        f"    PRIMARY KEY ({primary_key(table)}, {table.partition_by})"
+    )
+    return (
+        f"CREATE TABLE {table.name} (\n"
+        + ",\n".join(lines)
+        + f"\n) PARTITION BY RANGE ({table.partition_by});\n"
+    )
+
+
+def months_between(start_date, end_date):
+    """Return the first day of every month from start_date's to
+    end_date's, inclusive."""
+    months = []
+    month = datetime.date(start_date.year, start_date.month, 1)
+
+    while month <= end_date:
+        months.append(month)
+        month = next_month(month)
+
+    return months
+
+
+def next_month(month):
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table.name}_y{month.year}m{month.month:02d}"
+
+
+def render_partitions(table, start_date, end_date):
+    """Render statements creating the monthly partitions of a partitioned
+    table that hold start_date to end_date, if they do not exist yet.
+
+    Args:
+        table (Table): definition of a table with partition_by set
+        start_date (date): earliest date to hold, inclusive
+        end_date (date): latest date to hold, inclusive
+
+    Returns:
+        str: CREATE TABLE ... PARTITION OF statements
+    """
+    if table.partition_by is None:
+        raise ValueError(f"{table.name} is not partitioned")
+
+    return "".join(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} "
+        f"PARTITION OF {table.name} "
+        f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}');\n"
+        for month in months_between(start_date, end_date)
+    )
+
+
+def render_indexes(table):
+    """Render CREATE INDEX statements for a table's secondary indexes."""
+    return "".join(
+        f"CREATE INDEX IF NOT EXISTS {index.name} "
+        f"ON {table.name} ({', '.join(index.columns)});\n"
+        for index in table.indexes
+    )
+
+
+def render_foreign_keys(table):
+    """Render one ALTER TABLE statement adding all of a table's foreign
+    keys, named as Postgres names inline REFERENCES constraints."""
+    if not table.foreign_keys:
+        return ""
+
+    clauses = ",\n".join(
+        f"    ADD CONSTRAINT {foreign_key_name(table, fk)} "
+        f"FOREIGN KEY ({fk.column}) REFERENCES {fk.table}({fk.parent_column})"
+        for fk in table.foreign_keys
+    )
+    return f"ALTER TABLE {table.name}\n{clauses};\n"
+
+
+def render_drop_deferred(tables):
+    """Render statements dropping the foreign keys and secondary indexes
+    of tables, the parts that render_deferred builds again."""
+    statements = []
+
+    for table in tables:
+        statements.extend(
+            f"ALTER TABLE {table.name} DROP CONSTRAINT IF EXISTS "
+            f"{foreign_key_name(table, fk)};\n"
+            for fk in table.foreign_keys
+        )
+        statements.extend(
+            f"DROP INDEX IF EXISTS {index.name};\n"
+            for index in table.indexes
+        )
+
+    return "".join(statements)
+
+
+def render_deferred(tables):
+    """Render the secondary indexes and foreign keys of tables, to be run
+    after a bulk load into tables stripped of them by render_drop_deferred.
+    Primary keys are never deferred, so tables may reference parents that
+    are not among them, such as sales alone after a sales only load.
+    """
+    return "".join(
+        render_indexes(table) + render_foreign_keys(table) for table in tables
+    )
+
+
+def foreign_key_name(table, fk):
+    return f"{table.name}_{fk.column}_fkey"
+
+
+def render_ddl(tables):
+    """Render the DDL creating all tables, in dependency order.
+
+    Args:
+        tables (sequence): Table definitions
+
+    Returns:
+        str: CREATE TABLE and CREATE INDEX statements
+    """
+    return "\n" + "\n".join(
+        render_table(table) + render_indexes(table)
+        for table in dependency_order(tables)
+    )
@@ -0,0 +1,53 @@
+from generator.schema import Column, ForeignKey, Table
+
+
+dim_date = Table(
+    "dim_date",
+    (
+        Column("date_id", "INT", primary_key=True),
+        Column("full_date", "DATE", nullable=False),
+        Column("year", "INT"),
+        Column("quarter", "INT"),
+        Column("month", "INT"),
+        Column("day", "INT"),
+        Column("day_of_week", "INT"),
+        Column("month_name", "VARCHAR(9)"),
+        Column("day_name", "VARCHAR(9)"),
+    ),
+)
+
+dim_location = Table(
+    "dim_location",
+    (
+        Column("location_id", "INT", primary_key=True),
+        Column("location_name", "VARCHAR(64)"),
+        Column("country_id", "INT"),
+        Column("country_name", "VARCHAR(64)"),
+    ),
+)
+
+dim_customer = Table(
+    "dim_customer",
+    (
+        Column("customer_id", "INT", primary_key=True),
+        Column("customer_name", "VARCHAR(64)"),
+    ),
+)
+
+fact_sales = Table(
+    "fact_sales",
+    (
+        Column("sale_id", "INT", primary_key=True),
+        Column("date_id", "INT"),
+        Column("customer_id", "INT"),
+        Column("location_id", "INT"),
+        Column("price_paid", "NUMERIC(10, 2)"),
+    ),
+    foreign_keys=(
+        ForeignKey("date_id", "dim_date", "date_id"),
+        ForeignKey("customer_id", "dim_customer", "customer_id"),
+        ForeignKey("location_id", "dim_location", "location_id"),
+    ),
+)
+
+tables = (dim_date, dim_location, dim_customer, fact_sales)
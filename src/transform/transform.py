@@ -0,0 +1,398 @@
+import datetime
+import json
+import os
+from contextlib import ExitStack
+import boto3
+import numpy as np
+import pyarrow.parquet as pq
+from generator.oltp_schema import countries, customers, locations, sales
+from generator.schema import column_names, primary_key
+from transform.star_schema import (
+    dim_customer,
+    dim_date,
+    dim_location,
+    fact_sales,
+    tables as star_tables,
+)
+from utils.arrow import arrow_schema, to_arrow_table
+from utils.dim_cache import lookup, Dimension
+from utils.logger import custom_logger, timed_stage
+from utils.s3 import MultipartUpload, RangedObject
+
+
+STATE_KEY = "state/transform.json"
+DEFAULT_BATCH_SIZE = 50_000
+REQUIRED_ENV_VARIABLES = ["EXTRACT_BUCKET", "WAREHOUSE_BUCKET"]
+# Source tables in the order they are transformed, so every dimension row
+# is in place before the facts of the same run refer to it.
+SOURCE_TABLES = (countries, locations, customers, sales)
+
+MONTH_NAMES = np.array(
+    [
+        "January", "February", "March", "April", "May", "June", "July",
+        "August", "September", "October", "November", "December",
+    ]
+)
+DAY_NAMES = np.array(
+    [
+        "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
+        "Sunday",
+    ]
+)
+
+
+def transform_changes(event, context):
+    """Transform the objects extracted since the last run into star schema
+    Parquet files in the warehouse bucket, see transform_new_objects.
+
+    Args:
+        event (dict): may override "batch_size", the number of rows
+        transformed at a time
+        context: Lambda context, unused
+
+    Returns:
+        dict: "Result" and the number of rows written per star schema table
+    """
+    logger = custom_logger()
+    event = event or {}
+    response = {"Result": "Failed"}
+
+    try:
+        missing_list = [
+            item for item in REQUIRED_ENV_VARIABLES if item not in os.environ
+        ]
+        if missing_list:
+            raise ValueError(
+                f"Required environment variables missing: {str(missing_list)}"
+            )
+
+        response.update(
+            transform_new_objects(
+                boto3.client("s3"),
+                os.environ["EXTRACT_BUCKET"],
+                os.environ["WAREHOUSE_BUCKET"],
+                event.get("batch_size", DEFAULT_BATCH_SIZE),
+            )
+        )
+        response["Result"] = "Success"
+    except Exception as e:
+        response["Result"] = "Error"
+        logger.error(e)
+
+    return response
+
+
+def transform_new_objects(
+    s3_client, source_bucket, target_bucket, batch_size=DEFAULT_BATCH_SIZE
+):
+    """Transform every extracted object not yet transformed, dimensions
+    first, writing one Parquet object per star schema table that has new
+    rows.
+
+    Objects are read batch_size rows at a time and each star schema table
+    is streamed into its own multipart upload, so memory is bounded by one
+    batch and one part per table. The transform state, including the last
+    object read per source table, is written only once every upload has
+    completed; if any step fails all uploads are aborted and the next run
+    starts from the same objects.
+
+    Args:
+        s3_client (S3.Client): boto3 S3 client
+        source_bucket (str): name of the extract bucket
+        target_bucket (str): name of the warehouse bucket
+        batch_size (int): number of rows transformed at a time
+
+    Returns:
+        dict: star schema table name to number of rows written
+    """
+    state = read_state(s3_client, target_bucket)
+    transform = StarTransform(state)
+    last_objects = dict(state.get("objects", {}))
+    star_by_name = {table.name: table for table in star_tables}
+    row_counts = {table.name: 0 for table in star_tables}
+    written_at = datetime.datetime.now(datetime.timezone.utc)
+
+    with ExitStack() as stack:
+        writers = {}
+
+        def write(name, output):
+            table = star_by_name[name]
+            if name not in writers:
+                writers[name] = open_writer(
+                    stack, s3_client, target_bucket, table, written_at
+                )
+            writers[name].write_table(
+                to_arrow_table(output, table, column_names(table))
+            )
+            row_counts[name] += len(output[primary_key(table)])
+
+        for table in SOURCE_TABLES:
+            last_object = last_objects.get(table.name)
+            for key in new_object_keys(
+                s3_client, source_bucket, table.name, last_object
+            ):
+                with timed_stage("transform", table=table.name) as stage:
+                    stage.rows = 0
+                    for batch in read_batches(
+                        s3_client, source_bucket, key, batch_size
+                    ):
+                        stage.rows += len(batch[primary_key(table)])
+                        for name, output in transform.transform(
+                            table.name, batch
+                        ).items():
+                            write(name, output)
+                last_objects[table.name] = key
+
+    state = {**transform.state(), "objects": last_objects}
+    write_state(s3_client, target_bucket, state)
+    return row_counts
+
+
+class StarTransform:
+    """Transform columnar batches of extracted OLTP rows into star schema
+    batches, one source batch at a time.
+
+    Joins are binary searches of sorted key arrays, see utils.dim_cache,
+    and duplicates are dropped with np.unique, so a batch costs a handful
+    of array operations however many rows it holds. Only rows past each
+    source table's watermark are transformed. The watermarks, the dates
+    and locations already in the dimensions and the country names are kept
+    as state, so a later run carries on where this one stopped.
+
+    Args:
+        state (dict): as returned by state(), None to start empty
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.watermarks = dict(state.get("watermarks", {}))
+        self.date_ids = np.array(state.get("date_ids", []), dtype=np.int64)
+        self.location_ids = np.array(
+            state.get("location_ids", []), dtype=np.int64
+        )
+        self.countries = Dimension(
+            state.get("country_ids", []),
+            {
+                "country_name": np.array(
+                    state.get("country_names", []), dtype=object
+                )
+            },
+        )
+
+    def state(self):
+        """Return the state to resume from, as a JSON serialisable dict."""
+        return {
+            "watermarks": self.watermarks,
+            "date_ids": self.date_ids.tolist(),
+            "location_ids": self.location_ids.tolist(),
+            "country_ids": self.countries.ids.tolist(),
+            "country_names": self.countries.columns["country_name"].tolist(),
+        }
+
+    def transform(self, table_name, batch):
+        """Transform one batch of a source table.
+
+        Args:
+            table_name (str): name of the OLTP table the batch is from
+            batch (dict): column name to array, as extracted
+
+        Returns:
+            dict: star schema table name to columnar batch, for the tables
+            the batch adds rows to
+        """
+        table = {table.name: table for table in SOURCE_TABLES}[table_name]
+        batch = self.new_rows(table, batch)
+        if batch is None:
+            return {}
+        return getattr(self, f"_transform_{table_name}")(batch)
+
+    def new_rows(self, table, batch):
+        """Return the rows of a batch past the table's watermark, once each
+        and in key order, and move the watermark past them, or None if
+        there are none."""
+        key = primary_key(table)
+        batch = latest_by_key(batch, key)
+        start = np.searchsorted(
+            batch[key], self.watermarks.get(table.name, 0), side="right"
+        )
+        if start == len(batch[key]):
+            return None
+
+        batch = {column: values[start:] for column, values in batch.items()}
+        self.watermarks[table.name] = int(batch[key][-1])
+        return batch
+
+    def _transform_countries(self, batch):
+        self.countries = self.countries.merge(
+            batch["country_id"], {"country_name": batch["country_name"]}
+        )
+        return {}
+
+    def _transform_locations(self, batch):
+        country_names, found = self.countries.get(
+            batch["country_id"], "country_name"
+        )
+        if not found.all():
+            custom_logger().warning(
+                f"{np.count_nonzero(~found)} locations have unknown countries"
+            )
+
+        self.location_ids = np.union1d(self.location_ids, batch["location_id"])
+        return {
+            dim_location.name: {
+                "location_id": batch["location_id"],
+                "location_name": batch["location_name"],
+                "country_id": batch["country_id"],
+                "country_name": country_names,
+            }
+        }
+
+    def _transform_customers(self, batch):
+        return {
+            dim_customer.name: {
+                "customer_id": batch["customer_id"],
+                "customer_name": batch["customer_name"],
+            }
+        }
+
+    def _transform_sales(self, batch):
+        logger = custom_logger()
+        dates = batch["order_date"].astype("datetime64[D]")
+        outputs = {}
+
+        unique_dates = np.unique(dates)
+        _, known = lookup(date_ids(unique_dates), self.date_ids)
+        if not known.all():
+            new_dates = build_dim_date(unique_dates[~known])
+            self.date_ids = np.union1d(self.date_ids, new_dates["date_id"])
+            outputs[dim_date.name] = new_dates
+
+        _, found = lookup(batch["location_id"], self.location_ids)
+        if not found.all():
+            logger.warning(
+                f"{np.count_nonzero(~found)} sales have an unknown location"
+            )
+        unknown = batch["customer_id"] > self.watermarks.get("customers", 0)
+        if unknown.any():
+            logger.warning(
+                f"{np.count_nonzero(unknown)} sales have an unknown customer"
+            )
+
+        outputs[fact_sales.name] = {
+            "sale_id": batch["sale_id"],
+            "date_id": date_ids(dates),
+            "customer_id": batch["customer_id"],
+            "location_id": batch["location_id"],
+            "price_paid": batch["price_paid"],
+        }
+        return outputs
+
+
+def latest_by_key(batch, key):
+    """Return a batch's rows sorted by key, keeping only the last row of
+    each key, as re-extracted rows replace earlier copies."""
+    keys = batch[key]
+    if len(keys) < 2 or (keys[1:] > keys[:-1]).all():
+        return batch
+
+    _, first_from_end = np.unique(keys[::-1], return_index=True)
+    rows = len(keys) - 1 - first_from_end
+    return {column: values[rows] for column, values in batch.items()}
+
+
+def date_ids(dates):
+    """Return YYYYMMDD integer keys for an array of datetime64 dates."""
+    dates = dates.astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    year = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (dates - months).astype(np.int64) + 1
+    return year * 10000 + month * 100 + day
+
+
+def build_dim_date(dates):
+    """Build dim_date rows for an array of distinct datetime64 dates.
+
+    Returns:
+        dict: dim_date column name to array
+    """
+    dates = dates.astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    month = months.astype(np.int64) % 12 + 1
+    # 1970-01-01 was a Thursday, day 4 of the ISO week.
+    day_of_week = (dates.astype(np.int64) + 3) % 7 + 1
+
+    return {
+        "date_id": date_ids(dates),
+        "full_date": dates,
+        "year": dates.astype("datetime64[Y]").astype(np.int64) + 1970,
+        "quarter": (month - 1) // 3 + 1,
+        "month": month,
+        "day": (dates - months).astype(np.int64) + 1,
+        "day_of_week": day_of_week,
+        "month_name": MONTH_NAMES[month - 1],
+        "day_name": DAY_NAMES[day_of_week - 1],
+    }
+
+
+def new_object_keys(s3_client, bucket, table_name, start_after=None):
+    """Return the keys of a table's extracted objects after start_after,
+    in the order they were extracted."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    options = {"Bucket": bucket, "Prefix": f"{table_name}/"}
+    if start_after is not None:
+        options["StartAfter"] = start_after
+
+    return [
+        item["Key"]
+        for page in paginator.paginate(**options)
+        for item in page.get("Contents", [])
+        if item["Key"].endswith(".parquet")
+    ]
+
+
+def read_batches(s3_client, bucket, key, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield an extracted Parquet object as columnar batches of at most
+    batch_size rows.
+
+    The object is read through a RangedObject, so only the footer and the
+    row groups of the batch being decoded are held in memory.
+
+    Yields:
+        dict: column name to NumPy array
+    """
+    with RangedObject(s3_client, bucket, key) as source:
+        for record_batch in pq.ParquetFile(source).iter_batches(batch_size):
+            yield {
+                name: column.to_numpy(zero_copy_only=False)
+                for name, column in zip(
+                    record_batch.schema.names, record_batch
+                )
+            }
+
+
+def open_writer(stack, s3_client, bucket, table, written_at):
+    key = (
+        f"{table.name}/{written_at:%Y/%m/%d}/"
+        f"{table.name}_{written_at:%H%M%S%f}.parquet"
+    )
+    upload = stack.enter_context(MultipartUpload(s3_client, bucket, key))
+    return stack.enter_context(
+        pq.ParquetWriter(upload, arrow_schema(table), compression="zstd")
+    )
+
+
+def read_state(s3_client, bucket):
+    """Return the state of the last transform run, or an empty dict."""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=STATE_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        return {}
+
+    return json.loads(response["Body"].read())
+
+
+def write_state(s3_client, bucket, state):
+    s3_client.put_object(
+        Bucket=bucket, Key=STATE_KEY, Body=json.dumps(state).encode()
+    )
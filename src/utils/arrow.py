@@ -0,0 +1,60 @@
+import pyarrow as pa
+
+
+ARROW_TYPES = {
+    "SERIAL": pa.int32(),
+    "BIGSERIAL": pa.int64(),
+    "INT": pa.int32(),
+    "BIGINT": pa.int64(),
+    "DATE": pa.date32(),
+}
+
+
+def arrow_schema(table):
+    """Build the Arrow schema matching a table's column types.
+
+    Args:
+        table (Table): table definition
+
+    Returns:
+        Schema: one field per column, in column order
+    """
+    fields = []
+
+    for column in table.columns:
+        sql_type = column.type.upper()
+        if sql_type.startswith("NUMERIC"):
+            precision, scale = sql_type[8:-1].split(",")
+            arrow_type = pa.decimal128(int(precision), int(scale))
+        elif sql_type.startswith("VARCHAR") or sql_type == "TEXT":
+            arrow_type = pa.string()
+        else:
+            arrow_type = ARROW_TYPES[sql_type]
+        fields.append(pa.field(column.name, arrow_type))
+
+    return pa.schema(fields)
+
+
+def to_arrow_table(batch, table, columns):
+    """Convert a columnar batch to an Arrow table typed as arrow_schema.
+
+    Args:
+        batch (dict): column name to array
+        table (Table): table definition
+        columns (sequence): names of the columns to convert, in order
+
+    Returns:
+        Table: one Arrow column per name in columns
+    """
+    schema = arrow_schema(table)
+    fields = [schema.field(column) for column in columns]
+
+    return pa.table(
+        [
+            pa.array(batch[field.name]).cast(field.type)
+            if batch[field.name].dtype.kind != "O"
+            else pa.array(batch[field.name].tolist(), type=field.type)
+            for field in fields
+        ],
+        schema=pa.schema(fields),
+    )
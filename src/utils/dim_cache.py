@@ -0,0 +1,477 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from generator.schema import column_names, primary_key
+from utils.logger import timed_stage
+
+
+DEFAULT_MAX_AGE_SECONDS = 60
+DEFAULT_BLOCK_SIZE = 65536
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Kept across warm invocations like the connections in utils.connections.
+# Entries are keyed by table name, so a process reads one database only.
+_dimensions = {}
+_key_blocks = {}
+
+
+def lookup(keys, sorted_keys):
+    """Join keys to a sorted array of unique keys by binary search.
+
+    Args:
+        keys (ndarray): keys to look up
+        sorted_keys (ndarray): keys to look in, sorted and unique
+
+    Returns:
+        tuple: the position of each key in sorted_keys, and a boolean array
+        of which keys were found; positions of keys not found are not
+        meaningful
+    """
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=np.intp), np.zeros(len(keys), bool)
+
+    positions = np.searchsorted(sorted_keys, keys)
+    positions = np.minimum(positions, len(sorted_keys) - 1)
+    return positions, sorted_keys[positions] == keys
+
+
+class Dimension:
+    """Rows of a dimension table held as a sorted array of unique ids and
+    one array per column, parallel to the ids.
+
+    A million rows cost a few arrays rather than a million dicts, and a
+    batch of keys is resolved with one binary search, see lookup.
+
+    Args:
+        ids (sequence): unique primary keys
+        columns (dict): column name to sequence of values, one per id
+        version: token the rows were loaded at, see table_version
+    """
+
+    def __init__(self, ids, columns=None, version=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        columns = {
+            name: np.asarray(values)
+            for name, values in (columns or {}).items()
+        }
+        if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():
+            order = np.argsort(ids, kind="stable")
+            ids = ids[order]
+            columns = {name: values[order] for name, values in columns.items()}
+
+        self.ids = ids
+        self.columns = columns
+        self.version = version
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + sum(v.nbytes for v in self.columns.values())
+
+    def get(self, keys, column, default=None):
+        """Return a column's value for each key, and which keys were found.
+
+        Args:
+            keys (ndarray): ids to look up
+            column (str): name of the column to return
+            default: value for keys that are not found
+
+        Returns:
+            tuple: array of values, and a boolean array of found keys
+        """
+        keys = np.asarray(keys)
+        if len(self.ids) == 0:
+            return (
+                np.full(len(keys), default, dtype=object),
+                np.zeros(len(keys), bool),
+            )
+
+        positions, found = lookup(keys, self.ids)
+        values = self.columns[column][positions]
+        if not found.all():
+            values = values.astype(object)
+            values[~found] = default
+        return values, found
+
+    def merge(self, ids, columns):
+        """Return a new Dimension with rows added, where a row replaces any
+        row with the same id, including earlier rows of the same call."""
+        ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        columns = {
+            name: np.concatenate([self.columns[name], np.asarray(values)])
+            for name, values in columns.items()
+        }
+        # np.unique keeps the first of equal keys, so look in reverse
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = len(ids) - 1 - last
+        return Dimension(
+            ids[keep],
+            {name: values[keep] for name, values in columns.items()},
+        )
+
+
+def table_version(conn, table):
+    """Return a token that changes whenever rows are added to or deleted
+    from a table: its row count and largest primary key. Both come from
+    the primary key index. Updates in place are not detected, so callers
+    that update dimensions must call invalidate.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): table definition
+
+    Returns:
+        tuple: row count and largest key, 0 when empty
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT count(*), coalesce(max({primary_key(table)}), 0) "
+        f"FROM {table.name};"
+    )
+    return tuple(cursor.fetchone())
+
+
+def load_dimension(conn, table, columns=None, key_range=None):
+    """Read a table, or the rows with keys in key_range, into a Dimension.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): table definition
+        columns (sequence): names of the columns to keep, all but the
+        primary key if None
+        key_range (tuple): first key and the key after the last to read
+
+    Returns:
+        Dimension: the rows read
+    """
+    key = primary_key(table)
+    if columns is None:
+        columns = [name for name in column_names(table) if name != key]
+    cursor = conn.cursor()
+    statement = f"SELECT {', '.join([key, *columns])} FROM {table.name}"
+    args = ()
+    if key_range is not None:
+        statement += f" WHERE {key} >= %s AND {key} < %s"
+        args = tuple(int(k) for k in key_range)
+
+    with timed_stage("load_dimension", table=table.name) as stage:
+        cursor.execute(statement + f" ORDER BY {key};", args)
+        rows = cursor.fetchall()
+        stage.rows = len(rows)
+
+    values = list(zip(*rows)) or [()] * (len(columns) + 1)
+    return Dimension(
+        values[0],
+        {name: np.array(column) for name, column in zip(columns, values[1:])},
+    )
+
+
+def get_dimension(
+    conn,
+    table,
+    columns=None,
+    version=None,
+    max_age=DEFAULT_MAX_AGE_SECONDS,
+):
+    """Return a whole table as a cached Dimension, such as the existing
+    ids of customers to pick from.
+
+    The cached rows are reused for max_age seconds, then kept only if the
+    table's version has not changed since they were loaded. A caller that
+    already knows the version can pass it to skip the check. When rows
+    have only been appended since, just the new keys are read, see
+    load_appended.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): table definition
+        columns (sequence): names of the columns to keep, all if None
+        version: the table's current version, read if None
+        max_age (float): seconds a cached Dimension is used unchecked
+
+    Returns:
+        Dimension: the table's rows
+    """
+    cached = _dimensions.get(table.name)
+    now = time.monotonic()
+    dimension = None
+
+    if cached is not None and cached[2] == columns:
+        dimension, checked_at, _ = cached
+        if version is None and now - checked_at <= max_age:
+            return dimension
+        if version is None:
+            version = table_version(conn, table)
+        if version == dimension.version:
+            _dimensions[table.name] = (dimension, now, columns)
+            return dimension
+    elif version is None:
+        version = table_version(conn, table)
+
+    if dimension is not None:
+        dimension = load_appended(conn, table, dimension, version, columns)
+    if dimension is None:
+        dimension = load_dimension(conn, table, columns)
+    dimension.version = version
+    _dimensions[table.name] = (dimension, now, columns)
+    return dimension
+
+
+def load_appended(conn, table, dimension, version, columns=None):
+    """Extend a Dimension with the rows added to a table since it was
+    loaded, if rows have only been appended, reading only the new keys.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): table definition
+        dimension (Dimension): rows loaded at an earlier table_version
+        version (tuple): the table's current version
+        columns (sequence): names of the columns kept, all if None
+
+    Returns:
+        Dimension: the current rows, or None if rows were deleted or keys
+        below the last one loaded were added, and the table must be read
+        again
+    """
+    (old_count, old_last), (count, last) = dimension.version, version
+    if count < old_count or last < old_last:
+        return None
+
+    added = load_dimension(conn, table, columns, (old_last + 1, last + 1))
+    if len(dimension) + len(added) != count:
+        return None
+
+    return Dimension(
+        np.concatenate([dimension.ids, added.ids]),
+        {
+            name: np.concatenate([values, added.columns[name]])
+            for name, values in dimension.columns.items()
+        },
+    )
+
+
+class KeyBlocks:
+    """The keys of a large table, such as customers, read in blocks of
+    block_size consecutive key values and held in a least recently used
+    cache of at most max_bytes, so picking keys does not hold every key.
+
+    Only the number of keys in each block is kept for the whole table.
+    Keys are picked by rank through a KeyView, which reads the blocks the
+    ranks fall in. One block is always kept, even when it alone is over
+    max_bytes.
+
+    Args:
+        table (Table): table definition
+        block_size (int): number of key values each block covers
+        max_bytes (int): most bytes of keys to cache
+    """
+
+    def __init__(
+        self,
+        table,
+        block_size=DEFAULT_BLOCK_SIZE,
+        max_bytes=DEFAULT_MAX_BYTES,
+    ):
+        self.table = table
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.counts = np.zeros(0, np.int64)
+        self.version = None
+        self.checked_at = None
+        self.blocks = OrderedDict()
+        self.nbytes = 0
+        # Views share the blocks, and the connection that reads them,
+        # across the threads of generator.loader.parallel_load.
+        self.lock = threading.Lock()
+
+    def refresh(self, conn, version=None, max_age=DEFAULT_MAX_AGE_SECONDS):
+        """Count the keys in each block again if the table has changed.
+
+        The counts are reused for max_age seconds, then kept only if the
+        table's version has not changed, as in get_dimension. When rows
+        have only been appended, just the blocks from the last key loaded
+        on are counted again and dropped from the cache.
+
+        Args:
+            conn (Connection): open pg8000 connection
+            version: the table's current version, read if None
+            max_age (float): seconds the counts are used unchecked
+        """
+        now = time.monotonic()
+        if version is None:
+            if (
+                self.checked_at is not None
+                and now - self.checked_at <= max_age
+            ):
+                return
+            version = table_version(conn, self.table)
+        self.checked_at = now
+        if version == self.version:
+            return
+
+        first = 0
+        if self.version is not None:
+            (old_count, old_last), (count, last) = self.version, version
+            if count >= old_count and last >= old_last:
+                first = min(old_last // self.block_size, len(self.counts))
+        counts = np.concatenate(
+            [self.counts[:first], self.count_blocks(conn, first)]
+        )
+        if first > 0 and counts.sum() != version[0]:
+            first = 0
+            counts = self.count_blocks(conn)
+
+        for number in [n for n in self.blocks if n >= first]:
+            self.nbytes -= self.blocks.pop(number).nbytes
+        self.counts = counts
+        self.version = version
+
+    def count_blocks(self, conn, first=0):
+        """Return the number of keys in each block from block first on."""
+        key = primary_key(self.table)
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT {key} / %s, count(*) FROM {self.table.name} "
+            f"WHERE {key} >= %s GROUP BY 1 ORDER BY 1;",
+            (self.block_size, first * self.block_size),
+        )
+        rows = cursor.fetchall()
+        counts = np.zeros(rows[-1][0] + 1 - first if rows else 0, np.int64)
+        for number, count in rows:
+            counts[number - first] = count
+        return counts
+
+    def block(self, conn, number):
+        """Return the sorted keys of a block, reading it if it is not
+        cached and evicting the least recently used blocks over
+        max_bytes."""
+        ids = self.blocks.get(number)
+        if ids is not None:
+            self.blocks.move_to_end(number)
+            return ids
+
+        start = number * self.block_size
+        ids = load_dimension(
+            conn, self.table, (), (start, start + self.block_size)
+        ).ids
+        self.blocks[number] = ids
+        self.nbytes += ids.nbytes
+        while self.nbytes > self.max_bytes and len(self.blocks) > 1:
+            _, evicted = self.blocks.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return ids
+
+    def rank(self, conn, key):
+        """Return the number of keys below key."""
+        number = key // self.block_size
+        if number < 0:
+            return 0
+        if number >= len(self.counts):
+            return int(self.counts.sum())
+        below = int(self.counts[:number].sum())
+        if self.counts[number] == 0:
+            return below
+        return below + int(np.searchsorted(self.block(conn, number), key))
+
+    def keys(self, conn, key_range=None):
+        """Return a KeyView of the keys, or of those in key_range, that
+        reads blocks on conn."""
+        if key_range is None:
+            return KeyView(self, conn, 0, int(self.counts.sum()))
+        with self.lock:
+            start, stop = (self.rank(conn, int(k)) for k in key_range)
+        return KeyView(self, conn, start, max(stop - start, 0))
+
+
+class KeyView:
+    """The keys of a KeyBlocks from rank start on, indexed by rank.
+
+    A view supports what generate_data needs to pick keys: len, and
+    indexing with an integer or an array of ranks.
+
+    Args:
+        blocks (KeyBlocks): the blocks to read keys from
+        conn (Connection): open pg8000 connection to read blocks on
+        start (int): rank of the first key in the view
+        size (int): number of keys in the view
+    """
+
+    def __init__(self, blocks, conn, start, size):
+        self.blocks = blocks
+        self.conn = conn
+        self.start = start
+        self.size = size
+        # The counts the ranks refer to, even if the blocks are refreshed
+        self.counts = blocks.counts
+        self.ends = np.cumsum(self.counts)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, ranks):
+        ranks = np.asarray(ranks, dtype=np.int64)
+        scalar = ranks.ndim == 0
+        ranks = np.where(ranks < 0, ranks + self.size, ranks).ravel()
+        if ((ranks < 0) | (ranks >= self.size)).any():
+            raise IndexError("key rank out of range")
+
+        ranks = ranks + self.start
+        numbers = np.searchsorted(self.ends, ranks, side="right")
+        offsets = ranks - (self.ends[numbers] - self.counts[numbers])
+        keys = np.empty(len(ranks), np.int64)
+
+        order = np.argsort(numbers, kind="stable")
+        splits = np.flatnonzero(np.diff(numbers[order])) + 1
+        with self.blocks.lock:
+            for rows in np.split(order, splits):
+                if len(rows) == 0:
+                    continue
+                ids = self.blocks.block(self.conn, int(numbers[rows[0]]))
+                # Keys added to a block since it was counted only move
+                # picks within the block.
+                keys[rows] = ids[np.minimum(offsets[rows], len(ids) - 1)]
+        return keys[0] if scalar else keys
+
+
+def get_keys(
+    conn,
+    table,
+    key_range=None,
+    version=None,
+    max_age=DEFAULT_MAX_AGE_SECONDS,
+):
+    """Return the keys of a table, or those in key_range, to pick from,
+    such as the customers a sale is made by, through the cached
+    KeyBlocks of the table.
+
+    Args:
+        conn (Connection): open pg8000 connection
+        table (Table): table definition
+        key_range (tuple): first key and the key after the last to keep
+        version: the table's current version, read if None
+        max_age (float): seconds the block counts are used unchecked
+
+    Returns:
+        KeyView: the keys, in order
+    """
+    blocks = _key_blocks.get(table.name)
+    if blocks is None:
+        blocks = _key_blocks[table.name] = KeyBlocks(table)
+    with blocks.lock:
+        blocks.refresh(conn, version, max_age)
+    return blocks.keys(conn, key_range)
+
+
+def invalidate(table):
+    """Forget the cached rows and keys of a table."""
+    _dimensions.pop(table.name, None)
+    _key_blocks.pop(table.name, None)
+
+
+def clear_cache():
+    """Forget every cached dimension and key."""
+    _dimensions.clear()
+    _key_blocks.clear()
@@ -1,18 +1,161 @@
+import datetime
+import functools
+import json
 import logging
+import os
+import sys
+import time
+
+
+LOGGER_NAME = "etl-holidays"
+METRICS_NAMESPACE = "etl-holidays"
+# Set to "true" to add CloudWatch Embedded Metric Format metadata to stage
+# timing lines, so CloudWatch extracts them as metrics.
+EMF_ENV_VARIABLE = "LOG_METRICS_EMF"
+
+STAGE_METRICS = (
+    ("duration_ms", "Milliseconds"),
+    ("rows", "Count"),
+    ("bytes", "Bytes"),
+    ("rows_per_second", "Count/Second"),
+)
+
+_logger = None
 
 
 def custom_logger():
-    log = logging.getLogger("etl-holidays")
-    log.setLevel(logging.INFO)
-    log.handlers = []  # remove handler provided by AWS
-    log.propagate = False
-
-    handler = logging.StreamHandler()
-    handler.setLevel(logging.INFO)
-    log_fmt = logging.Formatter(
-        "[%(levelname)s] :: %(module)s/%(funcName)s :: %(message)s"
-    )
-    handler.setFormatter(log_fmt)
-
-    log.addHandler(handler)
-    return log
+    """Return the project logger, writing one JSON object per line to
+    stdout. It is configured on the first call only, later calls return
+    the same logger."""
+    global _logger
+
+    if _logger is None:
+        log = logging.getLogger(LOGGER_NAME)
+        log.setLevel(logging.INFO)
+        log.handlers = []  # remove handler provided by AWS
+        log.propagate = False
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setLevel(logging.INFO)
+        handler.setFormatter(JsonFormatter())
+
+        log.addHandler(handler)
+        _logger = log
+
+    return _logger
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single line JSON objects. Structured values passed
+    as extra={"fields": {...}} become top level keys."""
+
+    def format(self, record):
+        document = {
+            "timestamp": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "location": f"{record.module}/{record.funcName}",
+            "message": record.getMessage(),
+        }
+        document.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(document, default=str)
+
+
+class timed_stage:
+    """Time a stage and log its duration, rows and bytes as one structured
+    line when it ends, as a context manager or a decorator.
+
+    Within a with block, set rows and bytes on the returned object to
+    record throughput:
+
+        with timed_stage("bulk_load", table="sales") as stage:
+            stage.rows = copy_batches(...)
+
+    As a decorator, every call is timed separately and the function's name
+    is logged with it. A stage that raises is logged at ERROR level with
+    the error, and the exception propagates.
+
+    Args:
+        stage (str): name of the stage, e.g. "connect" or "seed"
+        emf (bool): add CloudWatch Embedded Metric Format metadata,
+        defaults to the LOG_METRICS_EMF environment variable
+        **fields: further values to log, e.g. the table name
+    """
+
+    def __init__(self, stage, emf=None, **fields):
+        self.stage = stage
+        self.emf = emf
+        self.fields = fields
+        self.rows = None
+        self.bytes = None
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with timed_stage(
+                self.stage,
+                self.emf,
+                function=function.__qualname__,
+                **self.fields,
+            ):
+                return function(*args, **kwargs)
+
+        return timed
+
+    def __enter__(self):
+        self.rows = None
+        self.bytes = None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        fields = {"stage": self.stage, **self.fields}
+        fields["duration_ms"] = round(seconds * 1000, 3)
+
+        if self.rows is not None:
+            fields["rows"] = self.rows
+            # pg8000 reports a rowcount of -1 when it is not known.
+            if isinstance(self.rows, int) and self.rows >= 0 and seconds:
+                fields["rows_per_second"] = round(self.rows / seconds)
+        if self.bytes is not None:
+            fields["bytes"] = self.bytes
+        if exc_value is not None:
+            fields["error"] = str(exc_value)
+
+        emf = self.emf
+        if emf is None:
+            emf = os.environ.get(EMF_ENV_VARIABLE, "").lower() == "true"
+        if emf:
+            fields["_aws"] = emf_metadata(fields)
+
+        custom_logger().log(
+            logging.INFO if exc_value is None else logging.ERROR,
+            f"{self.stage} {'finished' if exc_value is None else 'failed'}",
+            extra={"fields": fields},
+            stacklevel=2,
+        )
+        return False
+
+
+def emf_metadata(fields):
+    """Build the Embedded Metric Format "_aws" metadata declaring the stage
+    metrics present in fields, with the stage name as the dimension."""
+    return {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [
+            {
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["stage"]],
+                "Metrics": [
+                    {"Name": name, "Unit": unit}
+                    for name, unit in STAGE_METRICS
+                    if name in fields
+                ],
+            }
+        ],
+    }
@@ -0,0 +1,125 @@
+import io
+
+
+# S3 multipart uploads need every part but the last to be at least 5 MiB.
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class MultipartUpload(io.RawIOBase):
+    """Write-only file object uploading to S3 as a multipart upload.
+
+    Bytes are buffered until a part is full, then uploaded, so at most one
+    part is held in memory. The upload is completed when the object is
+    closed, or aborted if the with block raises or abort is called.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=DEFAULT_PART_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.size = 0
+        self.aborted = False
+        self.upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket, Key=key
+        )["UploadId"]
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.size += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def close(self):
+        if not self.closed and not self.aborted:
+            if self.buffer or not self.parts:
+                self._upload_part(bytes(self.buffer))
+                self.buffer.clear()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        super().close()
+
+    def abort(self):
+        if not self.aborted:
+            self.aborted = True
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        self.close()
+
+    def _upload_part(self, data):
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self.parts.append(
+            {"ETag": response["ETag"], "PartNumber": part_number}
+        )
+
+
+class RangedObject(io.RawIOBase):
+    """Read-only, seekable file object over an S3 object.
+
+    Every read fetches just the bytes asked for with a ranged GET, so a
+    Parquet reader can read the footer and then one row group at a time
+    without downloading the whole object.
+    """
+
+    def __init__(self, s3_client, bucket, key):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.size = s3_client.head_object(Bucket=bucket, Key=key)[
+            "ContentLength"
+        ]
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def readinto(self, buffer):
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+
+        data = self.s3_client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={self.position}-{end - 1}",
+        )["Body"].read()
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
@@ -0,0 +1,112 @@
+"""Startup profiling for Lambda cold starts.
+
+With PROFILE_STARTUP=true, importing this module first in a handler module
+times every import that follows. report_imports then logs the slowest
+modules, and report_first_query logs how long it took, from this import,
+until the first connection answered a query. Without the variable, both
+do nothing and imports are not wrapped.
+"""
+import builtins
+import os
+import sys
+import time
+from utils.logger import custom_logger
+
+
+PROFILE_ENV_VARIABLE = "PROFILE_STARTUP"
+REPORTED_MODULES = 15
+
+_started_at = time.perf_counter()
+_import_times = {}
+_first_query_reported = False
+_original_import = builtins.__import__
+_children = [0.0]
+
+
+def profiling():
+    """Check whether the startup profiling mode is on."""
+    return os.environ.get(PROFILE_ENV_VARIABLE, "").lower() == "true"
+
+
+def timed_import(name, *args, **kwargs):
+    """Import as builtins.__import__ does, recording how long each module
+    not imported before took, with and without the modules it imported."""
+    if name in sys.modules:
+        return _original_import(name, *args, **kwargs)
+
+    _children.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        nested = _children.pop()
+        _children[-1] += seconds
+        total, own = _import_times.get(name, (0.0, 0.0))
+        _import_times[name] = (total + seconds, own + seconds - nested)
+
+
+def report_imports(handler_module):
+    """Log the total import time and the slowest modules imported since
+    this module was, then stop timing imports.
+
+    Args:
+        handler_module (str): name of the module being profiled
+
+    Returns:
+        dict: the fields logged, or None when not profiling
+    """
+    if builtins.__import__ is not timed_import:
+        return None
+    builtins.__import__ = _original_import
+
+    slowest = sorted(
+        _import_times.items(), key=lambda item: item[1][0], reverse=True
+    )
+    fields = {
+        "stage": "startup_imports",
+        "handler_module": handler_module,
+        "duration_ms": round((time.perf_counter() - _started_at) * 1000, 3),
+        "modules": [
+            {
+                "module": name,
+                "cumulative_ms": round(total * 1000, 3),
+                "self_ms": round(own * 1000, 3),
+            }
+            for name, (total, own) in slowest[:REPORTED_MODULES]
+        ],
+    }
+    custom_logger().info("startup imports", extra={"fields": fields})
+    return fields
+
+
+def report_first_query(conn):
+    """Run a trivial query on the first connection opened while profiling
+    and log the time from startup until it answered.
+
+    Args:
+        conn (Connection): newly opened pg8000 connection
+
+    Returns:
+        dict: the fields logged, or None when not profiling or already
+        reported
+    """
+    global _first_query_reported
+
+    if _first_query_reported or not profiling():
+        return None
+    _first_query_reported = True
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1;")
+    cursor.fetchone()
+    fields = {
+        "stage": "startup_first_query",
+        "duration_ms": round((time.perf_counter() - _started_at) * 1000, 3),
+    }
+    custom_logger().info("startup first query", extra={"fields": fields})
+    return fields
+
+
+if profiling():
+    builtins.__import__ = timed_import
@@ -0,0 +1,94 @@
+data "aws_iam_policy_document" "s3_extract_document" {
+  # Without ListBucket, reading a watermark that does not exist yet is
+  # denied instead of answered with NoSuchKey.
+  statement {
+
+    actions = [
+      "s3:ListBucket"
+    ]
+
+    resources = [aws_s3_bucket.code_bucket.arn]
+  }
+
+  statement {
+
+    actions = [
+      "s3:GetObject",
+      "s3:PutObject",
+      "s3:AbortMultipartUpload"
+    ]
+
+    resources = ["${aws_s3_bucket.code_bucket.arn}/*"]
+  }
+}
+
+resource "aws_iam_policy" "s3_extract_policy" {
+  name_prefix = "s3-extract-policy-"
+  policy      = data.aws_iam_policy_document.s3_extract_document.json
+}
+
+resource "aws_iam_role" "extract_role" {
+  name_prefix        = "role-extract-"
+  assume_role_policy = data.aws_iam_policy_document.assume_role_document.json
+}
+
+resource "aws_iam_role_policy_attachment" "extract_cw_policy_attachment" {
+  role       = aws_iam_role.extract_role.name
+  policy_arn = aws_iam_policy.cw_policy.arn
+}
+
+resource "aws_iam_role_policy_attachment" "extract_ec2_policy_attachment" {
+  role       = aws_iam_role.extract_role.name
+  policy_arn = aws_iam_policy.ec2_policy.arn
+}
+
+resource "aws_iam_role_policy_attachment" "extract_s3_policy_attachment" {
+  role       = aws_iam_role.extract_role.name
+  policy_arn = aws_iam_policy.s3_extract_policy.arn
+}
+
+# Lets lambdas in the VPC reach S3 without a NAT gateway
+resource "aws_vpc_endpoint" "s3_endpoint" {
+  vpc_id            = aws_vpc.etl_hols_vpc.id
+  service_name      = "com.amazonaws.${var.region}.s3"
+  vpc_endpoint_type = "Gateway"
+  route_table_ids   = [aws_vpc.etl_hols_vpc.main_route_table_id]
+}
+
+resource "aws_lambda_function" "extract_changes" {
+  description   = "Lambda to extract new OLTP rows to S3 as parquet"
+  filename      = data.archive_file.lambda.output_path
+  function_name = "extract_changes"
+  role          = aws_iam_role.extract_role.arn
+  handler       = "extract.extract.extract_changes"
+  runtime       = "python3.11"
+  timeout       = 300
+  memory_size   = 1024
+
+  layers = [aws_lambda_layer_version.pg8000_layer.arn]
+
+  vpc_config {
+    subnet_ids = [
+      aws_subnet.etl_hols_subnet_a.id,
+      aws_subnet.etl_hols_subnet_b.id,
+      aws_subnet.etl_hols_subnet_c.id
+    ]
+    security_group_ids = [aws_security_group.etl_hols_generator_sg.id]
+  }
+
+  environment {
+    variables = {
+      DB_HOST : aws_db_instance.mock_oltp.address,
+      DB_PORT : aws_db_instance.mock_oltp.port,
+      DB_USER : var.rds_oltp_usr,
+      DB_PASS : var.rds_oltp_pass,
+      EXTRACT_BUCKET : aws_s3_bucket.code_bucket.id,
+      LOG_METRICS_EMF : "true"
+    }
+  }
+}
+
+resource "aws_cloudwatch_log_group" "extract_log_group" {
+  name = "/aws/lambda/${aws_lambda_function.extract_changes.function_name}"
+  depends_on = [aws_lambda_function.extract_changes]
+}
@@ -0,0 +1,130 @@
+resource "aws_vpc_endpoint" "lambda_endpoint" {
+  vpc_id              = aws_vpc.etl_hols_vpc.id
+  service_name        = "com.amazonaws.${var.region}.lambda"
+  vpc_endpoint_type   = "Interface"
+  security_group_ids  = [aws_security_group.etl_hols_generator_sg.id]
+  private_dns_enabled = true
+  subnet_ids = [
+    aws_subnet.etl_hols_subnet_a.id,
+    aws_subnet.etl_hols_subnet_b.id,
+    aws_subnet.etl_hols_subnet_c.id
+  ]
+}
+
+resource "aws_lambda_function" "generate_shard" {
+  description   = "Lambda to generate and load one shard of a fanned out run"
+  filename      = data.archive_file.lambda.output_path
+  function_name = "generate_shard"
+  role          = aws_iam_role.generator_role.arn
+  handler       = "generator.fanout.generate_shard"
+  runtime       = "python3.11"
+  timeout       = 900
+  memory_size   = 1024
+
+  layers = [aws_lambda_layer_version.pg8000_layer.arn]
+
+  vpc_config {
+    subnet_ids = [
+      aws_subnet.etl_hols_subnet_a.id,
+      aws_subnet.etl_hols_subnet_b.id,
+      aws_subnet.etl_hols_subnet_c.id
+    ]
+    security_group_ids = [aws_security_group.etl_hols_generator_sg.id]
+  }
+
+  environment {
+    variables = {
+      DB_HOST : aws_db_instance.mock_oltp.address,
+      DB_NAME : aws_db_instance.mock_oltp.db_name,
+      DB_PORT : aws_db_instance.mock_oltp.port,
+      DB_USER : var.rds_oltp_usr,
+      DB_PASS : var.rds_oltp_pass,
+      LOG_METRICS_EMF : "true"
+    }
+  }
+}
+
+resource "aws_lambda_function_event_invoke_config" "generate_shard" {
+  function_name = aws_lambda_function.generate_shard.function_name
+  # Failed shards are retried by running the coordinator again.
+  maximum_retry_attempts = 0
+}
+
+resource "aws_cloudwatch_log_group" "generate_shard_log_group" {
+  name = "/aws/lambda/${aws_lambda_function.generate_shard.function_name}"
+  depends_on = [aws_lambda_function.generate_shard]
+}
+
+data "aws_iam_policy_document" "invoke_shard_document" {
+  statement {
+
+    actions = [
+      "lambda:InvokeFunction",
+    ]
+
+    resources = [aws_lambda_function.generate_shard.arn]
+  }
+}
+
+resource "aws_iam_policy" "invoke_shard_policy" {
+  name_prefix = "invoke-shard-policy-"
+  policy      = data.aws_iam_policy_document.invoke_shard_document.json
+}
+
+resource "aws_iam_role" "coordinator_role" {
+  name_prefix        = "role-coordinator-"
+  assume_role_policy = data.aws_iam_policy_document.assume_role_document.json
+}
+
+resource "aws_iam_role_policy_attachment" "coordinator_cw_policy_attachment" {
+  role       = aws_iam_role.coordinator_role.name
+  policy_arn = aws_iam_policy.cw_policy.arn
+}
+
+resource "aws_iam_role_policy_attachment" "coordinator_ec2_policy_attachment" {
+  role       = aws_iam_role.coordinator_role.name
+  policy_arn = aws_iam_policy.ec2_policy.arn
+}
+
+resource "aws_iam_role_policy_attachment" "coordinator_invoke_policy_attachment" {
+  role       = aws_iam_role.coordinator_role.name
+  policy_arn = aws_iam_policy.invoke_shard_policy.arn
+}
+
+resource "aws_lambda_function" "coordinate_generation" {
+  description   = "Lambda to split a sales load into shards and invoke workers"
+  filename      = data.archive_file.lambda.output_path
+  function_name = "coordinate_generation"
+  role          = aws_iam_role.coordinator_role.arn
+  handler       = "generator.fanout.coordinate_generation"
+  runtime       = "python3.11"
+  timeout       = 60
+
+  layers = [aws_lambda_layer_version.pg8000_layer.arn]
+
+  vpc_config {
+    subnet_ids = [
+      aws_subnet.etl_hols_subnet_a.id,
+      aws_subnet.etl_hols_subnet_b.id,
+      aws_subnet.etl_hols_subnet_c.id
+    ]
+    security_group_ids = [aws_security_group.etl_hols_generator_sg.id]
+  }
+
+  environment {
+    variables = {
+      DB_HOST : aws_db_instance.mock_oltp.address,
+      DB_NAME : aws_db_instance.mock_oltp.db_name,
+      DB_PORT : aws_db_instance.mock_oltp.port,
+      DB_USER : var.rds_oltp_usr,
+      DB_PASS : var.rds_oltp_pass,
+      WORKER_FUNCTION : aws_lambda_function.generate_shard.function_name,
+      LOG_METRICS_EMF : "true"
+    }
+  }
+}
+
+resource "aws_cloudwatch_log_group" "coordinate_generation_log_group" {
+  name = "/aws/lambda/${aws_lambda_function.coordinate_generation.function_name}"
+  depends_on = [aws_lambda_function.coordinate_generation]
+}
@@ -122,7 +122,9 @@ resource "aws_lambda_function" "init_db" {
       DB_NAME : aws_db_instance.mock_oltp.db_name,
       DB_PORT : aws_db_instance.mock_oltp.port,
       DB_USER : var.rds_oltp_usr,
-      DB_PASS : var.rds_oltp_pass
+      DB_PASS : var.rds_oltp_pass,
+      LOG_METRICS_EMF : "true",
+      PROFILE_STARTUP : tostring(var.profile_startup)
     }
   }
 }
@@ -132,6 +134,60 @@ resource "aws_cloudwatch_log_group" "db_init_log_group" {
   depends_on = [aws_lambda_function.init_db]
 }
 
+resource "aws_lambda_function" "add_sales" {
+  description   = "Lambda to append new sales to the database on a schedule"
+  filename      = data.archive_file.lambda.output_path
+  function_name = "add_sales"
+  role          = aws_iam_role.generator_role.arn
+  handler       = "generator.incremental.add_sales"
+  runtime       = "python3.11"
+  timeout       = 30
+
+  layers = [aws_lambda_layer_version.pg8000_layer.arn]
+
+  vpc_config {
+    subnet_ids = [
+      aws_subnet.etl_hols_subnet_a.id,
+      aws_subnet.etl_hols_subnet_b.id,
+      aws_subnet.etl_hols_subnet_c.id
+    ]
+    security_group_ids = [aws_security_group.etl_hols_generator_sg.id]
+  }
+
+  environment {
+    variables = {
+      DB_HOST : aws_db_instance.mock_oltp.address,
+      DB_NAME : aws_db_instance.mock_oltp.db_name,
+      DB_PORT : aws_db_instance.mock_oltp.port,
+      DB_USER : var.rds_oltp_usr,
+      DB_PASS : var.rds_oltp_pass,
+      LOG_METRICS_EMF : "true"
+    }
+  }
+}
+
+resource "aws_cloudwatch_log_group" "add_sales_log_group" {
+  name = "/aws/lambda/${aws_lambda_function.add_sales.function_name}"
+  depends_on = [aws_lambda_function.add_sales]
+}
+
+resource "aws_cloudwatch_event_rule" "add_sales_schedule" {
+  name_prefix         = "add-sales-"
+  schedule_expression = "rate(15 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "add_sales_target" {
+  rule = aws_cloudwatch_event_rule.add_sales_schedule.name
+  arn  = aws_lambda_function.add_sales.arn
+}
+
+resource "aws_lambda_permission" "allow_add_sales_schedule" {
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.add_sales.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.add_sales_schedule.arn
+}
+
 data "aws_lambda_invocation" "init_db" {
   function_name = aws_lambda_function.init_db.function_name
 
@@ -0,0 +1,84 @@
+resource "aws_s3_bucket" "warehouse_bucket" {
+  bucket_prefix = "etl-holidays-warehouse-"
+  force_destroy = true
+}
+
+data "aws_iam_policy_document" "s3_transform_document" {
+  statement {
+
+    actions = [
+      "s3:ListBucket"
+    ]
+
+    resources = [
+      aws_s3_bucket.code_bucket.arn,
+      aws_s3_bucket.warehouse_bucket.arn
+    ]
+  }
+
+  statement {
+
+    actions = [
+      "s3:GetObject"
+    ]
+
+    resources = ["${aws_s3_bucket.code_bucket.arn}/*"]
+  }
+
+  statement {
+
+    actions = [
+      "s3:GetObject",
+      "s3:PutObject",
+      "s3:AbortMultipartUpload"
+    ]
+
+    resources = ["${aws_s3_bucket.warehouse_bucket.arn}/*"]
+  }
+}
+
+resource "aws_iam_policy" "s3_transform_policy" {
+  name_prefix = "s3-transform-policy-"
+  policy      = data.aws_iam_policy_document.s3_transform_document.json
+}
+
+resource "aws_iam_role" "transform_role" {
+  name_prefix        = "role-transform-"
+  assume_role_policy = data.aws_iam_policy_document.assume_role_document.json
+}
+
+resource "aws_iam_role_policy_attachment" "transform_cw_policy_attachment" {
+  role       = aws_iam_role.transform_role.name
+  policy_arn = aws_iam_policy.cw_policy.arn
+}
+
+resource "aws_iam_role_policy_attachment" "transform_s3_policy_attachment" {
+  role       = aws_iam_role.transform_role.name
+  policy_arn = aws_iam_policy.s3_transform_policy.arn
+}
+
+resource "aws_lambda_function" "transform_changes" {
+  description   = "Lambda to transform extracted OLTP batches to a star schema"
+  filename      = data.archive_file.lambda.output_path
+  function_name = "transform_changes"
+  role          = aws_iam_role.transform_role.arn
+  handler       = "transform.transform.transform_changes"
+  runtime       = "python3.11"
+  timeout       = 300
+  memory_size   = 1024
+
+  layers = [aws_lambda_layer_version.pg8000_layer.arn]
+
+  environment {
+    variables = {
+      EXTRACT_BUCKET : aws_s3_bucket.code_bucket.id,
+      WAREHOUSE_BUCKET : aws_s3_bucket.warehouse_bucket.id,
+      LOG_METRICS_EMF : "true"
+    }
+  }
+}
+
+resource "aws_cloudwatch_log_group" "transform_log_group" {
+  name = "/aws/lambda/${aws_lambda_function.transform_changes.function_name}"
+  depends_on = [aws_lambda_function.transform_changes]
+}
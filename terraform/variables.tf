@@ -25,4 +25,10 @@ variable "rds_oltp_admin_pass" {
   type      = string
   sensitive = true
   nullable  = false
-}
\ No newline at end of file
+}
+
+variable "profile_startup" {
+  type        = bool
+  default     = false
+  description = "Log import times and time to first query on cold starts"
+}
@@ -0,0 +1,44 @@
+from generator.oltp_schema import locations, sales
+from utils.arrow import arrow_schema, to_arrow_table
+import datetime
+import decimal
+import numpy as np
+import pyarrow as pa
+
+
+def test_arrow_schema_maps_column_types():
+    assert arrow_schema(sales) == pa.schema(
+        [
+            ("sale_id", pa.int32()),
+            ("order_date", pa.date32()),
+            ("price_paid", pa.decimal128(10, 2)),
+            ("customer_id", pa.int32()),
+            ("location_id", pa.int32()),
+        ]
+    )
+    assert arrow_schema(locations).field("location_name").type == pa.string()
+
+
+def test_to_arrow_table_types_columns_as_the_schema():
+    batch = {
+        "order_date": np.array(["2023-01-02"], dtype="datetime64[D]"),
+        "price_paid": np.array([1.5]),
+        "location_id": np.array([7]),
+    }
+
+    arrow_table = to_arrow_table(
+        batch, sales, ["location_id", "order_date", "price_paid"]
+    )
+
+    assert arrow_table.schema.names == [
+        "location_id",
+        "order_date",
+        "price_paid",
+    ]
+    assert arrow_table.to_pylist() == [
+        {
+            "location_id": 7,
+            "order_date": datetime.date(2023, 1, 2),
+            "price_paid": decimal.Decimal("1.50"),
+        }
+    ]
@@ -0,0 +1,155 @@
+from generator.change_log import (
+    acknowledge_changes,
+    consume_changes,
+    install_change_log,
+    prune_changes,
+    read_changes,
+    render_change_log,
+    render_drop_change_log,
+    Change,
+)
+from generator.oltp_schema import customers, sales
+from unittest.mock import Mock, call
+import pytest
+
+
+@pytest.fixture
+def mock_conn():
+    conn = Mock()
+    conn.cursor.return_value.fetchall.return_value = []
+    yield conn
+
+
+def change(change_id, txid=100):
+    return Change(txid, change_id, "sales", change_id, "I")
+
+
+def queue(conn, *batches):
+    """Make read_changes return each batch in turn, then nothing."""
+    conn.cursor.return_value.fetchall.side_effect = [
+        [tuple(c) for c in batch] for batch in batches
+    ] + [[]]
+
+
+# render_change_log
+###############################################################################
+
+
+def test_render_change_log_logs_each_event_once_per_statement():
+    ddl = render_change_log([sales])
+
+    assert "CREATE TABLE IF NOT EXISTS change_log (" in ddl
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        assert f"AFTER {event} ON sales " in ddl
+    assert ddl.count("FOR EACH STATEMENT") == 3
+    assert "FOR EACH ROW" not in ddl
+    assert "REFERENCING OLD TABLE AS old_rows" in ddl
+    assert "SELECT 'sales', sale_id, 'D' FROM old_rows;" in ddl
+
+
+def test_render_change_log_creates_one_function_per_table():
+    ddl = render_change_log([customers, sales])
+
+    assert "FUNCTION customers_log_changes()" in ddl
+    assert "customer_id, left(TG_OP, 1) FROM new_rows;" in ddl
+    assert "FUNCTION sales_log_changes()" in ddl
+
+
+def test_render_change_log_replaces_existing_triggers():
+    ddl = render_change_log([customers])
+
+    assert ddl.index("DROP TRIGGER IF EXISTS customers_log_insert") < (
+        ddl.index("CREATE TRIGGER customers_log_insert")
+    )
+
+
+def test_render_drop_change_log_keeps_logged_changes():
+    ddl = render_drop_change_log([sales])
+
+    assert ddl.count("DROP TRIGGER IF EXISTS") == 3
+    assert "DROP FUNCTION IF EXISTS sales_log_changes();" in ddl
+    assert "DROP TABLE" not in ddl
+
+
+def test_install_change_log_runs_in_one_transaction(mock_conn):
+    install_change_log(mock_conn, [sales])
+
+    assert mock_conn.cursor().execute.mock_calls == [
+        call("BEGIN;"),
+        call(render_change_log([sales])),
+        call("COMMIT;"),
+    ]
+
+
+def test_install_change_log_rolls_back_on_error(mock_conn):
+    mock_conn.cursor().execute.side_effect = [None, RuntimeError, None]
+
+    with pytest.raises(RuntimeError):
+        install_change_log(mock_conn)
+
+    assert mock_conn.cursor().execute.mock_calls[-1] == call("ROLLBACK;")
+
+
+# reading and acknowledging
+###############################################################################
+
+
+def test_read_changes_reads_bounded_batch_after_position(mock_conn):
+    queue(mock_conn, [change(1), change(2)])
+
+    changes = read_changes(mock_conn, "extract", batch_size=2)
+
+    assert changes == [change(1), change(2)]
+    statement, args = mock_conn.cursor().execute.call_args.args
+    assert args == ("extract", 2)
+    assert "ORDER BY txid, change_id LIMIT %s" in statement
+    assert "txid < txid_snapshot_xmin(txid_current_snapshot())" in statement
+
+
+def test_acknowledge_changes_only_moves_position_forward(mock_conn):
+    acknowledge_changes(mock_conn, "extract", change(7, txid=120))
+
+    statement, args = mock_conn.cursor().execute.call_args.args
+    assert args == ("extract", 120, 7)
+    assert "ON CONFLICT (consumer) DO UPDATE" in statement
+    assert "< (excluded.last_txid, excluded.last_change_id)" in statement
+
+
+def test_consume_changes_acknowledges_each_batch(mock_conn):
+    queue(mock_conn, [change(1), change(2)], [change(3)])
+    handle = Mock()
+
+    assert consume_changes(mock_conn, "extract", handle, batch_size=2) == 3
+
+    assert handle.mock_calls == [
+        call([change(1), change(2)]),
+        call([change(3)]),
+    ]
+    acknowledged = [
+        c.args[1]
+        for c in mock_conn.cursor().execute.mock_calls
+        if "change_log_consumers (consumer" in c.args[0]
+    ]
+    assert acknowledged == [("extract", 100, 2), ("extract", 100, 3)]
+
+
+def test_consume_changes_leaves_failed_batch_unacknowledged(mock_conn):
+    queue(mock_conn, [change(1)])
+
+    with pytest.raises(RuntimeError):
+        consume_changes(mock_conn, "extract", Mock(side_effect=RuntimeError))
+
+    assert not any(
+        "ON CONFLICT" in c.args[0]
+        for c in mock_conn.cursor().execute.mock_calls
+    )
+
+
+def test_prune_changes_deletes_bounded_batch(mock_conn):
+    mock_conn.cursor().rowcount = 500
+
+    assert prune_changes(mock_conn, batch_size=500) == 500
+
+    statement, args = mock_conn.cursor().execute.call_args.args
+    assert statement.startswith("DELETE FROM change_log")
+    assert args == (500,)
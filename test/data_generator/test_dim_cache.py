@@ -0,0 +1,278 @@
+from generator.oltp_schema import countries, customers
+from utils import dim_cache
+from utils.dim_cache import (
+    get_dimension,
+    get_keys,
+    load_dimension,
+    lookup,
+    Dimension,
+    KeyBlocks,
+)
+from unittest.mock import patch
+import numpy as np
+import pytest
+
+
+class FakeConnection:
+    """Answer the cache's queries from a dict of id to name, counting the
+    rows read."""
+
+    def __init__(self, rows):
+        self.rows = dict(rows)
+        self.statements = []
+        self.rows_read = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement, args=()):
+        self.statements.append(statement)
+        if "GROUP BY" in statement:
+            block_size, first = args
+            counts = {}
+            for key in self.rows:
+                if key >= first:
+                    counts[key // block_size] = (
+                        counts.get(key // block_size, 0) + 1
+                    )
+            self.result = sorted(counts.items())
+            return
+        if "count(*)" in statement:
+            self.result = [(len(self.rows), max(self.rows, default=0))]
+            return
+        start, stop = args or (0, float("inf"))
+        self.result = [
+            (key, name)
+            for key, name in sorted(self.rows.items())
+            if start <= key < stop
+        ]
+        self.rows_read += len(self.result)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    dim_cache.clear_cache()
+    yield
+    dim_cache.clear_cache()
+
+
+@pytest.fixture
+def clock():
+    with patch("utils.dim_cache.time.monotonic", return_value=0.0) as now:
+        yield now
+
+
+def names(count, first=1):
+    return {key: f"name {key}" for key in range(first, first + count)}
+
+
+# lookup and Dimension
+###############################################################################
+
+
+def test_lookup_finds_positions_of_known_keys():
+    keys = np.array([30, 5, 10, 99])
+
+    positions, found = lookup(keys, np.array([10, 20, 30]))
+
+    assert found.tolist() == [True, False, True, False]
+    assert positions[found].tolist() == [2, 0]
+
+
+def test_lookup_finds_nothing_in_empty_keys():
+    _, found = lookup(np.array([1, 2]), np.array([], dtype=int))
+
+    assert not found.any()
+
+
+def test_dimension_sorts_ids_and_columns_together():
+    dimension = Dimension([3, 1, 2], {"name": ["c", "a", "b"]})
+
+    assert dimension.ids.tolist() == [1, 2, 3]
+    assert dimension.columns["name"].tolist() == ["a", "b", "c"]
+
+
+def test_dimension_get_returns_default_for_unknown_keys():
+    dimension = Dimension([1, 2], {"name": ["a", "b"]})
+
+    values, found = dimension.get([2, 7, 1], "name", default="?")
+
+    assert values.tolist() == ["b", "?", "a"]
+    assert found.tolist() == [True, False, True]
+    assert Dimension([], {"name": []}).get([1], "name")[0].tolist() == [None]
+
+
+def test_dimension_merge_keeps_latest_row_of_each_id():
+    dimension = Dimension([1, 2], {"name": ["a", "b"]})
+
+    merged = dimension.merge([2, 3, 2], {"name": ["old", "c", "new"]})
+
+    assert merged.ids.tolist() == [1, 2, 3]
+    assert merged.columns["name"].tolist() == ["a", "new", "c"]
+
+
+def test_load_dimension_reads_only_keys_in_range():
+    conn = FakeConnection(names(30))
+
+    dimension = load_dimension(conn, customers, key_range=(10, 20))
+
+    assert dimension.ids.tolist() == list(range(10, 20))
+    assert conn.statements[-1] == (
+        "SELECT customer_id, customer_name FROM customers "
+        "WHERE customer_id >= %s AND customer_id < %s ORDER BY customer_id;"
+    )
+
+
+# get_dimension
+###############################################################################
+
+
+def test_get_dimension_reuses_rows_without_queries_within_max_age(clock):
+    conn = FakeConnection({1: "Italy", 2: "Peru"})
+    first = get_dimension(conn, countries)
+    clock.return_value = 30.0
+
+    assert get_dimension(conn, countries, max_age=60) is first
+    assert len(conn.statements) == 2
+
+
+def test_get_dimension_reloads_when_version_changes(clock):
+    conn = FakeConnection({1: "Italy", 2: "Peru"})
+    first = get_dimension(conn, countries)
+    clock.return_value = 120.0
+
+    assert get_dimension(conn, countries, max_age=60) is first
+    conn.rows[3] = "Spain"
+    clock.return_value = 240.0
+    reloaded = get_dimension(conn, countries, max_age=60)
+
+    assert reloaded.get([3], "country_name")[0].tolist() == ["Spain"]
+    assert reloaded.version == (3, 3)
+
+
+def test_get_dimension_trusts_version_given_by_caller(clock):
+    conn = FakeConnection({1: "Italy"})
+    first = get_dimension(conn, countries, version=(1, 1))
+    clock.return_value = 120.0
+
+    assert get_dimension(conn, countries, version=(1, 1)) is first
+    assert get_dimension(conn, countries, version=(2, 2)) is not first
+    assert not any("count(*)" in s for s in conn.statements)
+
+
+def test_get_dimension_reads_only_appended_rows(clock):
+    conn = FakeConnection(names(250))
+    get_dimension(conn, customers)
+
+    conn.rows.update(names(10, first=251))
+    clock.return_value = 120.0
+    dimension = get_dimension(conn, customers)
+
+    assert dimension.ids.tolist() == list(range(1, 261))
+    assert dimension.get([255], "customer_name")[0].tolist() == ["name 255"]
+    assert dimension.version == (260, 260)
+    assert conn.rows_read == 250 + 10
+
+
+def test_get_dimension_reloads_after_deletes(clock):
+    conn = FakeConnection(names(250))
+    get_dimension(conn, customers)
+
+    del conn.rows[5]
+    conn.rows.update(names(10, first=251))
+    clock.return_value = 120.0
+    dimension = get_dimension(conn, customers)
+
+    assert 5 not in dimension.ids
+    assert len(dimension) == 259
+    assert conn.rows_read == 250 + 10 + 259
+
+
+def test_get_dimension_reloads_after_keys_below_last_are_added(clock):
+    conn = FakeConnection({key: f"name {key}" for key in (1, 2, 4)})
+    get_dimension(conn, customers)
+
+    conn.rows[3] = "name 3"
+    conn.rows[5] = "name 5"
+    clock.return_value = 120.0
+
+    assert get_dimension(conn, customers).ids.tolist() == [1, 2, 3, 4, 5]
+
+
+# KeyBlocks and get_keys
+###############################################################################
+
+
+def test_key_view_picks_keys_by_rank_across_blocks():
+    conn = FakeConnection({key: "" for key in (1, 2, 5, 11, 12, 30)})
+    blocks = KeyBlocks(customers, block_size=10)
+    blocks.refresh(conn)
+    keys = blocks.keys(conn)
+
+    assert len(keys) == 6
+    assert keys[[0, 2, 3, 5, 1]].tolist() == [1, 5, 11, 30, 2]
+    assert keys[-1] == 30
+    with pytest.raises(IndexError):
+        keys[6]
+
+
+def test_key_view_keeps_only_keys_in_range():
+    conn = FakeConnection(names(50))
+    blocks = KeyBlocks(customers, block_size=10)
+    blocks.refresh(conn)
+    keys = blocks.keys(conn, (15, 33))
+
+    assert len(keys) == 18
+    assert keys[np.arange(18)].tolist() == list(range(15, 33))
+
+
+def test_key_blocks_evict_least_recently_used_blocks_over_max_bytes():
+    conn = FakeConnection(names(100))
+    # Room for two blocks of ten 8 byte keys
+    blocks = KeyBlocks(customers, block_size=10, max_bytes=160)
+    blocks.refresh(conn)
+    keys = blocks.keys(conn)
+
+    keys[[5, 15]]
+    keys[5]
+    keys[25]
+
+    assert list(blocks.blocks) == [0, 2]
+    assert blocks.nbytes <= blocks.max_bytes
+    rows_read = conn.rows_read
+    keys[15]
+    assert conn.rows_read == rows_read + 10
+    assert list(blocks.blocks) == [2, 1]
+
+
+def test_key_blocks_count_again_only_blocks_appended_to(clock):
+    conn = FakeConnection(names(25))
+    blocks = KeyBlocks(customers, block_size=10)
+    blocks.refresh(conn)
+    blocks.keys(conn)[[0, 24]]
+
+    conn.rows.update(names(10, first=26))
+    clock.return_value = 120.0
+    blocks.refresh(conn)
+
+    assert blocks.counts.tolist() == [9, 10, 10, 6]
+    assert list(blocks.blocks) == [0]
+    assert conn.statements[-1].endswith("GROUP BY 1 ORDER BY 1;")
+    assert blocks.keys(conn)[34] == 35
+
+
+def test_get_keys_caches_blocks_of_a_table(clock):
+    conn = FakeConnection(names(20))
+    get_keys(conn, customers)[[0, 19]]
+    statements = len(conn.statements)
+
+    assert get_keys(conn, customers)[[3, 12]].tolist() == [4, 13]
+    assert len(conn.statements) == statements
+    dim_cache.invalidate(customers)
+    assert "customers" not in dim_cache._key_blocks
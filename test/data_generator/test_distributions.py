@@ -0,0 +1,135 @@
+from generator.distributions import (
+    SalesSkew,
+    build_alias_table,
+    build_sales_sampler,
+    country_peak_months,
+    sample_alias,
+    seasonal_weights,
+    stack_alias_tables,
+    zipf_weights,
+)
+import datetime
+import numpy as np
+import pytest
+
+
+def test_build_alias_table_reproduces_weights():
+    weights = np.array([1.0, 2.0, 3.0, 4.0])
+    table = build_alias_table(weights)
+
+    # Each column keeps probability[i] of its own category and passes the
+    # rest to alias[i]; summing both recovers the normalised weights.
+    recovered = np.bincount(
+        np.concatenate([np.arange(4), table.alias]),
+        weights=np.concatenate([table.probability, 1 - table.probability]),
+    ) / 4
+    assert np.allclose(recovered, weights / weights.sum())
+
+
+def test_build_alias_table_never_draws_zero_weight_categories():
+    table = build_alias_table([0, 5, 0, 1])
+
+    draws = sample_alias(np.random.default_rng(1), table, 10_000)
+
+    assert set(np.unique(draws)) == {1, 3}
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1], [[1], [2]]])
+def test_build_alias_table_raises_value_error_on_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        build_alias_table(weights)
+
+
+def test_sample_alias_draws_from_each_row_of_stacked_tables():
+    table = stack_alias_tables(
+        [build_alias_table([1, 0, 0]), build_alias_table([0, 0, 1])]
+    )
+    rows = np.array([0, 1] * 50)
+
+    draws = sample_alias(np.random.default_rng(1), table, 100, rows=rows)
+
+    assert (draws[rows == 0] == 0).all()
+    assert (draws[rows == 1] == 2).all()
+
+
+def test_zipf_weights_decrease_with_rank():
+    assert np.allclose(zipf_weights(3, 1), [1, 1 / 2, 1 / 3])
+
+
+def test_seasonal_weights_peak_in_peak_month():
+    weights = seasonal_weights(
+        datetime.date(2023, 1, 1), datetime.date(2023, 12, 31), peak_month=3
+    )
+
+    assert len(weights) == 365
+    assert datetime.date(2023, 1, 1) + datetime.timedelta(
+        days=int(weights.argmax())
+    ) == datetime.date(2023, 3, 15)
+
+
+def test_build_sales_sampler_groups_locations_by_country():
+    sampler = build_sales_sampler(
+        SalesSkew(location_countries=["a", "b", "a"], peak_months={"b": 1}),
+        [10, 20, 30],
+        datetime.date(2023, 1, 1),
+        datetime.date(2023, 1, 31),
+        10.0,
+        1000.0,
+    )
+
+    assert list(sampler.location_groups) == [0, 1, 0]
+    assert sampler.days.probability.shape == (2, 31)
+    assert np.isclose(np.exp(sampler.price_mu), 100.0)
+
+
+def test_build_sales_sampler_never_draws_locations_without_country():
+    sampler = build_sales_sampler(
+        SalesSkew(location_countries=[None, "a", "b", "a"]),
+        [1, 2, 3, 4],
+        datetime.date(2023, 1, 1),
+        datetime.date(2023, 1, 31),
+        10.0,
+        1000.0,
+        seed=1,
+    )
+
+    drawn = sample_alias(np.random.default_rng(1), sampler.locations, 1000)
+    assert 0 not in drawn
+    assert set(drawn) == {1, 2, 3}
+
+
+def test_build_sales_sampler_ranks_locations_in_seeded_order():
+    def most_popular(seed):
+        sampler = build_sales_sampler(
+            SalesSkew(),
+            np.arange(1, 101),
+            datetime.date(2023, 1, 1),
+            datetime.date(2023, 1, 31),
+            10.0,
+            1000.0,
+            seed=seed,
+        )
+        return sampler.locations.probability.argmax()
+
+    assert most_popular(1) == most_popular(1)
+    assert len({most_popular(seed) for seed in range(5)}) > 1
+
+
+def test_build_sales_sampler_raises_value_error_on_country_mismatch():
+    with pytest.raises(ValueError):
+        build_sales_sampler(
+            SalesSkew(location_countries=["a"]),
+            [1, 2],
+            datetime.date(2023, 1, 1),
+            datetime.date(2023, 1, 31),
+            10.0,
+            1000.0,
+        )
+
+
+def test_country_peak_months_keys_listed_countries_by_id():
+    peak_months = country_peak_months(
+        [1, 2, 3], ["Argentina", "Italy", "South Africa"]
+    )
+
+    assert peak_months == {1: 1, 3: 12}
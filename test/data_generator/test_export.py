@@ -0,0 +1,200 @@
+from generator.export import (
+    export_dataset,
+    format_csv_batch,
+    load_export,
+    read_manifests,
+    seed_rows_with_ids,
+    verify_export,
+    write_csv,
+)
+from generator.distributions import SalesSkew
+from generator.oltp_schema import (
+    tables,
+    locations,
+    seed_countries,
+    seed_locations,
+)
+from unittest.mock import Mock, patch
+import csv
+import io
+import numpy as np
+import pytest
+
+
+@pytest.fixture(params=["csv", "parquet"])
+def export(request, tmp_path):
+    """Export a small dataset in each file format.
+
+    Yields:
+        str: export directory
+    """
+    export_dataset(
+        str(tmp_path),
+        250,
+        20,
+        batch_size=100,
+        seed=1,
+        file_format=request.param,
+    )
+    yield str(tmp_path)
+
+
+@pytest.fixture
+def mock_conn():
+    """Return a mock connection whose tables are all empty and whose
+    cursor collects each COPY stream's bytes in cursor.sent.
+
+    Yields:
+        Mock: dummy connection
+    """
+    conn = Mock()
+    cursor = Mock()
+    cursor.sent = []
+    cursor.rowcount = 0
+    cursor.fetchone.return_value = (False,)
+
+    def execute(statement, args=None, stream=None):
+        if stream is not None:
+            data = b"".join(stream)
+            cursor.sent.append((statement, data))
+            cursor.rowcount = data.count(b"\n")
+
+    cursor.execute.side_effect = execute
+    conn.cursor.return_value = cursor
+    yield conn
+
+
+def test_export_dataset_writes_shards_and_manifests_per_table(export):
+    manifests = read_manifests(export)
+
+    assert set(manifests) == {table.name for table in tables}
+    assert manifests["sales"]["rows"] == 250
+    assert [s["rows"] for s in manifests["sales"]["shards"]] == [100, 100, 50]
+    assert manifests["customers"]["rows"] == 20
+    assert manifests["locations"]["rows"] == len(seed_locations)
+    assert all("min" in s for s in manifests["sales"]["shards"])
+    verify_export(export, manifests)
+
+
+def test_export_dataset_is_reproducible(tmp_path):
+    for run in ("a", "b"):
+        export_dataset(str(tmp_path / run), 150, 5, batch_size=100, seed=2)
+
+    assert (
+        read_manifests(str(tmp_path / "a"))["sales"]["shards"]
+        == read_manifests(str(tmp_path / "b"))["sales"]["shards"]
+    )
+
+
+def test_export_dataset_peaks_seeded_countries_in_their_season(tmp_path):
+    with patch("generator.export.generate_data") as patched_generate:
+        patched_generate.return_value = []
+        export_dataset(str(tmp_path), 10, 5, seed=1, skew=SalesSkew())
+
+    peak_months = patched_generate.call_args.kwargs["skew"].peak_months
+    argentina = seed_countries.index("Argentina") + 1
+    italy = seed_countries.index("Italy") + 1
+    assert peak_months[argentina] == 1
+    assert italy not in peak_months
+
+
+def test_verify_export_raises_value_error_on_changed_shard(tmp_path):
+    export_dataset(str(tmp_path), 10, 2, seed=1)
+    with open(tmp_path / "sales" / "sales-00000.csv", "ab") as f:
+        f.write(b"2020-01-01,1.00,1,1\n")
+
+    with pytest.raises(ValueError, match="sales-00000.csv"):
+        verify_export(str(tmp_path), read_manifests(str(tmp_path)))
+
+
+def test_seed_rows_with_ids_numbers_rows_and_resolves_parents():
+    columns, rows = seed_rows_with_ids(locations, tables)
+
+    assert columns == ("location_id", "location_name", "country_id")
+    assert rows[0] == (1, "Hotel", None)
+    assert rows[1][0] == 2
+    assert isinstance(rows[1][2], int)
+
+
+def test_format_csv_batch_quotes_only_where_needed():
+    batch = {
+        "id": np.array([1, 2, 3]),
+        "name": np.array(['a, "b"', "", None], dtype=object),
+    }
+
+    text = format_csv_batch(batch, ["id", "name"])
+
+    assert text == '1,"a, ""b"""\n2,""\n3,\n'
+    assert list(csv.reader(text.splitlines())) == [
+        ["1", 'a, "b"'],
+        ["2", ""],
+        ["3", ""],
+    ]
+
+
+def test_write_csv_flushes_a_reused_buffer_in_bounded_chunks():
+    batch = {
+        "id": np.arange(100),
+        "name": np.array([f"name {i}" for i in range(100)], dtype=object),
+    }
+    buffer = bytearray(64)
+    f = io.BytesIO()
+    sizes = []
+    write = f.write
+    f.write = lambda data: sizes.append(len(data)) or write(data)
+
+    with patch("generator.export.CSV_CHUNK_ROWS", 3):
+        write_csv(f, batch, ["id", "name"], buffer)
+
+    assert f.getvalue() == format_csv_batch(batch, ["id", "name"]).encode()
+    assert len(sizes) > 1
+    assert max(sizes) <= len(buffer)
+    assert len(buffer) == 64
+
+
+def test_load_export_copies_every_shard_parents_first(export, mock_conn):
+    row_counts = load_export(mock_conn, export)
+
+    sent = mock_conn.cursor().sent
+    copies = [statement.split(" (")[0] for statement, _ in sent]
+    assert copies.index("COPY countries") < copies.index("COPY locations")
+    assert copies[-1] == "COPY sales"
+    assert all(
+        statement.endswith("FROM STDIN WITH (FORMAT csv);")
+        for statement, _ in sent
+    )
+    assert row_counts["sales"] == 250
+    assert row_counts["customers"] == 20
+
+
+def test_load_export_creates_partitions_and_moves_sequences(export, mock_conn):
+    load_export(mock_conn, export)
+
+    statements = [c.args[0] for c in mock_conn.cursor().execute.mock_calls]
+    assert any("PARTITION OF sales" in s for s in statements)
+    for table in ("countries", "customers", "sales"):
+        assert any(
+            s.startswith(f"SELECT setval(pg_get_serial_sequence('{table}'")
+            for s in statements
+        )
+
+
+def test_export_dataset_writes_client_side_ids(tmp_path):
+    export_dataset(str(tmp_path), 250, 20, batch_size=100, seed=1)
+    manifests = read_manifests(str(tmp_path))
+
+    assert manifests["sales"]["columns"][0] == "sale_id"
+    with open(tmp_path / "sales" / "sales-00001.csv") as f:
+        sale_ids = [int(row[0]) for row in csv.reader(f)]
+    with open(tmp_path / "customers" / "customers-00000.csv") as f:
+        customer_ids = [int(row[0]) for row in csv.reader(f)]
+    assert sale_ids == list(range(101, 201))
+    assert customer_ids == list(range(1, 21))
+
+
+def test_load_export_skips_seeded_tables_already_loaded(export, mock_conn):
+    mock_conn.cursor().fetchone.return_value = (True,)
+
+    row_counts = load_export(mock_conn, export)
+
+    assert set(row_counts) == {"customers", "sales"}
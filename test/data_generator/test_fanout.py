@@ -0,0 +1,406 @@
+from generator.data_generator import count_shards, SALES_COLUMNS
+from generator.fanout import (
+    coordinate,
+    coordinate_generation,
+    plan_shards,
+    run_shard,
+    LambdaInvoker,
+)
+from utils import dim_cache
+from unittest.mock import Mock, patch
+from collections import Counter
+import copy
+import json
+import os
+import subprocess
+import sys
+import threading
+import pytest
+
+
+class FakeDatabase:
+    """Just enough of the OLTP database for the fan-out statements: the
+    generation_shards table, transactions, and COPY into sales, which
+    fails while fail_copies is positive."""
+
+    def __init__(self):
+        self.shards = {}
+        self.sales = []
+        self.statements = []
+        self.fail_copies = 0
+        self.customers = [1, 2, 3, 5, 8, 10]
+        self.locations = [(1, 1), (2, 1), (3, 2)]
+
+    def connect(self):
+        conn = Mock()
+        conn.cursor.return_value = FakeCursor(self)
+        return conn
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+        self.snapshot = None
+        self.rowcount = -1
+
+    def execute(self, statement, args=None, stream=None):
+        db = self.db
+        db.statements.append(statement)
+        self.result = []
+
+        if stream is not None:
+            lines = b"".join(stream).decode().splitlines()
+            if db.fail_copies > 0:
+                db.fail_copies -= 1
+                raise ConnectionError("connection lost during COPY")
+            db.sales.extend(lines)
+            self.rowcount = len(lines)
+        elif statement == "BEGIN;":
+            self.snapshot = (copy.deepcopy(db.shards), len(db.sales))
+        elif statement == "COMMIT;":
+            self.snapshot = None
+        elif statement == "ROLLBACK;":
+            db.shards, size = self.snapshot
+            del db.sales[size:]
+            self.snapshot = None
+        elif "GROUP BY" in statement and "FROM customers" in statement:
+            block_size, first = args
+            self.result = sorted(
+                Counter(
+                    customer_id // block_size
+                    for customer_id in db.customers
+                    if customer_id >= first
+                ).items()
+            )
+        elif "count(*)" in statement and "FROM customers" in statement:
+            self.result = [(len(db.customers), max(db.customers))]
+        elif "FROM customers" in statement:
+            start, stop = args
+            self.result = [
+                (customer_id,)
+                for customer_id in db.customers
+                if start <= customer_id < stop
+            ]
+        elif "FROM locations" in statement:
+            self.result = db.locations
+        elif statement.startswith("INSERT INTO generation_shards"):
+            run_id, shards, payloads = args
+            for shard, payload in zip(shards, payloads):
+                db.shards.setdefault(
+                    (run_id, shard),
+                    {
+                        "payload": json.loads(payload),
+                        "status": "pending",
+                        "attempts": 0,
+                        "rows": None,
+                    },
+                )
+        elif "SET status = 'dispatched'" in statement:
+            run_id, max_attempts, _ = args
+            for (run, shard), state in db.shards.items():
+                if (
+                    run == run_id
+                    and state["attempts"] < max_attempts
+                    and state["status"] in ("pending", "failed")
+                ):
+                    state["status"] = "dispatched"
+                    state["attempts"] += 1
+                    self.result.append((shard, state["payload"]))
+        elif "FOR UPDATE" in statement:
+            if (state := db.shards.get(args)) is not None:
+                self.result = [(state["status"],)]
+        elif "SET status = 'done'" in statement:
+            rows, run_id, shard = args
+            db.shards[(run_id, shard)].update(status="done", rows=rows)
+        elif "SET status = 'failed'" in statement:
+            error, run_id, shard = args
+            state = db.shards[(run_id, shard)]
+            if state["status"] != "done":
+                state.update(status="failed", error=error)
+        elif "GROUP BY status" in statement:
+            totals = {}
+            for (run, _), state in db.shards.items():
+                if run == args[0]:
+                    count, rows = totals.get(state["status"], (0, 0))
+                    totals[state["status"]] = (
+                        count + 1,
+                        rows + (state["rows"] or 0),
+                    )
+            self.result = [
+                (status, count, rows)
+                for status, (count, rows) in totals.items()
+            ]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return list(self.result)
+
+
+class FakeInvoker:
+    """Run each worker in process, as an asynchronous invocation would:
+    a failing worker records its failure but the invocation succeeds.
+    Shards in fail have their COPY fail on their first invocation."""
+
+    def __init__(self, db, fail=()):
+        self.db = db
+        self.fail = set(fail)
+        self.invoked = []
+        self.lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self.lock:
+            self.invoked.append(payload["shard"])
+            if payload["shard"] in self.fail:
+                self.fail.discard(payload["shard"])
+                self.db.fail_copies = 1
+            try:
+                run_shard(self.db.connect(), payload)
+            except ConnectionError:
+                pass
+
+
+@pytest.fixture(autouse=True)
+def empty_dimension_cache():
+    dim_cache.clear_cache()
+    yield
+    dim_cache.clear_cache()
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def event():
+    return {
+        "run_id": "test-run",
+        "num_sales": 1000,
+        "batch_size": 100,
+        "shards": 4,
+        "seed": 7,
+        "start_date": "2023-01-01",
+        "end_date": "2023-03-31",
+    }
+
+
+# plan_shards
+###############################################################################
+
+
+def test_plan_shards_covers_every_generator_shard_once():
+    payloads = plan_shards("run", 1050, (1, 10), num_shards=4, batch_size=100)
+
+    assert [p["shard"] for p in payloads] == [0, 1, 2, 3]
+    assert payloads[0]["shards"][0] == 0
+    assert payloads[-1]["shards"][1] == count_shards(1050, 100)
+    for previous, payload in zip(payloads, payloads[1:]):
+        assert payload["shards"][0] == previous["shards"][1]
+
+
+def test_plan_shards_stores_one_seed_in_every_payload():
+    payloads = plan_shards("run", 1000, (1, 10), num_shards=3, batch_size=100)
+
+    assert len({p["seed"] for p in payloads}) == 1
+    assert payloads[0]["seed"] is not None
+    assert json.loads(json.dumps(payloads)) == payloads
+
+
+def test_plan_shards_skips_empty_shards():
+    payloads = plan_shards("run", 150, (1, 10), num_shards=8, batch_size=100)
+
+    assert len(payloads) == 2
+
+
+# coordinate
+###############################################################################
+
+
+def test_coordinate_loads_every_row_once(db, event):
+    invoker = FakeInvoker(db)
+
+    summary = coordinate(db.connect(), event, invoker)
+
+    assert sorted(invoker.invoked) == [0, 1, 2, 3]
+    assert len(db.sales) == 1000
+    assert summary == {
+        "run_id": "test-run",
+        "dispatched": 4,
+        "status": {"done": 4},
+        "rows": 1000,
+    }
+
+
+def test_coordinate_creates_partitions_before_dispatching(db, event):
+    coordinate(db.connect(), event, FakeInvoker(db))
+
+    statements = db.statements
+    partitions = [i for i, s in enumerate(statements) if "PARTITION OF" in s]
+    first_shard = next(
+        i for i, s in enumerate(statements) if "FOR UPDATE" in s
+    )
+    assert partitions and partitions[-1] < first_shard
+    assert "sales_y2023m03" in statements[partitions[-1]]
+
+
+def test_coordinate_retries_failed_shards_without_duplicates(db, event):
+    expected = FakeDatabase()
+    coordinate(expected.connect(), event, FakeInvoker(expected))
+
+    first = coordinate(db.connect(), event, FakeInvoker(db, fail=[2]))
+    invoker = FakeInvoker(db)
+    second = coordinate(db.connect(), event, invoker)
+
+    assert first["status"] == {"done": 3, "failed": 1}
+    assert first["rows"] < 1000
+    assert invoker.invoked == [2]
+    assert second["status"] == {"done": 4}
+    assert sorted(db.sales) == sorted(expected.sales)
+
+
+def test_coordinate_reuses_stored_payloads(db, event):
+    coordinate(db.connect(), event, FakeInvoker(db, fail=[0]))
+    invoker = FakeInvoker(db)
+
+    coordinate(db.connect(), {**event, "num_sales": 5, "seed": 8}, invoker)
+
+    assert len(db.sales) == 1000
+    assert db.shards[("test-run", 0)]["payload"]["seed"] == 7
+
+
+def test_coordinate_stops_retrying_after_max_attempts(db, event):
+    event["max_attempts"] = 1
+    coordinate(db.connect(), event, FakeInvoker(db, fail=[1]))
+    invoker = FakeInvoker(db)
+
+    summary = coordinate(db.connect(), event, invoker)
+
+    assert invoker.invoked == []
+    assert summary["dispatched"] == 0
+    assert summary["status"] == {"done": 3, "failed": 1}
+
+
+def test_coordinate_records_failed_invocations(db, event):
+    invoke = Mock(side_effect=RuntimeError("throttled"))
+
+    summary = coordinate(db.connect(), event, invoke)
+
+    assert invoke.call_count == 4
+    assert summary["status"] == {"failed": 4}
+    assert db.shards[("test-run", 0)]["error"] == "throttled"
+
+
+def test_coordinate_requires_run_id_and_num_sales(db):
+    with pytest.raises(ValueError, match="run_id"):
+        coordinate(db.connect(), {"num_sales": 10}, Mock())
+    with pytest.raises(ValueError, match="num_sales"):
+        coordinate(db.connect(), {"run_id": "run"}, Mock())
+
+
+# run_shard
+###############################################################################
+
+
+def test_run_shard_skips_a_shard_already_loaded(db, event):
+    coordinate(db.connect(), event, FakeInvoker(db))
+    payload = db.shards[("test-run", 1)]["payload"]
+
+    result = run_shard(db.connect(), payload)
+
+    assert result == {"status": "done", "rows": 0}
+    assert len(db.sales) == 1000
+
+
+def test_run_shard_generates_dates_within_the_payload_range(db, event):
+    coordinate(db.connect(), event, FakeInvoker(db))
+
+    position = SALES_COLUMNS.index("order_date")
+    dates = [line.split("\t")[position] for line in db.sales]
+    assert min(dates) >= "2023-01-01"
+    assert max(dates) <= "2023-03-31"
+
+
+def test_run_shard_picks_existing_customers_in_the_planned_range(db, event):
+    coordinate(db.connect(), event, FakeInvoker(db))
+
+    position = SALES_COLUMNS.index("customer_id")
+    customers = {int(line.split("\t")[position]) for line in db.sales}
+    assert customers == {1, 2, 3, 5, 8, 10}
+
+
+def test_run_shard_ignores_customers_added_after_planning(db, event):
+    coordinate(db.connect(), {**event, "shards": 1}, Mock())
+    db.customers.append(11)
+    payload = db.shards[("test-run", 0)]["payload"]
+
+    run_shard(db.connect(), payload)
+
+    position = SALES_COLUMNS.index("customer_id")
+    customers = {int(line.split("\t")[position]) for line in db.sales}
+    assert 11 not in customers
+
+
+def test_run_shard_raises_for_an_unknown_shard(db):
+    payload = plan_shards("run", 100, (1, 10), batch_size=100)[0]
+
+    with pytest.raises(ValueError, match="unknown"):
+        run_shard(db.connect(), payload)
+    assert db.sales == []
+
+
+# handlers
+###############################################################################
+
+
+def test_coordinate_generation_requires_worker_function(monkeypatch):
+    for name in ["DB_USER", "DB_PASS", "DB_NAME", "DB_HOST", "DB_PORT"]:
+        monkeypatch.setenv(name, "5432")
+    monkeypatch.delenv("WORKER_FUNCTION", raising=False)
+
+    response = coordinate_generation({"run_id": "run"}, None)
+
+    assert response == {"Result": "Error"}
+
+
+def test_lambda_invoker_invokes_asynchronously():
+    client = Mock()
+    client.invoke.return_value = {"StatusCode": 202}
+
+    LambdaInvoker("generate_shard", client)({"shard": 3})
+
+    kwargs = client.invoke.call_args.kwargs
+    assert kwargs["FunctionName"] == "generate_shard"
+    assert kwargs["InvocationType"] == "Event"
+    assert json.loads(kwargs["Payload"]) == {"shard": 3}
+
+
+def test_lambda_invoker_raises_when_not_accepted():
+    client = Mock()
+    client.invoke.return_value = {"StatusCode": 500}
+
+    with pytest.raises(RuntimeError, match="500"):
+        LambdaInvoker("generate_shard", client)({"shard": 3})
+
+
+@patch("boto3.client")
+def test_lambda_invoker_creates_one_client(patched_client):
+    invoker = LambdaInvoker("generate_shard")
+
+    patched_client.assert_called_once_with("lambda", "eu-west-2")
+    assert invoker.client is patched_client.return_value
+
+
+def test_generate_shard_handler_imports_boto3_only_to_invoke():
+    code = "import sys, generator.fanout; print('boto3' in sys.modules)"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+
+    assert output.strip() == "False"
@@ -1,5 +1,203 @@
-# from src.generator.data_generator import generate_data
+from generator.data_generator import (
+    generate_data,
+    generate_customers,
+    split_seed,
+    SALES_COLUMNS,
+    CUSTOMERS_COLUMNS,
+)
+from generator.distributions import SalesSkew
+import datetime
+import numpy as np
+import pytest
 
 
-# def test_generate_data():
-#     generate_data()
+def test_generate_data_yields_requested_number_of_rows_in_batches():
+    batches = list(generate_data(25, [1, 2], [1, 2], batch_size=10))
+
+    assert [len(batch["order_date"]) for batch in batches] == [10, 10, 5]
+
+
+def test_generate_data_yields_all_sales_columns():
+    batch = next(generate_data(5, [1], [1]))
+
+    assert tuple(batch.keys()) == SALES_COLUMNS
+    assert all(len(column) == 5 for column in batch.values())
+
+
+def test_generate_data_yields_nothing_for_zero_rows():
+    assert list(generate_data(0, [1], [1])) == []
+
+
+def test_generate_data_picks_ids_from_those_given():
+    batch = next(generate_data(1000, [3, 7], [11, 13, 17]))
+
+    assert set(batch["customer_id"]) == {3, 7}
+    assert set(batch["location_id"]) == {11, 13, 17}
+
+
+def test_generate_data_keeps_values_within_bounds():
+    batch = next(
+        generate_data(
+            1000,
+            [1],
+            [1],
+            start_date=datetime.date(2023, 1, 1),
+            end_date=datetime.date(2023, 1, 31),
+            min_price=10,
+            max_price=20,
+        )
+    )
+
+    assert batch["order_date"].min() >= np.datetime64("2023-01-01")
+    assert batch["order_date"].max() <= np.datetime64("2023-01-31")
+    assert batch["price_paid"].min() >= 10
+    assert batch["price_paid"].max() <= 20
+    pence = batch["price_paid"] * 100
+    assert np.allclose(pence, np.round(pence))
+
+
+def test_generate_data_is_reproducible_with_seed():
+    first = next(generate_data(100, [1, 2, 3], [1, 2, 3], seed=42))
+    second = next(generate_data(100, [1, 2, 3], [1, 2, 3], seed=42))
+
+    for column in SALES_COLUMNS:
+        assert np.array_equal(first[column], second[column])
+
+
+def test_generate_data_gives_identical_output_for_any_worker_count():
+    def generate(workers):
+        return list(
+            generate_data(
+                250, [1, 2, 3], [4, 5], batch_size=40, seed=7, workers=workers
+            )
+        )
+
+    serial = generate(1)
+    parallel = generate(3)
+
+    assert len(serial) == len(parallel) == 7
+    for serial_batch, parallel_batch in zip(serial, parallel):
+        for column in SALES_COLUMNS:
+            assert (
+                serial_batch[column].tobytes()
+                == parallel_batch[column].tobytes()
+            )
+
+
+def test_generate_data_draws_different_shards_from_the_same_seed():
+    first, second = generate_data(20, range(1000), [1], batch_size=10, seed=1)
+
+    assert not np.array_equal(first["customer_id"], second["customer_id"])
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"num_rows": -1},
+        {"batch_size": 0},
+        {"customer_ids": []},
+        {"end_date": datetime.date(2019, 1, 1)},
+        {"max_price": 1},
+    ],
+)
+def test_generate_data_raises_value_error_on_invalid_arguments(kwargs):
+    args = {"num_rows": 10, "customer_ids": [1], "location_ids": [1]}
+    args.update(kwargs)
+
+    with pytest.raises(ValueError):
+        next(generate_data(**args))
+
+
+def test_generate_data_with_skew_favours_one_location_and_peak_month():
+    skew = SalesSkew(
+        location_exponent=1.5,
+        location_countries=["a", "b"],
+        peak_months={"a": 1, "b": 7},
+    )
+    batch = next(
+        generate_data(
+            20_000,
+            [1],
+            [5, 6],
+            seed=3,
+            start_date=datetime.date(2023, 1, 1),
+            end_date=datetime.date(2023, 12, 31),
+            skew=skew,
+        )
+    )
+
+    months = batch["order_date"].astype("datetime64[M]").astype(int) % 12
+    first = batch["location_id"] == 5
+    assert max(first.mean(), 1 - first.mean()) > 0.65
+    assert (months[first] == 0).sum() > (months[first] == 6).sum()
+    assert (months[~first] == 6).sum() > (months[~first] == 0).sum()
+    assert batch["price_paid"].min() >= 50.00
+    assert batch["price_paid"].max() <= 5000.00
+
+
+def test_generate_data_with_skew_is_reproducible_across_worker_counts():
+    options = {"seed": 5, "batch_size": 100, "skew": SalesSkew()}
+    single = list(generate_data(250, [1, 2], [3, 4], workers=1, **options))
+    multi = list(generate_data(250, [1, 2], [3, 4], workers=2, **options))
+
+    for a, b in zip(single, multi):
+        for column in SALES_COLUMNS:
+            assert np.array_equal(a[column], b[column])
+
+
+def test_generate_customers_yields_names_in_batches():
+    batches = list(generate_customers(15, batch_size=10, seed=3))
+
+    assert [len(b["customer_name"]) for b in batches] == [10, 5]
+    assert tuple(batches[0].keys()) == CUSTOMERS_COLUMNS
+    assert all(" " in name for name in batches[0]["customer_name"])
+
+
+def test_generate_customers_is_reproducible_across_worker_counts():
+    serial = next(generate_customers(30, seed=5))
+    parallel = next(generate_customers(30, seed=5, workers=2))
+
+    assert np.array_equal(serial["customer_name"], parallel["customer_name"])
+
+
+def test_generate_customers_numbers_rows_from_first_id():
+    batches = list(generate_customers(25, batch_size=10, first_id=101))
+
+    ids = np.concatenate([b["customer_id"] for b in batches])
+    assert np.array_equal(ids, np.arange(101, 126))
+    assert tuple(batches[0].keys()) == ("customer_id",) + CUSTOMERS_COLUMNS
+
+
+def test_generate_data_numbers_any_subset_of_shards_from_its_own_range():
+    options = {"batch_size": 10, "seed": 4, "first_id": 1}
+    every = list(generate_data(35, [1], [1], **options))
+    last = list(generate_data(35, [1], [1], shards=[3], **options))
+
+    assert np.array_equal(last[0]["sale_id"], np.arange(31, 36))
+    assert np.array_equal(last[0]["sale_id"], every[3]["sale_id"])
+    assert np.array_equal(
+        np.concatenate([b["sale_id"] for b in every]), np.arange(1, 36)
+    )
+
+
+def test_generate_data_ids_do_not_change_the_rows_drawn():
+    plain = next(generate_data(10, [1, 2], [1, 2], seed=6))
+    with_ids = next(generate_data(10, [1, 2], [1, 2], seed=6, first_id=1))
+
+    for column in SALES_COLUMNS:
+        assert np.array_equal(plain[column], with_ids[column])
+
+
+@pytest.mark.parametrize("kwargs", [{"num_rows": -1}, {"batch_size": 0}])
+def test_generate_customers_raises_value_error_on_invalid_arguments(kwargs):
+    args = {"num_rows": 10}
+    args.update(kwargs)
+
+    with pytest.raises(ValueError):
+        next(generate_customers(**args))
+
+
+def test_split_seed_derives_distinct_reproducible_seeds():
+    assert split_seed(None) == (None, None)
+    assert split_seed(1) == split_seed(1)
+    assert len(set(split_seed(1, 3))) == 3
@@ -0,0 +1,296 @@
+from generator.incremental import add_sales, append_batch, read_high_water_mark
+from utils.connections import clear_cache
+from utils import dim_cache
+from unittest.mock import patch, Mock
+import datetime
+import logging
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def empty_connection_cache():
+    clear_cache()
+    dim_cache.clear_cache()
+    yield
+    clear_cache()
+    dim_cache.clear_cache()
+
+
+@pytest.fixture
+def dummy_env_vars(monkeypatch):
+    monkeypatch.setenv("DB_USER", "usr")
+    monkeypatch.setenv("DB_PASS", "pass")
+    monkeypatch.setenv("DB_NAME", "name")
+    monkeypatch.setenv("DB_HOST", "host")
+    monkeypatch.setenv("DB_PORT", "5432")
+
+
+@pytest.fixture
+def mocked_logger():
+    with patch("generator.incremental.custom_logger") as logger:
+        logger.return_value = logging.getLogger("test_logger")
+        yield logger
+
+
+CUSTOMER_IDS = (1, 2, 3, 5, 8, 12)
+MARK = datetime.date(2023, 6, 30)
+
+
+@pytest.fixture
+def mock_conn():
+    """Return a mock connection holding a high-water mark of 2023-06-30,
+    customers up to id 12 with gaps left by rolled back loads, and two
+    locations. Streamed COPY data is collected in cursor.sent.
+
+    Yields:
+        Mock: dummy connection
+    """
+    conn = Mock()
+    cursor = Mock()
+    cursor.sent = []
+    results = {
+        "FROM generator_state": (MARK,),
+        "count(*), coalesce(max(customer_id)": (len(CUSTOMER_IDS), 12),
+        "FROM locations": (2, 2),
+    }
+    cursor.fetchone.side_effect = lambda: next(
+        row for query, row in results.items() if query in cursor.statement
+    )
+    cursor.rows = {
+        "GROUP BY": [(0, len(CUSTOMER_IDS))],
+        "FROM customers": [(i,) for i in CUSTOMER_IDS],
+        "FROM locations": [(1,), (2,)],
+    }
+    cursor.fetchall.side_effect = lambda: next(
+        rows
+        for query, rows in cursor.rows.items()
+        if query in cursor.statement
+    )
+
+    def execute(statement, args=None, stream=None):
+        cursor.statement = statement
+        if stream is not None:
+            cursor.sent.append((statement, b"".join(stream).decode()))
+
+    cursor.execute.side_effect = execute
+    conn.cursor.return_value = cursor
+    yield conn
+
+
+def executed(conn):
+    return [c.args[0] for c in conn.cursor().execute.mock_calls]
+
+
+# add_sales
+###############################################################################
+
+
+@patch("generator.incremental.append_batch")
+@patch("utils.connections.connect")
+def test_add_sales_connects_to_oltp_db_and_appends_batch(
+    patched_connect, patched_append_batch, dummy_env_vars
+):
+    patched_append_batch.return_value = {"sales": 5}
+
+    response = add_sales({"num_sales": 5, "new_customers": 0, "days": 2}, None)
+
+    assert patched_connect.call_args.kwargs["database"] == "etlhols_oltp"
+    assert patched_append_batch.call_args.args[2:] == (5, 0, 2)
+    assert response == {"Result": "Success", "sales": 5}
+
+
+def test_add_sales_logs_error_when_no_env_variables(mocked_logger, caplog):
+    response = add_sales({}, None)
+
+    assert caplog.records[-1].levelname == "ERROR"
+    assert response == {"Result": "Error"}
+
+
+@patch("generator.incremental.append_batch")
+@patch("utils.connections.connect")
+def test_add_sales_discards_connection_on_error(
+    patched_connect, patched_append_batch, dummy_env_vars, mocked_logger
+):
+    patched_append_batch.side_effect = Exception("An error")
+
+    response = add_sales({}, None)
+
+    assert response == {"Result": "Error"}
+    patched_connect.return_value.close.assert_called_once()
+
+
+# append_batch
+###############################################################################
+
+
+def sales_rows(conn):
+    statement, data = conn.cursor().sent[-1]
+    assert statement.startswith("COPY sales")
+    return [line.split("\t") for line in data.splitlines()]
+
+
+def test_append_batch_adds_sales_after_high_water_mark(mock_conn):
+    response = append_batch(
+        mock_conn,
+        np.random.default_rng(1),
+        50,
+        2,
+        5,
+        today=datetime.date(2023, 7, 3),
+    )
+
+    rows = sales_rows(mock_conn)
+    dates = {row[0] for row in rows}
+
+    assert dates <= {"2023-07-01", "2023-07-02", "2023-07-03"}
+    assert response == {
+        "customers": 2,
+        "sales": 50,
+        "last_order_date": "2023-07-03",
+    }
+
+
+def test_append_batch_dates_sales_up_to_today_only(mock_conn):
+    today = datetime.date(2024, 2, 10)
+
+    response = append_batch(
+        mock_conn, np.random.default_rng(1), 50, 0, 1, today=today
+    )
+
+    assert {row[0] for row in sales_rows(mock_conn)} == {"2024-02-10"}
+    assert response["last_order_date"] == "2024-02-10"
+
+
+def test_append_batch_keeps_high_water_mark_already_past_today(mock_conn):
+    today = datetime.date(2023, 6, 1)
+
+    response = append_batch(
+        mock_conn, np.random.default_rng(1), 5, 0, 1, today=today
+    )
+
+    assert response["last_order_date"] == "2023-06-30"
+
+
+def test_append_batch_picks_only_existing_customers(mock_conn):
+    append_batch(mock_conn, np.random.default_rng(1), 200, 0, 1, today=MARK)
+
+    customers = {int(row[2]) for row in sales_rows(mock_conn)}
+    assert customers <= set(CUSTOMER_IDS)
+
+
+def test_append_batch_adds_no_sales_without_customers(mock_conn):
+    mock_conn.cursor().rows["GROUP BY"] = []
+
+    response = append_batch(
+        mock_conn, np.random.default_rng(1), 5, 0, 1, today=MARK
+    )
+
+    assert response["sales"] == 0
+    assert mock_conn.cursor().sent == []
+    assert executed(mock_conn)[-1] == "COMMIT;"
+
+
+def test_append_batch_forgets_cached_customers_on_rollback(mock_conn):
+    append_batch(mock_conn, np.random.default_rng(1), 5, 2, 1, today=MARK)
+
+    with patch(
+        "generator.incremental.copy_batches", side_effect=Exception("lost")
+    ), pytest.raises(Exception):
+        append_batch(mock_conn, np.random.default_rng(1), 5, 2, 1)
+
+    assert "customers" not in dim_cache._key_blocks
+
+
+def test_append_batch_creates_partitions_before_copying_sales(mock_conn):
+    append_batch(
+        mock_conn,
+        np.random.default_rng(1),
+        50,
+        0,
+        3,
+        today=datetime.date(2023, 7, 3),
+    )
+
+    statements = executed(mock_conn)
+    partitions = [s for s in statements if "PARTITION OF sales" in s]
+    assert len(partitions) == 1
+    assert "sales_y2023m07" in partitions[0]
+    assert statements.index(partitions[0]) < statements.index(
+        next(s for s in statements if s.startswith("COPY sales"))
+    )
+
+
+def test_append_batch_adds_new_customers(mock_conn):
+    append_batch(mock_conn, np.random.default_rng(1), 0, 2, 1)
+
+    statement, data = mock_conn.cursor().sent[0]
+    assert statement == "COPY customers (customer_name) FROM STDIN;"
+    assert len(data.splitlines()) == 2
+
+
+def test_append_batch_advances_high_water_mark_in_one_transaction(mock_conn):
+    append_batch(
+        mock_conn,
+        np.random.default_rng(1),
+        5,
+        2,
+        1,
+        today=datetime.date(2023, 7, 1),
+    )
+
+    statements = executed(mock_conn)
+    update = mock_conn.cursor().execute.mock_calls[-2]
+    assert statements[0] == "BEGIN;"
+    assert statements[-1] == "COMMIT;"
+    assert update.args[1] == (datetime.date(2023, 7, 1),)
+
+
+def test_append_batch_never_scans_sales_once_mark_is_stored(mock_conn):
+    append_batch(mock_conn, np.random.default_rng(1), 5, 0, 1)
+
+    assert not any("FROM sales" in s for s in executed(mock_conn))
+
+
+def test_append_batch_reads_locations_once_per_container(mock_conn):
+    append_batch(mock_conn, np.random.default_rng(1), 5, 0, 1)
+    append_batch(mock_conn, np.random.default_rng(2), 5, 0, 1)
+
+    statements = executed(mock_conn)
+    assert sum("location_id FROM locations" in s for s in statements) == 1
+
+
+def test_append_batch_rolls_back_on_error(mock_conn):
+    mock_conn.cursor().fetchall.side_effect = Exception("An error")
+
+    with pytest.raises(Exception):
+        append_batch(mock_conn, np.random.default_rng(1), 5, 0, 1)
+
+    assert executed(mock_conn)[-1] == "ROLLBACK;"
+
+
+# read_high_water_mark
+###############################################################################
+
+
+def test_read_high_water_mark_bootstraps_from_loaded_data_once(mock_conn):
+    mock_conn.cursor().fetchone.side_effect = [
+        None,
+        (datetime.date(2023, 1, 5),),
+    ]
+
+    mark = read_high_water_mark(mock_conn)
+
+    insert = mock_conn.cursor().execute.mock_calls[-1]
+    assert mark == datetime.date(2023, 1, 5)
+    assert insert.args[0].startswith("INSERT INTO generator_state")
+    assert insert.args[1] == (datetime.date(2023, 1, 5),)
+
+
+def test_read_high_water_mark_starts_from_yesterday_without_sales(mock_conn):
+    mock_conn.cursor().fetchone.side_effect = [None, (None,)]
+
+    last_order_date = read_high_water_mark(mock_conn)
+
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    assert last_order_date == yesterday
@@ -1,10 +1,23 @@
-from generator.initialisation import init_db, create_db, create_schema
-from generator.oltp_schema import db_schema_str, seed_values_str
+from generator.initialisation import (
+    init_db,
+    create_db,
+    create_schema,
+)
+from utils.connections import clear_cache
 from moto import mock_secretsmanager
 from unittest.mock import patch, Mock, call
 import boto3
+import json
+import os
 import pytest
 import logging
+import subprocess
+import sys
+
+
+# init_db runs with a 5 second timeout, so a cold start should spend little
+# of it importing. Measured at around 15ms without boto3, pg8000 or NumPy.
+HANDLER_IMPORT_BUDGET_SECONDS = 0.1
 
 
 @pytest.fixture
@@ -16,6 +29,13 @@ def dummy_env_vars(monkeypatch):
     monkeypatch.setenv("DB_PORT", "5432")
 
 
+@pytest.fixture(autouse=True)
+def empty_connection_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
 @pytest.fixture
 def mocked_secretsmanager():
     with mock_secretsmanager():
@@ -103,7 +123,7 @@ def test_init_db_logs_error_on_exception(
 ###############################################################################
 
 
-@patch("generator.initialisation.connect")
+@patch("utils.connections.connect")
 def test_create_db_connects_using_admin_credentials_from_secretsmanager(
     patched_connect, mocked_secretsmanager, dummy_env_vars
 ):
@@ -119,7 +139,7 @@ def test_create_db_connects_using_admin_credentials_from_secretsmanager(
     )
 
 
-@patch("generator.initialisation.connect")
+@patch("utils.connections.connect")
 def test_create_db_creates_db_user_and_if_they_dont_exists(
     patched_connect, mocked_secretsmanager, dummy_env_vars
 ):
@@ -144,8 +164,10 @@ def test_create_db_creates_db_user_and_if_they_dont_exists(
     mock_cursor.execute.assert_has_calls(expected_calls)
 
 
-@patch("generator.initialisation.boto3.client")
-def test_create_db_logs_error_on_exception(patched_sm, mocked_logger, caplog):
+@patch("boto3.client")
+def test_create_db_logs_error_on_exception(
+    patched_sm, dummy_env_vars, mocked_logger, caplog
+):
     patched_sm.side_effect = Exception("An error")
     create_db(None, None, None)
 
@@ -153,11 +175,29 @@ def test_create_db_logs_error_on_exception(patched_sm, mocked_logger, caplog):
     assert caplog.records[-1].message == "An error"
 
 
+@patch("utils.connections.connect")
+def test_create_db_reuses_secrets_and_connection_when_warm(
+    patched_connect, mocked_secretsmanager, dummy_env_vars
+):
+    mock_conn = Mock()
+    mock_conn.cursor.return_value.fetchone.return_value = (1,)
+    patched_connect.return_value = mock_conn
+
+    with patch("boto3.client") as patched_client:
+        patched_client.return_value = mocked_secretsmanager
+        create_db("user123", "pass123", "name123")
+        create_db("user123", "pass123", "name123")
+
+    patched_client.assert_called_once()
+    patched_connect.assert_called_once()
+    mock_conn.close.assert_not_called()
+
+
 # create_schema
 ###############################################################################
 
 
-@patch("generator.initialisation.connect")
+@patch("utils.connections.connect")
 def test_create_schema_connects_using_credentials_from_args(
     patched_connect, dummy_env_vars
 ):
@@ -177,48 +217,41 @@ def test_create_schema_connects_using_credentials_from_args(
     )
 
 
-@patch("generator.initialisation.connect")
-def test_create_schema_executes_schema_creation_and_seed_queries(
-    patched_connect, dummy_env_vars
+@pytest.mark.parametrize(
+    "applied, expected",
+    [([1, 2], "Created"), ([2], "Migrated"), ([], "Already exists")],
+)
+@patch("generator.initialisation.run_migrations")
+@patch("utils.connections.connect")
+def test_create_schema_runs_migrations_and_reports_outcome(
+    patched_connect, patched_run_migrations, applied, expected, dummy_env_vars
 ):
-    mock_conn = Mock()
-    patched_connect.return_value = mock_conn
-    mock_cursor = Mock()
-    mock_cursor.fetchall.return_value = []
-    mock_conn.cursor.return_value = mock_cursor
-
-    db_usr = "user123"
-    db_pass = "pass123"
-    db_name = "name123"
-
-    create_schema(db_usr, db_pass, db_name)
+    patched_run_migrations.return_value = applied
 
-    expected_calls = [call(db_schema_str), call(seed_values_str)]
+    response = create_schema("user123", "pass123", "name123")
 
-    mock_cursor.execute.assert_has_calls(expected_calls)
+    patched_run_migrations.assert_called_once_with(
+        patched_connect.return_value, large=False
+    )
+    assert response == expected
 
 
-@patch("generator.initialisation.connect")
-def test_create_schema_does_nothing_if_db_exists(
+@patch("utils.connections.connect")
+def test_create_schema_leaves_sales_indexes_to_the_schema_command(
     patched_connect, dummy_env_vars
 ):
-    mock_conn = Mock()
-    patched_connect.return_value = mock_conn
-    mock_cursor = Mock()
-    mock_cursor.fetchall.return_value = ["customers", "locations"]
-    mock_conn.cursor.return_value = mock_cursor
-
-    db_usr = "user123"
-    db_pass = "pass123"
-    db_name = "name123"
+    cursor = patched_connect.return_value.cursor.return_value
+    cursor.fetchall.return_value = [(1,)]
 
-    create_schema(db_usr, db_pass, db_name)
+    response = create_schema("user123", "pass123", "name123")
 
-    assert call(db_schema_str) not in mock_cursor.execute.mock_calls
-    assert call(seed_values_str) not in mock_cursor.execute.mock_calls
+    statements = [c.args[0] for c in cursor.execute.mock_calls]
+    assert not any("CREATE INDEX" in s for s in statements)
+    assert "BEGIN;" not in statements
+    assert response == "Already exists"
 
 
-@patch("generator.initialisation.connect")
+@patch("utils.connections.connect")
 def test_create_schema_logs_error_on_exception(
     patched_connect, dummy_env_vars, mocked_logger, caplog
 ):
@@ -227,3 +260,42 @@ def test_create_schema_logs_error_on_exception(
 
     assert caplog.records[-1].levelname == "ERROR"
     assert caplog.records[-1].message == "An error"
+
+
+# cold start
+###############################################################################
+
+
+def import_in_new_interpreter(statement):
+    """Run statement in a fresh interpreter, returning the seconds it took
+    and the modules then imported."""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "seconds = time.perf_counter() - start\n"
+        "print(json.dumps([seconds, sorted(sys.modules)]))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def test_init_db_handler_imports_within_budget():
+    seconds = min(
+        import_in_new_interpreter("import generator.initialisation")[0]
+        for _ in range(3)
+    )
+
+    assert seconds < HANDLER_IMPORT_BUDGET_SECONDS
+
+
+def test_init_db_handler_defers_heavy_imports_until_used():
+    _, modules = import_in_new_interpreter("import generator.initialisation")
+
+    assert {"boto3", "pg8000", "numpy"}.isdisjoint(modules)
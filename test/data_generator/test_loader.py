@@ -0,0 +1,464 @@
+from generator.loader import (
+    copy_rows,
+    copy_batches,
+    iter_copy_chunks,
+    format_batch,
+    format_copy_value,
+    load_seed,
+    resolve_references,
+    parallel_load,
+    sales_partitions,
+    customer_partitions,
+    deferred_constraints,
+    ensure_partitions,
+    read_peak_months,
+    reserve_ids,
+    advance_sequence,
+)
+from generator.data_generator import generate_data, SALES_COLUMNS
+from generator.oltp_schema import sales
+from generator.schema import Column, ForeignKey, Index, Seed, Table
+from utils import dim_cache
+from unittest.mock import Mock
+import datetime
+import threading
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def empty_dimension_cache():
+    dim_cache.clear_cache()
+    yield
+    dim_cache.clear_cache()
+
+
+@pytest.fixture
+def mock_conn():
+    """Return a mock connection whose cursor consumes the COPY stream, so
+    that the chunks sent can be inspected through cursor.sent.
+
+    Yields:
+        Mock: dummy connection
+    """
+    conn = Mock()
+    cursor = Mock()
+    cursor.sent = []
+    cursor.rowcount = 3
+
+    def execute(statement, args=None, stream=None):
+        if stream is not None:
+            cursor.sent.extend(chunk.decode() for chunk in stream)
+
+    cursor.execute.side_effect = execute
+    conn.cursor.return_value = cursor
+    yield conn
+
+
+# copy_rows
+###############################################################################
+
+
+def test_copy_rows_runs_copy_from_stdin_for_columns(mock_conn):
+    copy_rows(mock_conn, "countries", ["country_name"], [("Peru",)])
+
+    statement = mock_conn.cursor().execute.call_args.args[0]
+    assert statement == "COPY countries (country_name) FROM STDIN;"
+
+
+def test_copy_rows_streams_rows_in_chunks(mock_conn):
+    rows = [(1, "a"), (2, "b"), (3, "c")]
+
+    copy_rows(mock_conn, "t", ["x", "y"], rows, chunk_size=2)
+
+    assert mock_conn.cursor().sent == ["1\ta\n2\tb\n", "3\tc\n"]
+
+
+def test_copy_rows_returns_rowcount(mock_conn):
+    assert copy_rows(mock_conn, "t", ["x"], [(1,), (2,), (3,)]) == 3
+
+
+def test_copy_rows_pulls_rows_lazily(mock_conn):
+    pulled = []
+
+    def rows():
+        for i in range(4):
+            pulled.append(i)
+            yield (i,)
+
+    chunks = iter_copy_chunks(rows(), chunk_size=2)
+    next(chunks)
+
+    assert pulled == [0, 1]
+
+
+def test_iter_copy_chunks_raises_value_error_on_invalid_chunk_size():
+    with pytest.raises(ValueError):
+        next(iter_copy_chunks([(1,)], chunk_size=0))
+
+
+# copy_batches
+###############################################################################
+
+
+def test_copy_batches_sends_one_chunk_per_batch(mock_conn):
+    batches = [
+        {"x": np.array([1, 2]), "y": np.array([1.5, 2.25])},
+        {"x": np.array([3]), "y": np.array([3.0])},
+    ]
+
+    copy_batches(mock_conn, "t", batches)
+
+    assert mock_conn.cursor().sent == ["1\t1.5\n2\t2.25\n", "3\t3.0\n"]
+
+
+def test_copy_batches_uses_given_columns(mock_conn):
+    batches = [{"x": np.array([1]), "y": np.array([2])}]
+
+    copy_batches(mock_conn, "t", batches, columns=["y"])
+
+    statement = mock_conn.cursor().execute.call_args.args[0]
+    assert statement == "COPY t (y) FROM STDIN;"
+    assert mock_conn.cursor().sent == ["2\n"]
+
+
+def test_copy_batches_stops_pipeline_when_copy_fails(mock_conn):
+    def execute(statement, stream=None):
+        next(stream)
+        raise Exception("connection lost")
+
+    mock_conn.cursor().execute.side_effect = execute
+    batches = ({"x": np.arange(3)} for _ in range(100))
+    before = threading.active_count()
+
+    with pytest.raises(Exception, match="connection lost"):
+        copy_batches(mock_conn, "t", batches)
+
+    assert threading.active_count() == before
+
+
+def test_copy_batches_does_nothing_without_batches(mock_conn):
+    assert copy_batches(mock_conn, "t", []) == 0
+    mock_conn.cursor().execute.assert_not_called()
+
+
+# load_seed
+###############################################################################
+
+
+COUNTRIES = Table(
+    "countries",
+    (
+        Column("country_id", "SERIAL", primary_key=True),
+        Column("country_name", "VARCHAR(64)"),
+    ),
+    seed=Seed(("country_name",), (("Peru",), ("Chile",))),
+)
+
+LOCATIONS = Table(
+    "locations",
+    (
+        Column("location_id", "SERIAL", primary_key=True),
+        Column("location_name", "VARCHAR(64)"),
+        Column("country_id", "INT"),
+    ),
+    foreign_keys=(
+        ForeignKey(
+            "country_id", "countries", "country_id", natural_key="country_name"
+        ),
+    ),
+    seed=Seed(
+        ("location_name", "country_id"),
+        (("Monasterio", "Peru"), ("W Santiago", "Chile")),
+    ),
+)
+
+
+def test_load_seed_loads_parents_first_and_resolves_keys_once(mock_conn):
+    mock_conn.cursor().fetchall.return_value = [("Peru", 1), ("Chile", 2)]
+
+    load_seed(mock_conn, (LOCATIONS, COUNTRIES))
+
+    statements = [c.args[0] for c in mock_conn.cursor().execute.mock_calls]
+    assert statements == [
+        "COPY countries (country_name) FROM STDIN;",
+        "SELECT country_name, country_id FROM countries;",
+        "COPY locations (location_name, country_id) FROM STDIN;",
+    ]
+    assert mock_conn.cursor().sent == [
+        "Peru\nChile\n",
+        "Monasterio\t1\nW Santiago\t2\n",
+    ]
+
+
+def test_load_seed_returns_row_counts_and_skips_unseeded(mock_conn):
+    unseeded = Table("customers", (Column("customer_id", "SERIAL"),))
+
+    assert load_seed(mock_conn, (COUNTRIES, unseeded)) == {"countries": 3}
+
+
+def test_resolve_references_loads_unknown_keys_as_null():
+    rows = resolve_references(
+        ("location_name", "country_id"),
+        [("Hotel", "Country")],
+        {"country_id": {"Peru": 1}},
+    )
+
+    assert list(rows) == [("Hotel", None)]
+
+
+# parallel_load
+###############################################################################
+
+
+def connect_mock():
+    conn = Mock()
+    conn.cursor.return_value.rowcount = 1
+    return conn
+
+
+def make_partition(name, rows=1, error=None):
+    def batches():
+        if error:
+            raise error
+        return [{"x": np.arange(rows)}]
+
+    return {"name": name, "table": "t", "columns": ["x"], "batches": batches}
+
+
+def test_parallel_load_loads_every_partition_on_its_own_connections():
+    connections = []
+
+    def connect_fn():
+        conn = Mock()
+        conn.cursor.return_value.rowcount = 2
+        connections.append(conn)
+        return conn
+
+    partitions = [make_partition(f"p{i}", rows=2) for i in range(10)]
+
+    result = parallel_load(connect_fn, partitions, workers=3)
+
+    assert result == {
+        "loaded": {f"p{i}": 2 for i in range(10)},
+        "failed": {},
+    }
+    assert 1 <= len(connections) <= 3
+    assert all(conn.autocommit for conn in connections)
+    assert all(conn.close.called for conn in connections)
+
+
+def test_parallel_load_reports_failed_partitions_and_carries_on():
+    partitions = [
+        make_partition("good"),
+        make_partition("bad", error=Exception("copy failed")),
+        make_partition("also good"),
+    ]
+
+    result = parallel_load(connect_mock, partitions, workers=1)
+
+    assert set(result["loaded"]) == {"good", "also good"}
+    assert result["failed"] == {"bad": "copy failed"}
+
+
+def test_parallel_load_reports_partitions_failed_by_connection_errors():
+    connect_fn = Mock(side_effect=Exception("connection refused"))
+    partitions = [make_partition(f"p{i}") for i in range(5)]
+
+    result = parallel_load(connect_fn, partitions, workers=2)
+
+    assert result["loaded"] == {}
+    assert result["failed"] == {
+        f"p{i}": "connection refused" for i in range(5)
+    }
+
+
+def test_sales_partitions_together_match_generate_data():
+    options = {"customer_ids": [1, 2, 3], "location_ids": [4, 5]}
+    expected = list(generate_data(95, batch_size=10, seed=9, **options))
+
+    partitions = list(
+        sales_partitions(95, 4, batch_size=10, seed=9, **options)
+    )
+    batches = [b for p in partitions for b in p["batches"]()]
+
+    assert len(partitions) == 4
+    assert all(p["columns"] == SALES_COLUMNS for p in partitions)
+    assert len(batches) == len(expected)
+    for batch, expected_batch in zip(batches, expected):
+        for column in SALES_COLUMNS:
+            assert np.array_equal(batch[column], expected_batch[column])
+
+
+def test_ensure_partitions_creates_partitions_for_date_range(mock_conn):
+    ensure_partitions(
+        mock_conn,
+        sales,
+        datetime.date(2023, 1, 20),
+        datetime.date(2023, 2, 10),
+    )
+
+    statement = mock_conn.cursor().execute.call_args.args[0]
+    assert "sales_y2023m01 PARTITION OF sales" in statement
+    assert "sales_y2023m02 PARTITION OF sales" in statement
+    assert "sales_y2023m03" not in statement
+
+
+def test_ensure_partitions_does_nothing_for_unpartitioned_table(mock_conn):
+    ensure_partitions(
+        mock_conn, PARENT, datetime.date(2023, 1, 1), datetime.date(2023, 2, 1)
+    )
+
+    mock_conn.cursor().execute.assert_not_called()
+
+
+def test_sales_partitions_skips_empty_partitions():
+    partitions = list(sales_partitions(10, 4, [1], [1], batch_size=5))
+
+    assert [p["name"] for p in partitions] == ["sales[0:1]", "sales[1:2]"]
+
+
+def test_sales_partitions_with_first_id_load_disjoint_sale_ids():
+    partitions = list(
+        sales_partitions(95, 3, [1], [1], batch_size=10, first_id=500)
+    )
+    ids = [
+        b["sale_id"] for p in reversed(partitions) for b in p["batches"]()
+    ]
+
+    columns = ("sale_id",) + SALES_COLUMNS
+    assert all(p["columns"] == columns for p in partitions)
+    assert np.array_equal(np.sort(np.concatenate(ids)), np.arange(500, 595))
+
+
+def test_customer_partitions_number_customers_from_first_id():
+    partitions = list(customer_partitions(25, 2, 11, batch_size=10, seed=1))
+    batches = [b for p in partitions for b in p["batches"]()]
+
+    assert [p["name"] for p in partitions] == [
+        "customers[0:1]",
+        "customers[1:3]",
+    ]
+    assert partitions[0]["columns"][0] == "customer_id"
+    assert np.array_equal(
+        np.concatenate([b["customer_id"] for b in batches]), np.arange(11, 36)
+    )
+
+
+def test_reserve_ids_moves_sequence_past_block_before_loading(mock_conn):
+    mock_conn.cursor().fetchone.return_value = (42,)
+
+    assert reserve_ids(mock_conn, PARENT, 10) == 42
+
+    calls = mock_conn.cursor().execute.mock_calls
+    statements = [c.args[0] for c in calls]
+    assert statements[0] == "BEGIN;"
+    assert statements[1] == "LOCK TABLE parent IN SHARE ROW EXCLUSIVE MODE;"
+    assert "setval(pg_get_serial_sequence('parent', 'parent_id')" in (
+        statements[2]
+    )
+    assert "coalesce(max(parent_id), 0) + 1 FROM parent" in statements[2]
+    assert calls[2].args[1] == (10, 10)
+    assert statements[-1] == "COMMIT;"
+
+
+def test_read_peak_months_keys_country_seasons_by_id(mock_conn):
+    cursor = mock_conn.cursor()
+    cursor.fetchone.return_value = (2, 2)
+    cursor.fetchall.return_value = [(1, "Chile"), (2, "France")]
+
+    assert read_peak_months(mock_conn) == {1: 1}
+
+
+def test_reserve_ids_rolls_back_on_error(mock_conn):
+    mock_conn.cursor().fetchone.side_effect = Exception("An error")
+
+    with pytest.raises(Exception):
+        reserve_ids(mock_conn, PARENT, 10)
+
+    assert mock_conn.cursor().execute.mock_calls[-1].args[0] == "ROLLBACK;"
+
+
+def test_advance_sequence_sets_sequence_to_loaded_maximum(mock_conn):
+    advance_sequence(mock_conn, PARENT)
+
+    statement = mock_conn.cursor().execute.call_args.args[0]
+    assert "setval(pg_get_serial_sequence('parent', 'parent_id')" in statement
+    assert "coalesce(max(parent_id), 1)" in statement
+
+
+# deferred_constraints
+###############################################################################
+
+
+CHILD = Table(
+    "child",
+    (Column("parent_id", "INT"),),
+    foreign_keys=(ForeignKey("parent_id", "parent", "parent_id"),),
+    indexes=(Index("child_parent_id_idx", ("parent_id",)),),
+)
+PARENT = Table("parent", (Column("parent_id", "SERIAL", primary_key=True),))
+
+
+def test_deferred_constraints_drops_then_rebuilds_around_load(mock_conn):
+    cursor = mock_conn.cursor()
+
+    with deferred_constraints(mock_conn, (PARENT, CHILD)):
+        cursor.execute("COPY child (parent_id) FROM STDIN;")
+
+    statements = [c.args[0] for c in cursor.execute.mock_calls]
+    assert statements[0].startswith("ALTER TABLE child DROP CONSTRAINT")
+    assert statements[1] == "COPY child (parent_id) FROM STDIN;"
+    assert statements[2].startswith("CREATE INDEX IF NOT EXISTS child_")
+    assert "ADD CONSTRAINT child_parent_id_fkey" in statements[2]
+    assert statements[3] == "ANALYZE parent, child;"
+
+
+def test_deferred_constraints_rebuilds_and_reraises_on_failure(mock_conn):
+    cursor = mock_conn.cursor()
+
+    with pytest.raises(ValueError):
+        with deferred_constraints(mock_conn, (PARENT, CHILD)):
+            raise ValueError("load failed")
+
+    assert cursor.execute.mock_calls[-1].args[0] == "ANALYZE parent, child;"
+
+
+def test_deferred_constraints_raises_load_error_if_rebuild_fails(mock_conn):
+    cursor = mock_conn.cursor()
+    cursor.execute.side_effect = [None, Exception("invalid foreign key")]
+
+    with pytest.raises(ValueError):
+        with deferred_constraints(mock_conn, (PARENT, CHILD)):
+            raise ValueError("load failed")
+
+
+# formatting
+###############################################################################
+
+
+def test_format_batch_formats_dates_and_escapes_text():
+    batch = {
+        "d": np.array(["2023-01-02"], dtype="datetime64[D]"),
+        "s": np.array(["a\tb"], dtype=object),
+    }
+
+    assert format_batch(batch, ["d", "s"]) == "2023-01-02\ta\\tb\n"
+
+
+def test_format_batch_returns_empty_string_for_empty_batch():
+    assert format_batch({"x": np.array([])}, ["x"]) == ""
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, "\\N"),
+        (12, "12"),
+        ("Gibb's Farm", "Gibb's Farm"),
+        ("back\\slash", "back\\\\slash"),
+        ("line\nbreak\r", "line\\nbreak\\r"),
+    ],
+)
+def test_format_copy_value_escapes_copy_special_characters(value, expected):
+    assert format_copy_value(value) == expected
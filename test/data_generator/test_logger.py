@@ -1,5 +1,27 @@
-from logging import Logger
-from utils.logger import custom_logger
+from logging import Logger, Handler
+from utils.logger import custom_logger, timed_stage, JsonFormatter
+import json
+import pytest
+
+
+@pytest.fixture
+def log_lines():
+    """Collect the JSON documents logged while a test runs.
+
+    Yields:
+        list: one dict per line logged
+    """
+    lines = []
+
+    class Collector(Handler):
+        def emit(self, record):
+            lines.append(json.loads(self.format(record)))
+
+    handler = Collector()
+    handler.setFormatter(JsonFormatter())
+    custom_logger().addHandler(handler)
+    yield lines
+    custom_logger().removeHandler(handler)
 
 
 def test_custom_logger_returns_logger():
@@ -8,10 +30,77 @@ def test_custom_logger_returns_logger():
     assert isinstance(logger, Logger)
 
 
-def test_custom_logger_has_correct_formatter_setup():
+def test_custom_logger_is_configured_once():
     logger = custom_logger()
 
-    assert (
-        logger.handlers[0].formatter._fmt
-        == "[%(levelname)s] :: %(module)s/%(funcName)s :: %(message)s"
+    assert custom_logger() is logger
+    assert [
+        type(handler.formatter)
+        for handler in logger.handlers
+        if not type(handler).__module__.startswith("_pytest")
+    ] == [JsonFormatter]
+
+
+def test_custom_logger_writes_json_lines_with_extra_fields(log_lines):
+    custom_logger().info("hello", extra={"fields": {"table": "sales"}})
+
+    assert log_lines[0]["level"] == "INFO"
+    assert log_lines[0]["message"] == "hello"
+    assert log_lines[0]["table"] == "sales"
+    assert log_lines[0]["location"] == (
+        "test_logger/test_custom_logger_writes_json_lines_with_extra_fields"
     )
+
+
+def test_timed_stage_logs_duration_rows_and_bytes(log_lines):
+    with timed_stage("copy", table="sales", emf=False) as stage:
+        stage.rows = 10
+        stage.bytes = 200
+
+    line = log_lines[0]
+    assert line["message"] == "copy finished"
+    assert line["stage"] == "copy"
+    assert line["table"] == "sales"
+    assert (line["rows"], line["bytes"]) == (10, 200)
+    assert line["duration_ms"] >= 0
+    assert "rows_per_second" in line
+    assert "_aws" not in line
+
+
+def test_timed_stage_logs_failure_and_reraises(log_lines):
+    with pytest.raises(ValueError):
+        with timed_stage("connect", emf=False):
+            raise ValueError("refused")
+
+    assert log_lines[0]["level"] == "ERROR"
+    assert log_lines[0]["message"] == "connect failed"
+    assert log_lines[0]["error"] == "refused"
+
+
+def test_timed_stage_times_decorated_functions(log_lines):
+    @timed_stage("ddl", emf=False)
+    def create():
+        return "created"
+
+    assert create() == "created"
+    assert create() == "created"
+    assert [line["stage"] for line in log_lines] == ["ddl", "ddl"]
+    assert log_lines[0]["function"].endswith("create")
+
+
+def test_timed_stage_emits_embedded_metric_format(log_lines, monkeypatch):
+    monkeypatch.setenv("LOG_METRICS_EMF", "true")
+
+    with timed_stage("seed") as stage:
+        stage.rows = 5
+
+    metadata = log_lines[0]["_aws"]["CloudWatchMetrics"][0]
+    assert isinstance(log_lines[0]["_aws"]["Timestamp"], int)
+    assert metadata["Namespace"] == "etl-holidays"
+    assert metadata["Dimensions"] == [["stage"]]
+    assert {m["Name"] for m in metadata["Metrics"]} == {
+        "duration_ms",
+        "rows",
+        "rows_per_second",
+    }
+    assert log_lines[0]["stage"] == "seed"
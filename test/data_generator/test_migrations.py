@@ -0,0 +1,209 @@
+from generator.migrations import (
+    run_migrations,
+    create_initial_schema,
+    partition_sales,
+    Migration,
+    MIGRATIONS,
+    MIGRATIONS_LOCK_ID,
+)
+from generator.oltp_schema import db_schema_str, tables
+from unittest.mock import patch, Mock, call
+import datetime
+import pytest
+
+
+@pytest.fixture
+def migrations():
+    yield (
+        Migration(1, "first", "CREATE TABLE a ();"),
+        Migration(2, "second", "CREATE TABLE b ();"),
+        Migration(3, "third", Mock()),
+    )
+
+
+@pytest.fixture
+def mock_conn():
+    """Return a mock connection on which version 1 has been applied.
+
+    Yields:
+        Mock: dummy connection
+    """
+    conn = Mock()
+    conn.cursor.return_value.fetchall.return_value = [(1,)]
+    yield conn
+
+
+def executed(conn):
+    return [c.args[0] for c in conn.cursor().execute.mock_calls]
+
+
+def test_run_migrations_applies_only_pending_migrations(mock_conn, migrations):
+    applied = run_migrations(mock_conn, migrations)
+
+    statements = executed(mock_conn)
+    assert applied == [2, 3]
+    assert "CREATE TABLE a ();" not in statements
+    assert "CREATE TABLE b ();" in statements
+    migrations[2].steps.assert_called_once_with(mock_conn)
+
+
+def test_run_migrations_applies_each_migration_in_its_own_transaction(
+    mock_conn, migrations
+):
+    run_migrations(mock_conn, migrations[:2])
+
+    cursor = mock_conn.cursor()
+    assert cursor.execute.mock_calls[-5:] == [
+        call("BEGIN;"),
+        call("CREATE TABLE b ();"),
+        call(
+            "INSERT INTO schema_migrations (version, description) "
+            "VALUES (%s, %s);",
+            (2, "second"),
+        ),
+        call("COMMIT;"),
+        call("SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_ID,)),
+    ]
+
+
+def test_run_migrations_holds_advisory_lock_throughout(mock_conn, migrations):
+    run_migrations(mock_conn, migrations)
+
+    cursor = mock_conn.cursor()
+    assert cursor.execute.mock_calls[0] == call(
+        "SELECT pg_advisory_lock(%s);", (MIGRATIONS_LOCK_ID,)
+    )
+    assert cursor.execute.mock_calls[-1] == call(
+        "SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_ID,)
+    )
+
+
+def test_run_migrations_does_nothing_when_up_to_date(mock_conn, migrations):
+    mock_conn.cursor().fetchall.return_value = [(1,), (2,), (3,)]
+
+    assert run_migrations(mock_conn, migrations) == []
+    assert "BEGIN;" not in executed(mock_conn)
+
+
+def test_run_migrations_records_existing_tables_as_first_version(
+    mock_conn, migrations
+):
+    mock_conn.cursor().fetchall.return_value = []
+    mock_conn.cursor().fetchone.return_value = (True,)
+
+    applied = run_migrations(mock_conn, migrations[:2])
+
+    assert applied == [2]
+    assert "CREATE TABLE a ();" not in executed(mock_conn)
+    assert (
+        call(
+            "INSERT INTO schema_migrations (version, description) "
+            "VALUES (%s, %s);",
+            (1, "first"),
+        )
+        in mock_conn.cursor().execute.mock_calls
+    )
+
+
+def test_run_migrations_rolls_back_and_unlocks_on_error(mock_conn, migrations):
+    failing = Migration(2, "fails", Mock(side_effect=Exception("An error")))
+
+    with pytest.raises(Exception):
+        run_migrations(mock_conn, (migrations[0], failing))
+
+    assert executed(mock_conn)[-2:] == [
+        "ROLLBACK;",
+        "SELECT pg_advisory_unlock(%s);",
+    ]
+
+
+def test_run_migrations_leaves_large_migrations_when_asked(mock_conn):
+    migrations = (
+        Migration(1, "first", "CREATE TABLE a ();"),
+        Migration(2, "second", "CREATE TABLE b ();"),
+        Migration(3, "large", "REWRITE b;", large=True),
+        Migration(4, "fourth", "CREATE TABLE c ();"),
+    )
+
+    applied = run_migrations(mock_conn, migrations, large=False)
+
+    statements = executed(mock_conn)
+    assert applied == [2]
+    assert "REWRITE b;" not in statements
+    assert "CREATE TABLE c ();" not in statements
+
+
+def test_run_migrations_applies_large_migrations_of_new_tables(mock_conn):
+    mock_conn.cursor().fetchall.return_value = []
+    mock_conn.cursor().fetchone.return_value = (False,)
+    migrations = (
+        Migration(1, "first", "CREATE TABLE a ();"),
+        Migration(2, "large", "REWRITE a;", large=True),
+    )
+
+    assert run_migrations(mock_conn, migrations, large=False) == [1, 2]
+
+
+def test_run_migrations_applies_large_migrations_by_default(mock_conn):
+    migrations = (
+        Migration(1, "first", "CREATE TABLE a ();"),
+        Migration(2, "large", "REWRITE a;", large=True),
+    )
+
+    assert run_migrations(mock_conn, migrations) == [2]
+
+
+def test_indexing_partitioning_and_rollups_are_large_migrations():
+    assert [m.version for m in MIGRATIONS if m.large] == [2, 3, 4]
+
+
+@patch("generator.loader.load_seed")
+def test_initial_migration_creates_tables_and_loads_seed(patched_load_seed):
+    conn = Mock()
+
+    create_initial_schema(conn)
+
+    conn.cursor().execute.assert_called_once_with(db_schema_str)
+    patched_load_seed.assert_called_once_with(conn, tables)
+    assert MIGRATIONS[0].steps is create_initial_schema
+
+
+def test_second_migration_adds_missing_sales_indexes():
+    assert MIGRATIONS[1].version == 2
+    assert "CREATE INDEX IF NOT EXISTS sales_order_date_idx" in (
+        MIGRATIONS[1].steps
+    )
+
+
+def test_partition_sales_does_nothing_when_already_partitioned():
+    conn = Mock()
+    conn.cursor().fetchone.return_value = (True,)
+
+    partition_sales(conn)
+
+    assert not any("RENAME" in s for s in executed(conn))
+
+
+def test_partition_sales_copies_rows_into_monthly_partitions():
+    conn = Mock()
+    conn.cursor().fetchone.side_effect = [
+        (False,),
+        (datetime.date(2023, 1, 5), datetime.date(2023, 2, 20)),
+    ]
+
+    partition_sales(conn)
+
+    statements = executed(conn)
+    create = statements.index(
+        next(s for s in statements if "PARTITION BY RANGE" in s)
+    )
+    partitions = statements.index(
+        next(s for s in statements if "sales_y2023m02 PARTITION OF" in s)
+    )
+    insert = statements.index(
+        "INSERT INTO sales SELECT * FROM sales_unpartitioned;"
+    )
+    assert create < partitions < insert
+    assert statements[insert + 1] == "DROP TABLE sales_unpartitioned;"
+    assert "ADD CONSTRAINT sales_customer_id_fkey" in statements[insert + 2]
+    assert MIGRATIONS[2].steps is partition_sales
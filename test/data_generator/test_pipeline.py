@@ -0,0 +1,91 @@
+from generator.pipeline import pipeline
+import threading
+import time
+import pytest
+
+
+def test_pipeline_applies_stages_in_order_and_keeps_item_order():
+    items = pipeline(range(10), [lambda x: x + 1, lambda x: x * 10])
+
+    assert list(items) == [10 * (x + 1) for x in range(10)]
+
+
+def test_pipeline_without_stages_yields_source():
+    assert list(pipeline(iter("abc"))) == ["a", "b", "c"]
+
+
+def test_pipeline_applies_backpressure_to_source():
+    produced = []
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    items = pipeline(source(), [str], queue_size=2)
+    next(items)
+    time.sleep(0.2)
+
+    # One item consumed, two waiting in each queue, one held by each of
+    # the source and the stage while they block on a full queue.
+    assert len(produced) <= 1 + 2 * 2 + 2
+    items.close()
+
+
+def test_pipeline_overlaps_production_with_consumption():
+    started = threading.Event()
+
+    def source():
+        yield 1
+        started.set()
+        yield 2
+
+    items = pipeline(source())
+    next(items)
+
+    assert started.wait(timeout=1)
+    items.close()
+
+
+def test_pipeline_raises_source_errors_in_caller():
+    def source():
+        yield 1
+        raise RuntimeError("generation failed")
+
+    items = pipeline(source(), [str])
+
+    assert next(items) == "1"
+    with pytest.raises(RuntimeError, match="generation failed"):
+        next(items)
+
+
+def test_pipeline_raises_stage_errors_in_caller():
+    def stage(x):
+        raise ValueError("bad item")
+
+    with pytest.raises(ValueError, match="bad item"):
+        list(pipeline(range(3), [stage]))
+
+
+def test_pipeline_stops_threads_and_closes_source_when_closed_early():
+    closed = threading.Event()
+
+    def source():
+        try:
+            while True:
+                yield 1
+        finally:
+            closed.set()
+
+    before = threading.active_count()
+    items = pipeline(source(), [str])
+    next(items)
+    items.close()
+
+    assert closed.is_set()
+    assert threading.active_count() == before
+
+
+def test_pipeline_raises_value_error_on_invalid_queue_size():
+    with pytest.raises(ValueError):
+        next(pipeline([1], queue_size=0))
@@ -0,0 +1,124 @@
+from generator.migrations import MIGRATIONS
+from generator.rollups import (
+    create_rollups,
+    render_merge,
+    render_rebuild_rollups,
+    render_rollup_trigger,
+    rollup_tables_str,
+    ROLLUPS,
+    ADDED,
+    REMOVED,
+)
+from unittest.mock import Mock, call
+import sqlite3
+import pytest
+
+
+@pytest.fixture
+def db():
+    """An in-memory database with the rollup tables, three locations in
+    two countries, and an empty sales table. SQLite shares the upsert
+    syntax used, so the rendered merges run as they would in Postgres."""
+    db = sqlite3.connect(":memory:")
+    db.executescript(
+        rollup_tables_str
+        + "CREATE TABLE locations (location_id INT, country_id INT);"
+        "INSERT INTO locations VALUES (1, 10), (2, 10), (3, 20);"
+        "CREATE TABLE sales (order_date TEXT, price_paid NUMERIC(10, 2), "
+        "location_id INT);"
+    )
+    yield db
+    db.close()
+
+
+def load(db, rows, changes=ADDED):
+    """Insert rows into sales and merge them into the rollups as the
+    trigger would, with rows as the transition table."""
+    db.execute("DROP TABLE IF EXISTS new_rows;")
+    db.execute(
+        "CREATE TABLE new_rows (order_date TEXT, price_paid NUMERIC(10, 2), "
+        "location_id INT);"
+    )
+    db.executemany("INSERT INTO new_rows VALUES (?, ?, ?);", rows)
+    if changes is ADDED:
+        db.executemany("INSERT INTO sales VALUES (?, ?, ?);", rows)
+    for table_name, group_column, join in ROLLUPS:
+        db.execute(
+            render_merge(
+                table_name, group_column, join, f"{changes} FROM new_rows"
+            )
+        )
+
+
+def rollup(db, table_name):
+    return db.execute(
+        f"SELECT * FROM {table_name} ORDER BY 1, 2;"
+    ).fetchall()
+
+
+def test_merge_adds_partial_aggregates_to_existing_days(db):
+    load(db, [("2023-01-01", 10, 1), ("2023-01-01", 5, 2)])
+    load(db, [("2023-01-01", 1, 1), ("2023-01-02", 2, 3)])
+
+    assert rollup(db, "daily_location_sales") == [
+        ("2023-01-01", 1, 11, 2),
+        ("2023-01-01", 2, 5, 1),
+        ("2023-01-02", 3, 2, 1),
+    ]
+    assert rollup(db, "daily_country_sales") == [
+        ("2023-01-01", 10, 16, 3),
+        ("2023-01-02", 20, 2, 1),
+    ]
+
+
+def test_merge_matches_full_rebuild(db):
+    load(db, [("2023-01-01", 10, 1), ("2023-01-02", 5, 3)])
+    load(db, [("2023-01-02", 7, 3), ("2023-01-02", 1, None)])
+    incremental = rollup(db, "daily_country_sales")
+
+    db.executescript(
+        render_rebuild_rollups().replace("TRUNCATE", "DELETE FROM")
+    )
+
+    assert rollup(db, "daily_country_sales") == incremental
+
+
+def test_merge_subtracts_removed_sales(db):
+    load(db, [("2023-01-01", 10, 1), ("2023-01-01", 4, 1)])
+
+    load(db, [("2023-01-01", 4, 1)], changes=REMOVED)
+
+    assert rollup(db, "daily_location_sales") == [("2023-01-01", 1, 10, 1)]
+
+
+def test_merge_locks_rollup_rows_in_key_order():
+    statement = render_merge("daily_location_sales", "location_id", "", ADDED)
+
+    assert "ORDER BY order_date, location_id\nON CONFLICT" in statement
+
+
+def test_rollup_trigger_merges_once_per_statement_for_each_event():
+    ddl = render_rollup_trigger()
+
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        assert f"AFTER {event} ON sales REFERENCING" in ddl
+        assert f"TG_OP = '{event}'" in ddl
+    assert ddl.count("FOR EACH STATEMENT") == 3
+    assert "FROM sales" not in ddl
+
+
+def test_create_rollups_fills_rollups_after_installing_triggers():
+    conn = Mock()
+
+    create_rollups(conn)
+
+    assert conn.cursor().execute.mock_calls == [
+        call(rollup_tables_str),
+        call(render_rollup_trigger()),
+        call(render_rebuild_rollups()),
+    ]
+
+
+def test_rollups_are_created_by_a_migration():
+    assert MIGRATIONS[-1].steps is create_rollups
+    assert MIGRATIONS[-1].version == 4
@@ -0,0 +1,64 @@
+from utils.s3 import MultipartUpload, RangedObject
+from moto import mock_s3
+import boto3
+import io
+import pytest
+
+
+BUCKET = "etl-holidays-s3-test"
+
+
+@pytest.fixture
+def mocked_s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-2")
+    with mock_s3():
+        s3 = boto3.client("s3", "eu-west-2")
+        s3.create_bucket(
+            Bucket=BUCKET,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3
+
+
+# MultipartUpload
+###############################################################################
+
+
+def test_multipart_upload_uploads_full_parts_as_they_fill(mocked_s3):
+    part_size = 5 * 1024 * 1024
+
+    with MultipartUpload(mocked_s3, BUCKET, "big", part_size) as upload:
+        upload.write(b"x" * (part_size + 10))
+        assert len(upload.parts) == 1
+        assert len(upload.buffer) == 10
+
+    body = mocked_s3.get_object(Bucket=BUCKET, Key="big")["Body"].read()
+    assert len(body) == part_size + 10
+
+
+def test_multipart_upload_aborts_on_error(mocked_s3):
+    with pytest.raises(ValueError):
+        with MultipartUpload(mocked_s3, BUCKET, "failed") as upload:
+            upload.write(b"partial")
+            raise ValueError("failed")
+
+    assert mocked_s3.list_multipart_uploads(Bucket=BUCKET).get(
+        "Uploads", []
+    ) == []
+    assert "Contents" not in mocked_s3.list_objects_v2(Bucket=BUCKET)
+
+
+# RangedObject
+###############################################################################
+
+
+def test_ranged_object_reads_and_seeks_like_a_file(mocked_s3):
+    mocked_s3.put_object(Bucket=BUCKET, Key="k", Body=b"0123456789")
+
+    with RangedObject(mocked_s3, BUCKET, "k") as source:
+        assert source.read(3) == b"012"
+        assert source.seek(-2, io.SEEK_END) == 8
+        assert source.read(5) == b"89"
+        assert source.read(5) == b""
+        source.seek(4)
+        assert source.read() == b"456789"
@@ -0,0 +1,205 @@
+from generator.schema import (
+    Column,
+    ForeignKey,
+    Index,
+    Table,
+    column_names,
+    insert_columns,
+    primary_key,
+    foreign_key,
+    dependency_order,
+    render_table,
+    render_ddl,
+    render_deferred,
+    render_drop_deferred,
+    render_partitions,
+)
+from generator import oltp_schema
+import datetime
+import pytest
+
+
+PARENT = Table(
+    "parent",
+    (
+        Column("parent_id", "SERIAL", primary_key=True),
+        Column("name", "TEXT", nullable=False),
+    ),
+)
+
+CHILD = Table(
+    "child",
+    (
+        Column("child_id", "SERIAL", primary_key=True),
+        Column("parent_id", "INT"),
+    ),
+    foreign_keys=(ForeignKey("parent_id", "parent", "parent_id"),),
+    indexes=(Index("child_parent_id_idx", ("parent_id",)),),
+)
+
+EVENTS = Table(
+    "events",
+    (
+        Column("event_id", "SERIAL", primary_key=True),
+        Column("event_date", "DATE", nullable=False),
+    ),
+    partition_by="event_date",
+)
+
+
+# column helpers
+###############################################################################
+
+
+def test_column_names_returns_all_columns_in_order():
+    assert column_names(CHILD) == ("child_id", "parent_id")
+
+
+def test_insert_columns_leaves_out_serial_columns():
+    assert insert_columns(CHILD) == ("parent_id",)
+
+
+def test_primary_key_returns_primary_key_column():
+    assert primary_key(PARENT) == "parent_id"
+    assert primary_key(Table("t", (Column("x", "INT"),))) is None
+
+
+def test_foreign_key_returns_foreign_key_on_column():
+    assert foreign_key(CHILD, "parent_id").table == "parent"
+    assert foreign_key(CHILD, "child_id") is None
+
+
+# dependency_order
+###############################################################################
+
+
+def test_dependency_order_puts_parents_before_children():
+    assert dependency_order((CHILD, PARENT)) == (PARENT, CHILD)
+
+
+def test_dependency_order_keeps_given_order_where_possible():
+    other = Table("other", (Column("x", "INT"),))
+
+    assert dependency_order((other, PARENT, CHILD)) == (other, PARENT, CHILD)
+
+
+def test_dependency_order_raises_value_error_on_cycle():
+    a = Table("a", (), foreign_keys=(ForeignKey("b_id", "b", "b_id"),))
+    b = Table("b", (), foreign_keys=(ForeignKey("a_id", "a", "a_id"),))
+
+    with pytest.raises(ValueError):
+        dependency_order((a, b))
+
+
+def test_dependency_order_raises_value_error_on_unknown_table():
+    with pytest.raises(ValueError):
+        dependency_order((CHILD,))
+
+
+# rendering
+###############################################################################
+
+
+def test_render_table_renders_keys_and_constraints():
+    assert render_table(PARENT) == (
+        "CREATE TABLE parent (\n"
+        "    parent_id SERIAL PRIMARY KEY,\n"
+        "    name TEXT NOT NULL\n"
+        ");\n"
+    )
+    assert "parent_id INT REFERENCES parent(parent_id)" in render_table(CHILD)
+
+
+def test_render_table_partitions_by_range_with_partition_column_in_key():
+    assert render_table(EVENTS) == (
+        "CREATE TABLE events (\n"
+        "    event_id SERIAL,\n"
+        "    event_date DATE NOT NULL,\n"
+        "    PRIMARY KEY (event_id, event_date)\n"
+        ") PARTITION BY RANGE (event_date);\n"
+    )
+
+
+def test_render_partitions_creates_one_partition_per_month():
+    assert render_partitions(
+        EVENTS, datetime.date(2023, 11, 15), datetime.date(2024, 1, 1)
+    ) == (
+        "CREATE TABLE IF NOT EXISTS events_y2023m11 PARTITION OF events "
+        "FOR VALUES FROM ('2023-11-01') TO ('2023-12-01');\n"
+        "CREATE TABLE IF NOT EXISTS events_y2023m12 PARTITION OF events "
+        "FOR VALUES FROM ('2023-12-01') TO ('2024-01-01');\n"
+        "CREATE TABLE IF NOT EXISTS events_y2024m01 PARTITION OF events "
+        "FOR VALUES FROM ('2024-01-01') TO ('2024-02-01');\n"
+    )
+
+
+def test_render_partitions_raises_value_error_for_unpartitioned_table():
+    with pytest.raises(ValueError):
+        render_partitions(
+            PARENT, datetime.date(2023, 1, 1), datetime.date(2023, 1, 31)
+        )
+
+
+def test_render_ddl_creates_tables_in_dependency_order():
+    ddl = render_ddl((CHILD, PARENT))
+
+    assert ddl.index("CREATE TABLE parent") < ddl.index("CREATE TABLE child")
+
+
+def test_render_ddl_includes_indexes():
+    assert (
+        "CREATE INDEX IF NOT EXISTS child_parent_id_idx ON child (parent_id);"
+        in render_ddl((PARENT, CHILD))
+    )
+
+
+def test_render_deferred_builds_indexes_then_adds_foreign_keys():
+    assert render_deferred((PARENT, CHILD)) == (
+        "CREATE INDEX IF NOT EXISTS child_parent_id_idx "
+        "ON child (parent_id);\n"
+        "ALTER TABLE child\n"
+        "    ADD CONSTRAINT child_parent_id_fkey "
+        "FOREIGN KEY (parent_id) REFERENCES parent(parent_id);\n"
+    )
+
+
+def test_render_deferred_accepts_tables_without_their_parents():
+    assert "REFERENCES parent(parent_id)" in render_deferred((CHILD,))
+
+
+def test_render_drop_deferred_drops_foreign_keys_and_indexes():
+    assert render_drop_deferred((PARENT, CHILD)) == (
+        "ALTER TABLE child DROP CONSTRAINT IF EXISTS child_parent_id_fkey;\n"
+        "DROP INDEX IF EXISTS child_parent_id_idx;\n"
+    )
+
+
+# oltp_schema
+###############################################################################
+
+
+def test_oltp_seed_rows_match_their_columns():
+    for table in oltp_schema.tables:
+        if table.seed is not None:
+            assert set(table.seed.columns) <= set(column_names(table))
+            assert all(
+                len(row) == len(table.seed.columns) for row in table.seed.rows
+            )
+
+
+def test_oltp_db_schema_str_is_rendered_from_tables():
+    assert oltp_schema.db_schema_str == render_ddl(oltp_schema.tables)
+
+
+def test_oltp_sales_is_indexed_for_extracts_and_joins():
+    ddl = oltp_schema.db_schema_str
+
+    for column in ("order_date", "customer_id", "location_id"):
+        assert f"ON sales ({column});" in ddl
+
+
+def test_oltp_sales_is_partitioned_by_month_of_order_date():
+    assert oltp_schema.sales.partition_by == "order_date"
+    assert (
+        ") PARTITION BY RANGE (order_date);" in oltp_schema.db_schema_str
+    )
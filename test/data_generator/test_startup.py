@@ -0,0 +1,94 @@
+from utils import startup
+from unittest.mock import Mock
+import builtins
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+
+@pytest.fixture
+def fresh_timings(monkeypatch):
+    monkeypatch.setattr(startup, "_import_times", {})
+    monkeypatch.setattr(startup, "_children", [0.0])
+    monkeypatch.setattr(startup, "_first_query_reported", False)
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """Write a module that imports another, neither imported yet."""
+    (tmp_path / "startup_outer.py").write_text("import startup_inner\n")
+    (tmp_path / "startup_inner.py").write_text("import time\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ("startup_outer", "startup_inner"):
+        sys.modules.pop(name, None)
+
+
+def test_timed_import_records_cumulative_and_own_time(
+    fresh_timings, package, monkeypatch
+):
+    monkeypatch.setattr(builtins, "__import__", startup.timed_import)
+
+    startup.timed_import("startup_outer")
+
+    outer_total, outer_own = startup._import_times["startup_outer"]
+    inner_total, _ = startup._import_times["startup_inner"]
+    assert outer_total >= inner_total
+    assert outer_own == pytest.approx(outer_total - inner_total)
+
+
+def test_report_imports_logs_slowest_modules_and_stops_timing(
+    fresh_timings, monkeypatch
+):
+    monkeypatch.setattr(builtins, "__import__", startup.timed_import)
+    startup._import_times.update(fast=(0.001, 0.001), slow=(0.5, 0.2))
+
+    fields = startup.report_imports("generator.initialisation")
+
+    assert builtins.__import__ is startup._original_import
+    assert [m["module"] for m in fields["modules"]] == ["slow", "fast"]
+    assert fields["modules"][0]["self_ms"] == 200.0
+
+
+def test_reports_do_nothing_when_not_profiling(fresh_timings, monkeypatch):
+    monkeypatch.delenv("PROFILE_STARTUP", raising=False)
+    conn = Mock()
+
+    assert startup.report_imports("generator.initialisation") is None
+    assert startup.report_first_query(conn) is None
+    conn.cursor.assert_not_called()
+
+
+def test_report_first_query_queries_only_first_connection(
+    fresh_timings, monkeypatch
+):
+    monkeypatch.setenv("PROFILE_STARTUP", "true")
+    conn = Mock()
+
+    assert startup.report_first_query(conn)["duration_ms"] > 0
+    assert startup.report_first_query(conn) is None
+    conn.cursor().execute.assert_called_once_with("SELECT 1;")
+
+
+def test_profiling_handler_import_logs_per_module_times():
+    env = {
+        **os.environ,
+        "PROFILE_STARTUP": "true",
+        "PYTHONPATH": os.pathsep.join(sys.path),
+    }
+
+    output = subprocess.run(
+        [sys.executable, "-c", "import generator.initialisation"],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+
+    [line] = [json.loads(line) for line in output.splitlines()]
+    assert line["stage"] == "startup_imports"
+    assert line["handler_module"] == "generator.initialisation"
+    modules = {m["module"] for m in line["modules"]}
+    assert "generator.migrations" in modules
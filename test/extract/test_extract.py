@@ -0,0 +1,295 @@
+from extract.extract import (
+    extract_changes,
+    extract_table,
+    fetch_batches,
+    read_extract_state,
+)
+from generator.oltp_schema import sales, locations
+from utils.arrow import arrow_schema
+from utils.connections import clear_cache
+from moto import mock_s3
+from unittest.mock import patch, Mock
+import boto3
+import datetime
+import decimal
+import io
+import json
+import logging
+import pyarrow.parquet as pq
+import pytest
+
+
+BUCKET = "etl-holidays-extract-test"
+
+
+@pytest.fixture(autouse=True)
+def empty_connection_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+@pytest.fixture
+def dummy_env_vars(monkeypatch):
+    monkeypatch.setenv("DB_USER", "usr")
+    monkeypatch.setenv("DB_PASS", "pass")
+    monkeypatch.setenv("DB_HOST", "host")
+    monkeypatch.setenv("DB_PORT", "5432")
+    monkeypatch.setenv("EXTRACT_BUCKET", BUCKET)
+
+
+@pytest.fixture
+def mocked_s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-2")
+    with mock_s3():
+        s3 = boto3.client("s3", "eu-west-2")
+        s3.create_bucket(
+            Bucket=BUCKET,
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3
+
+
+@pytest.fixture
+def mocked_logger():
+    with patch("extract.extract.custom_logger") as logger:
+        logger.return_value = logging.getLogger("test_logger")
+        yield logger
+
+
+def sale(sale_id):
+    return (
+        sale_id,
+        datetime.date(2023, 1, sale_id % 28 + 1),
+        decimal.Decimal("99.95"),
+        1,
+        2,
+    )
+
+
+def mock_conn(batches, snapshot=(100, 100)):
+    """Return a mock connection whose server-side cursor fetches the given
+    batches of rows, then an empty batch, in a snapshot with no other
+    transaction open."""
+    conn = Mock()
+    conn.cursor.return_value.fetchone.return_value = snapshot
+    conn.cursor.return_value.fetchall.side_effect = list(batches) + [[]]
+    return conn
+
+
+def read_parquet(s3, key):
+    body = s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+    return pq.read_table(io.BytesIO(body))
+
+
+def data_keys(s3):
+    objects = s3.list_objects_v2(Bucket=BUCKET).get("Contents", [])
+    return [o["Key"] for o in objects if not o["Key"].startswith("water")]
+
+
+# extract_table
+###############################################################################
+
+
+def test_extract_table_writes_rows_to_parquet_and_advances_watermark(
+    mocked_s3,
+):
+    conn = mock_conn([[sale(1), sale(2)], [sale(3)]])
+
+    row_count = extract_table(conn, mocked_s3, BUCKET, sales, batch_size=2)
+
+    [key] = data_keys(mocked_s3)
+    table = read_parquet(mocked_s3, key)
+    assert row_count == 3
+    assert key.startswith("sales/") and key.endswith(".parquet")
+    assert table.column("sale_id").to_pylist() == [1, 2, 3]
+    assert table.schema == arrow_schema(sales)
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["last_key"] == 3
+
+
+def test_extract_table_reads_only_rows_past_watermark(mocked_s3):
+    mocked_s3.put_object(
+        Bucket=BUCKET,
+        Key="watermarks/sales.json",
+        Body=json.dumps({"last_key": 41}),
+    )
+    conn = mock_conn([[sale(42)]])
+
+    extract_table(conn, mocked_s3, BUCKET, sales)
+
+    declare = conn.cursor().execute.mock_calls[2]
+    assert "WHERE sale_id > %s ORDER BY sale_id" in declare.args[0]
+    assert declare.args[1] == (41,)
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["last_key"] == 42
+
+
+def test_extract_table_keys_sort_in_extraction_order(mocked_s3):
+    mocked_s3.put_object(
+        Bucket=BUCKET,
+        Key="watermarks/sales.json",
+        Body=json.dumps({"last_key": 41}),
+    )
+
+    extract_table(mock_conn([[sale(42)]]), mocked_s3, BUCKET, sales)
+
+    [key] = data_keys(mocked_s3)
+    assert "/sales_0000000042_" in key
+
+
+def test_extract_table_writes_nothing_without_new_rows(mocked_s3):
+    conn = mock_conn([])
+
+    assert extract_table(conn, mocked_s3, BUCKET, sales) == 0
+    assert data_keys(mocked_s3) == []
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["last_key"] == 0
+
+
+def test_extract_table_keeps_watermark_if_extract_fails(mocked_s3):
+    conn = mock_conn([[sale(1)]])
+    conn.cursor().fetchall.side_effect = [[sale(1)], Exception("lost")]
+
+    with pytest.raises(Exception):
+        extract_table(conn, mocked_s3, BUCKET, sales)
+
+    assert data_keys(mocked_s3) == []
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["last_key"] == 0
+
+
+def test_extract_table_stops_at_first_gap_in_keys(mocked_s3):
+    conn = mock_conn([[sale(1), sale(2), sale(4)], [sale(5)]], (90, 95))
+
+    row_count = extract_table(conn, mocked_s3, BUCKET, sales)
+
+    [key] = data_keys(mocked_s3)
+    state = read_extract_state(mocked_s3, BUCKET, "sales")
+    assert row_count == 2
+    assert read_parquet(mocked_s3, key).column("sale_id").to_pylist() == [
+        1,
+        2,
+    ]
+    assert state["last_key"] == 2
+    assert state["gap"]["key"] == 3 and state["gap"]["xmax"] == 95
+    assert conn.cursor().execute.mock_calls[-1].args[0] == "ROLLBACK;"
+
+
+def test_extract_table_records_gap_before_first_row(mocked_s3):
+    conn = mock_conn([[sale(2)]], (90, 95))
+
+    assert extract_table(conn, mocked_s3, BUCKET, sales) == 0
+    assert data_keys(mocked_s3) == []
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["gap"]["key"] == 1
+
+
+def test_extract_table_keeps_first_sight_of_a_gap(mocked_s3):
+    gap = {"key": 3, "seen_at": 1000.0, "xmax": 95}
+    mocked_s3.put_object(
+        Bucket=BUCKET,
+        Key="watermarks/sales.json",
+        Body=json.dumps({"last_key": 2, "gap": gap}),
+    )
+
+    extract_table(mock_conn([[sale(4)]], (90, 99)), mocked_s3, BUCKET, sales)
+
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["gap"] == gap
+
+
+def test_extract_table_steps_over_settled_gap(mocked_s3):
+    mocked_s3.put_object(
+        Bucket=BUCKET,
+        Key="watermarks/sales.json",
+        Body=json.dumps(
+            {"last_key": 2, "gap": {"key": 3, "seen_at": 0, "xmax": 95}}
+        ),
+    )
+    conn = mock_conn([[sale(4), sale(5)]], (95, 99))
+
+    row_count = extract_table(conn, mocked_s3, BUCKET, sales, gap_timeout=60)
+
+    assert row_count == 2
+    assert read_extract_state(mocked_s3, BUCKET, "sales") == {
+        "last_key": 5,
+        "gap": None,
+    }
+
+
+def test_extract_table_waits_while_gap_may_commit(mocked_s3):
+    mocked_s3.put_object(
+        Bucket=BUCKET,
+        Key="watermarks/sales.json",
+        Body=json.dumps(
+            {"last_key": 2, "gap": {"key": 3, "seen_at": 0, "xmax": 95}}
+        ),
+    )
+    conn = mock_conn([[sale(4), sale(5)]], (94, 99))
+
+    assert extract_table(conn, mocked_s3, BUCKET, sales, gap_timeout=60) == 0
+    assert read_extract_state(mocked_s3, BUCKET, "sales")["last_key"] == 2
+
+
+# fetch_batches
+###############################################################################
+
+
+def test_fetch_batches_reads_through_server_side_cursor():
+    conn = mock_conn([[("a",)], [("b",)]])
+
+    batches = list(fetch_batches(conn, locations, "location_id", 0, 100))
+
+    statements = [c.args[0] for c in conn.cursor().execute.mock_calls]
+    assert batches == [[("a",)], [("b",)]]
+    assert statements[0] == (
+        "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY;"
+    )
+    assert "txid_current_snapshot()" in statements[1]
+    assert statements[2].startswith("DECLARE extract_cursor NO SCROLL")
+    assert statements[3] == "FETCH FORWARD 100 FROM extract_cursor;"
+    assert statements[-2:] == ["CLOSE extract_cursor;", "COMMIT;"]
+
+
+def test_fetch_batches_records_snapshot_bounds():
+    conn = mock_conn([[("a",)]], snapshot=(90, 95))
+    snapshot = {}
+
+    next(fetch_batches(conn, locations, "location_id", 0, 100, snapshot))
+
+    assert snapshot == {"xmin": 90, "xmax": 95}
+
+
+def test_fetch_batches_rolls_back_when_abandoned():
+    conn = mock_conn([[("a",)], [("b",)]])
+
+    batches = fetch_batches(conn, locations, "location_id", 0, 100)
+    next(batches)
+    batches.close()
+
+    assert conn.cursor().execute.mock_calls[-1].args[0] == "ROLLBACK;"
+
+
+# extract_changes
+###############################################################################
+
+
+@patch("extract.extract.extract_table")
+@patch("utils.connections.connect")
+def test_extract_changes_extracts_each_table(
+    patched_connect, patched_extract_table, dummy_env_vars, mocked_s3
+):
+    patched_extract_table.return_value = 5
+
+    response = extract_changes({"tables": ["sales", "locations"]}, None)
+
+    assert patched_connect.call_args.kwargs["database"] == "etlhols_oltp"
+    assert response == {"Result": "Success", "sales": 5, "locations": 5}
+
+
+def test_extract_changes_logs_error_when_no_env_variables(
+    mocked_logger, caplog
+):
+    response = extract_changes({}, None)
+
+    assert caplog.records[-1].levelname == "ERROR"
+    assert caplog.records[-1].message == (
+        "Required environment variables missing: "
+        "['DB_USER', 'DB_PASS', 'DB_HOST', 'DB_PORT', 'EXTRACT_BUCKET']"
+    )
+    assert response == {"Result": "Error"}
@@ -0,0 +1,349 @@
+from generator.oltp_schema import countries, customers, locations, sales
+from transform.star_schema import dim_date, fact_sales
+from transform.transform import (
+    transform_changes,
+    transform_new_objects,
+    build_dim_date,
+    date_ids,
+    latest_by_key,
+    read_batches,
+    read_state,
+    StarTransform,
+)
+from utils.arrow import arrow_schema
+from moto import mock_s3
+from unittest.mock import Mock
+import boto3
+import datetime
+import decimal
+import io
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+
+EXTRACT_BUCKET = "etl-holidays-extract-test"
+WAREHOUSE_BUCKET = "etl-holidays-warehouse-test"
+
+
+@pytest.fixture
+def mocked_s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-2")
+    with mock_s3():
+        s3 = boto3.client("s3", "eu-west-2")
+        for bucket in (EXTRACT_BUCKET, WAREHOUSE_BUCKET):
+            s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+            )
+        yield s3
+
+
+def put_extract(s3, table, key, rows):
+    """Write rows to the extract bucket as extract_table would."""
+    schema = arrow_schema(table)
+    buffer = io.BytesIO()
+    pq.write_table(
+        pa.Table.from_pylist(
+            [dict(zip(schema.names, row)) for row in rows], schema=schema
+        ),
+        buffer,
+    )
+    s3.put_object(Bucket=EXTRACT_BUCKET, Key=key, Body=buffer.getvalue())
+
+
+def put_oltp_rows(s3):
+    put_extract(
+        s3,
+        countries,
+        "countries/2023/06/30/countries_0000000001_000000000000.parquet",
+        [(1, "Italy"), (2, "Peru")],
+    )
+    put_extract(
+        s3,
+        locations,
+        "locations/2023/06/30/locations_0000000001_000000000000.parquet",
+        [(1, "Portrait Firenze", 1), (2, "Monasterio", 2)],
+    )
+    put_extract(
+        s3,
+        customers,
+        "customers/2023/06/30/customers_0000000001_000000000000.parquet",
+        [(1, "Ana Silva"), (2, "Leo Rossi")],
+    )
+    put_extract(
+        s3,
+        sales,
+        "sales/2023/06/30/sales_0000000001_000000000000.parquet",
+        [
+            sale(1, "2023-06-29", 1, 2),
+            sale(2, "2023-06-30", 2, 1),
+            sale(3, "2023-06-30", 1, 1),
+        ],
+    )
+
+
+def sale(sale_id, order_date, customer_id, location_id):
+    return (
+        sale_id,
+        datetime.date.fromisoformat(order_date),
+        decimal.Decimal("120.50"),
+        customer_id,
+        location_id,
+    )
+
+
+def read_outputs(s3, table_name):
+    objects = s3.list_objects_v2(
+        Bucket=WAREHOUSE_BUCKET, Prefix=f"{table_name}/"
+    ).get("Contents", [])
+    return [
+        pq.read_table(
+            io.BytesIO(
+                s3.get_object(Bucket=WAREHOUSE_BUCKET, Key=o["Key"])[
+                    "Body"
+                ].read()
+            )
+        )
+        for o in objects
+    ]
+
+
+def columns(**values):
+    return {name: np.array(column) for name, column in values.items()}
+
+
+# vectorised helpers
+###############################################################################
+
+
+def test_date_ids_are_yyyymmdd_integers():
+    dates = np.array(["2023-01-09", "2024-12-31"], dtype="datetime64[D]")
+
+    assert date_ids(dates).tolist() == [20230109, 20241231]
+
+
+def test_build_dim_date_derives_calendar_attributes():
+    row = build_dim_date(np.array(["2023-06-30"], dtype="datetime64[D]"))
+
+    assert {name: values[0] for name, values in row.items()} == {
+        "date_id": 20230630,
+        "full_date": np.datetime64("2023-06-30"),
+        "year": 2023,
+        "quarter": 2,
+        "month": 6,
+        "day": 30,
+        "day_of_week": 5,
+        "month_name": "June",
+        "day_name": "Friday",
+    }
+
+
+def test_latest_by_key_sorts_and_keeps_last_copy_of_each_key():
+    batch = columns(id=[3, 1, 3, 2], name=["old", "a", "new", "b"])
+
+    result = latest_by_key(batch, "id")
+
+    assert result["id"].tolist() == [1, 2, 3]
+    assert result["name"].tolist() == ["a", "b", "new"]
+
+
+# StarTransform
+###############################################################################
+
+
+def test_star_transform_denormalises_country_into_locations():
+    transform = StarTransform()
+    transform.transform(
+        "countries", columns(country_id=[1], country_name=["Peru"])
+    )
+
+    output = transform.transform(
+        "locations",
+        columns(
+            location_id=[1, 2], location_name=["a", "b"], country_id=[1, 9]
+        ),
+    )
+
+    assert output["dim_location"]["country_name"].tolist() == ["Peru", None]
+
+
+def test_star_transform_adds_only_new_dates_to_dim_date():
+    transform = StarTransform()
+    first = transform.transform(
+        "sales",
+        columns(
+            sale_id=[1, 2],
+            order_date=np.array(["2023-01-01", "2023-01-01"], "datetime64[D]"),
+            price_paid=[1.0, 2.0],
+            customer_id=[1, 1],
+            location_id=[1, 1],
+        ),
+    )
+    second = transform.transform(
+        "sales",
+        columns(
+            sale_id=[3, 4],
+            order_date=np.array(["2023-01-01", "2023-01-02"], "datetime64[D]"),
+            price_paid=[1.0, 2.0],
+            customer_id=[1, 1],
+            location_id=[1, 1],
+        ),
+    )
+
+    assert first["dim_date"]["date_id"].tolist() == [20230101]
+    assert second["dim_date"]["date_id"].tolist() == [20230102]
+    assert second["fact_sales"]["date_id"].tolist() == [20230101, 20230102]
+
+
+def test_star_transform_skips_rows_up_to_watermark_after_resuming():
+    transform = StarTransform()
+    transform.transform(
+        "customers", columns(customer_id=[1, 2], customer_name=["a", "b"])
+    )
+    resumed = StarTransform(json.loads(json.dumps(transform.state())))
+
+    output = resumed.transform(
+        "customers", columns(customer_id=[2, 3], customer_name=["b", "c"])
+    )
+
+    assert output["dim_customer"]["customer_id"].tolist() == [3]
+    assert resumed.transform(
+        "customers", columns(customer_id=[3], customer_name=["c"])
+    ) == {}
+
+
+# transform_new_objects
+###############################################################################
+
+
+def test_transform_new_objects_writes_star_schema_tables(mocked_s3):
+    put_oltp_rows(mocked_s3)
+
+    row_counts = transform_new_objects(
+        mocked_s3, EXTRACT_BUCKET, WAREHOUSE_BUCKET
+    )
+
+    assert row_counts == {
+        "dim_date": 2,
+        "dim_location": 2,
+        "dim_customer": 2,
+        "fact_sales": 3,
+    }
+    [locations_table] = read_outputs(mocked_s3, "dim_location")
+    assert locations_table.column("country_name").to_pylist() == [
+        "Italy",
+        "Peru",
+    ]
+    [facts] = read_outputs(mocked_s3, "fact_sales")
+    assert facts.schema == arrow_schema(fact_sales)
+    assert facts.column("date_id").to_pylist() == [
+        20230629,
+        20230630,
+        20230630,
+    ]
+    [dates] = read_outputs(mocked_s3, "dim_date")
+    assert dates.schema == arrow_schema(dim_date)
+
+
+def test_transform_new_objects_transforms_only_new_objects(mocked_s3):
+    put_oltp_rows(mocked_s3)
+    transform_new_objects(mocked_s3, EXTRACT_BUCKET, WAREHOUSE_BUCKET)
+
+    assert set(
+        transform_new_objects(
+            mocked_s3, EXTRACT_BUCKET, WAREHOUSE_BUCKET
+        ).values()
+    ) == {0}
+
+    put_extract(
+        mocked_s3,
+        sales,
+        "sales/2023/07/01/sales_0000000004_000000000000.parquet",
+        [sale(4, "2023-07-01", 2, 2)],
+    )
+    row_counts = transform_new_objects(
+        mocked_s3, EXTRACT_BUCKET, WAREHOUSE_BUCKET
+    )
+
+    assert row_counts["fact_sales"] == 1
+    assert row_counts["dim_date"] == 1
+    assert read_state(mocked_s3, WAREHOUSE_BUCKET)["watermarks"]["sales"] == 4
+
+
+def test_transform_new_objects_keeps_state_when_a_read_fails(mocked_s3):
+    put_oltp_rows(mocked_s3)
+    mocked_s3.put_object(
+        Bucket=EXTRACT_BUCKET,
+        Key="sales/2023/07/01/sales_0000000004_000000000000.parquet",
+        Body=b"not parquet",
+    )
+
+    with pytest.raises(Exception):
+        transform_new_objects(mocked_s3, EXTRACT_BUCKET, WAREHOUSE_BUCKET)
+
+    assert read_state(mocked_s3, WAREHOUSE_BUCKET) == {}
+    assert read_outputs(mocked_s3, "fact_sales") == []
+
+
+# reading extracted objects
+###############################################################################
+
+
+def test_read_batches_reads_row_groups_with_ranged_gets(mocked_s3):
+    schema = arrow_schema(countries)
+    buffer = io.BytesIO()
+    pq.write_table(
+        pa.table(
+            {
+                "country_id": pa.array(range(1, 101), pa.int32()),
+                "country_name": [f"Country {i}" for i in range(1, 101)],
+            },
+            schema=schema,
+        ),
+        buffer,
+        row_group_size=25,
+    )
+    mocked_s3.put_object(
+        Bucket=EXTRACT_BUCKET,
+        Key="countries/c.parquet",
+        Body=buffer.getvalue(),
+    )
+    s3_client = Mock(wraps=mocked_s3)
+
+    batches = list(
+        read_batches(s3_client, EXTRACT_BUCKET, "countries/c.parquet", 40)
+    )
+
+    ids = np.concatenate([batch["country_id"] for batch in batches])
+    assert ids.tolist() == list(range(1, 101))
+    assert max(len(batch["country_id"]) for batch in batches) <= 40
+    assert all(
+        "Range" in call.kwargs for call in s3_client.get_object.mock_calls
+    )
+
+
+# transform_changes
+###############################################################################
+
+
+def test_transform_changes_reads_buckets_from_environment(
+    mocked_s3, monkeypatch
+):
+    monkeypatch.setenv("EXTRACT_BUCKET", EXTRACT_BUCKET)
+    monkeypatch.setenv("WAREHOUSE_BUCKET", WAREHOUSE_BUCKET)
+    put_oltp_rows(mocked_s3)
+
+    response = transform_changes({}, None)
+
+    assert response["Result"] == "Success"
+    assert response["fact_sales"] == 3
+
+
+def test_transform_changes_returns_error_without_env_variables(monkeypatch):
+    monkeypatch.delenv("EXTRACT_BUCKET", raising=False)
+    monkeypatch.delenv("WAREHOUSE_BUCKET", raising=False)
+
+    assert transform_changes({}, None) == {"Result": "Error"}